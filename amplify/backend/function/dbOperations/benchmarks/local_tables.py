@@ -0,0 +1,86 @@
+"""
+Shared setup for the benchmarks that run against DynamoDB Local: the roadmap
+tables with their production key schema, and a generated roadmap to store.
+
+Start DynamoDB Local first, for example:
+    docker run -p 8000:8000 amazon/dynamodb-local
+
+DYNAMODB_ENDPOINT picks the endpoint, http://localhost:8000 by default.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(HERE, '..', 'src'),
+    os.path.join(HERE, '..', '..', 'skillsprintbackinfiniteLayer', 'lib', 'python'),
+]
+
+os.environ.setdefault('DYNAMODB_ENDPOINT', 'http://localhost:8000')
+# DynamoDB Local accepts any credentials, but boto3 still needs some
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+import boto3  # noqa: E402
+
+# Hash and range key of every table the roadmap benchmarks touch
+TABLE_KEYS = {
+    'Roadmaps': ('id', None),
+    'Phases': ('roadmapId', 'phaseId'),
+    'Topics': ('phaseId', 'topicId'),
+    'InfoBits': ('topicId', 'infoBitId'),
+    'Quizzes': ('infoBitId', None),
+}
+
+
+def local_dynamodb():
+    return boto3.resource('dynamodb', endpoint_url=os.environ['DYNAMODB_ENDPOINT'])
+
+
+def ensure_tables(dynamodb):
+    existing = set(dynamodb.meta.client.list_tables()['TableNames'])
+    for table_name, keys in TABLE_KEYS.items():
+        if table_name in existing:
+            continue
+        key_schema = [{'AttributeName': keys[0], 'KeyType': 'HASH'}]
+        if keys[1]:
+            key_schema.append({'AttributeName': keys[1], 'KeyType': 'RANGE'})
+        dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=key_schema,
+            AttributeDefinitions=[{'AttributeName': key['AttributeName'], 'AttributeType': 'S'} for key in key_schema],
+            BillingMode='PAY_PER_REQUEST'
+        ).wait_until_exists()
+
+
+def sample_roadmap(phase_count, topics_per_phase, infobits_per_topic):
+    """A roadmap tree shaped like the ones quizFlow saves."""
+    return {
+        'title': 'Benchmark roadmap',
+        'description': 'Generated for the roadmap benchmarks',
+        'imageURL': '',
+        'estimatedLearningDuration': '4 weeks',
+        'goal': 'Measure round trips',
+        'currentSkillLevel': 'beginner',
+        'desiredSkillLevel': 'advanced',
+        'dailyTime': '1 hour',
+        'phaseCount': phase_count,
+        'totalLessons': phase_count * topics_per_phase,
+        'phases': [{
+            'phaseDescription': f'Phase {phase}',
+            'topicCount': topics_per_phase,
+            'topics': [{
+                'topicName': f'Topic {phase}.{topic}',
+                'topicNumber': topic,
+                'infobitCount': infobits_per_topic,
+                'searchResult': {'webResult': [{'title': 'result', 'link': 'https://example.com'}], 'videoResult': []},
+                'infoBits': [{
+                    'text': f'Infobit {phase}.{topic}.{infobit}',
+                    'keywords': ['keyword'],
+                    'example': 'example',
+                    'quiz': {'text': f'Quiz {phase}.{topic}.{infobit}', 'type': 'mc', 'options': ['a', 'b', 'c'], 'answer': 'a'}
+                } for infobit in range(1, infobits_per_topic + 1)]
+            } for topic in range(1, topics_per_phase + 1)]
+        } for phase in range(1, phase_count + 1)]
+    }
@@ -0,0 +1,83 @@
+"""
+Compare the batched, parallel roadmap read with the one-query-per-row walk
+get_roadmap used to make, against DynamoDB Local.
+
+Usage:
+    python roadmap_read_benchmark.py [phase_count] [topics_per_phase] [infobits_per_topic] [runs]
+
+A generated roadmap is written, read back both ways, and deleted again. The
+report gives DynamoDB round trips and the median time of each read. The check
+fails if the two reads return different documents or if the batched read does
+not take fewer round trips.
+"""
+import statistics
+import sys
+import time
+import uuid
+
+from local_tables import ensure_tables, local_dynamodb, sample_roadmap
+
+from boto3.dynamodb.conditions import Key
+from dynamoBatch import RoundTripCounter, query_all
+from roadmapStore import assemble_roadmap, delete_roadmap_rows, read_roadmap, write_roadmap
+
+
+def sequential_read(dynamodb, roadmap_id, counter):
+    # The walk get_roadmap made before the read engine: one query per parent, one per quiz
+    roadmap = dynamodb.Table('Roadmaps').get_item(Key={'id': roadmap_id})['Item']
+    counter.add('GetItem')
+    phases = query_all(dynamodb, 'Phases', counter, KeyConditionExpression=Key('roadmapId').eq(roadmap_id))
+    topics_by_phase = {}
+    infobits_by_topic = {}
+    quizzes = {}
+    for phase in phases:
+        topics = query_all(dynamodb, 'Topics', counter, KeyConditionExpression=Key('phaseId').eq(phase['phaseId']))
+        topics_by_phase[phase['phaseId']] = topics
+        for topic in topics:
+            infobits = query_all(dynamodb, 'InfoBits', counter, KeyConditionExpression=Key('topicId').eq(topic['topicId']))
+            infobits_by_topic[topic['topicId']] = infobits
+            for infobit in infobits:
+                quiz = query_all(dynamodb, 'Quizzes', counter, KeyConditionExpression=Key('infoBitId').eq(infobit['infoBitId']))
+                quizzes[infobit['infoBitId']] = quiz[0]
+    return assemble_roadmap(roadmap, phases, topics_by_phase, infobits_by_topic, quizzes)
+
+
+def measure(read, runs):
+    timings = []
+    for _ in range(runs):
+        counter = RoundTripCounter()
+        started = time.perf_counter()
+        document = read(counter)
+        timings.append(time.perf_counter() - started)
+    return document, counter, statistics.median(timings)
+
+
+def main():
+    phase_count, topics_per_phase, infobits_per_topic, runs = (
+        [int(arg) for arg in sys.argv[1:5]] + [5, 6, 5, 5][len(sys.argv[1:5]):]
+    )
+    dynamodb = local_dynamodb()
+    ensure_tables(dynamodb)
+
+    roadmap_id = str(uuid.uuid4())
+    write_roadmap(dynamodb, roadmap_id, sample_roadmap(phase_count, topics_per_phase, infobits_per_topic))
+    try:
+        sequential, sequential_counter, sequential_time = measure(
+            lambda counter: sequential_read(dynamodb, roadmap_id, counter), runs)
+        batched, batched_counter, batched_time = measure(
+            lambda counter: read_roadmap(dynamodb, roadmap_id, counter)[0], runs)
+    finally:
+        delete_roadmap_rows(dynamodb, roadmap_id)
+
+    print(f"roadmap: {phase_count} phases, {topics_per_phase} topics each, {infobits_per_topic} infobits per topic")
+    print(f"sequential: {sequential_counter.total} round trips, {sequential_time * 1000:.1f} ms  {sequential_counter}")
+    print(f"batched:    {batched_counter.total} round trips, {batched_time * 1000:.1f} ms  {batched_counter}")
+
+    if batched != sequential:
+        sys.exit("The batched read returned a different roadmap")
+    if batched_counter.total >= sequential_counter.total:
+        sys.exit("The batched read did not save round trips")
+
+
+if __name__ == '__main__':
+    main()
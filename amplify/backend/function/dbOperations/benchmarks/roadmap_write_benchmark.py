@@ -0,0 +1,85 @@
+"""
+Compare the batched write pipeline with one put_item per row, the way
+save_roadmap used to write, against DynamoDB Local.
+
+Usage:
+    python roadmap_write_benchmark.py [phase_count] [topics_per_phase] [infobits_per_topic]
+
+The same generated roadmap is saved both ways under two ids, read back and
+deleted again. The report gives DynamoDB round trips and time for each save
+and the per-table summary from batch_write. The check fails if the two saves
+store different rows or if the batched save does not take fewer round trips.
+"""
+import json
+import sys
+import time
+import uuid
+
+from local_tables import ensure_tables, local_dynamodb, sample_roadmap
+
+from dynamoBatch import RoundTripCounter
+from roadmapStore import (
+    ROADMAP_TABLES, delete_roadmap_rows, read_roadmap_rows, roadmap_child_rows, roadmap_row, write_roadmap
+)
+
+
+def per_item_write(dynamodb, roadmap_id, roadmap, counter):
+    # The path save_roadmap took before the pipeline: every row is its own request
+    rows = roadmap_child_rows(roadmap_id, roadmap)
+    rows['Roadmaps'] = [roadmap_row(roadmap_id, roadmap)]
+    for table_name in ROADMAP_TABLES:
+        for item in rows[table_name]:
+            dynamodb.Table(table_name).put_item(Item=item)
+            counter.add('PutItem')
+
+
+def stored_rows(dynamodb, roadmap_id):
+    # The rows of a saved roadmap with its id taken out, so two saves compare equal
+    rows = read_roadmap_rows(dynamodb, roadmap_id)
+    rows['Roadmaps'] = [dynamodb.Table('Roadmaps').get_item(Key={'id': roadmap_id})['Item']]
+    return {
+        table_name: sorted(json.dumps(item, sort_keys=True, default=str).replace(roadmap_id, 'roadmap') for item in rows[table_name])
+        for table_name in ROADMAP_TABLES
+    }
+
+
+def main():
+    phase_count, topics_per_phase, infobits_per_topic = (
+        [int(arg) for arg in sys.argv[1:4]] + [5, 6, 5][len(sys.argv[1:4]):]
+    )
+    dynamodb = local_dynamodb()
+    ensure_tables(dynamodb)
+    roadmap = sample_roadmap(phase_count, topics_per_phase, infobits_per_topic)
+
+    per_item_id = str(uuid.uuid4())
+    batched_id = str(uuid.uuid4())
+    try:
+        per_item_counter = RoundTripCounter()
+        started = time.perf_counter()
+        per_item_write(dynamodb, per_item_id, roadmap, per_item_counter)
+        per_item_time = time.perf_counter() - started
+
+        batched_counter = RoundTripCounter()
+        started = time.perf_counter()
+        summary = write_roadmap(dynamodb, batched_id, roadmap, counter=batched_counter)
+        batched_time = time.perf_counter() - started
+
+        same_rows = stored_rows(dynamodb, per_item_id) == stored_rows(dynamodb, batched_id)
+    finally:
+        delete_roadmap_rows(dynamodb, per_item_id)
+        delete_roadmap_rows(dynamodb, batched_id)
+
+    print(f"roadmap: {phase_count} phases, {topics_per_phase} topics each, {infobits_per_topic} infobits per topic")
+    print(f"per item: {per_item_counter.total} round trips, {per_item_time * 1000:.1f} ms  {per_item_counter}")
+    print(f"batched:  {batched_counter.total} round trips, {batched_time * 1000:.1f} ms  {batched_counter}")
+    for table_name, table_summary in summary.items():
+        print(f"  {table_name}: {table_summary}")
+
+    if not same_rows:
+        sys.exit("The batched save stored different rows")
+    if batched_counter.total >= per_item_counter.total:
+        sys.exit("The batched save did not save round trips")
+
+
+if __name__ == '__main__':
+    main()
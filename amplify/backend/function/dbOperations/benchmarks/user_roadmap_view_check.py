@@ -0,0 +1,68 @@
+"""
+Check that GET /userRoadmap returns the user's answers with the infobits for
+every field set, including the ones that leave out the quiz answers.
+
+Usage:
+    python user_roadmap_view_check.py
+
+The roadmap is served from the container cache and the progress row is passed
+in, so no table is read. The check fails if a view with infoBits has an
+infobit without the user's answer, or a view without them gains infobits.
+"""
+import itertools
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(HERE, '..', 'src'),
+    os.path.join(HERE, '..', '..', 'skillsprintbackinfiniteLayer', 'lib', 'python'),
+]
+
+import index  # noqa: E402
+from roadmapStore import DETAIL_FIELDS  # noqa: E402
+
+ROADMAP_ID = 'roadmap'
+ROADMAP = {
+    'id': ROADMAP_ID, 'title': 'Python', 'phaseCount': 1, 'totalLessons': 1,
+    'phases': [{
+        'phaseNumber': 1, 'phaseDescription': 'Basics', 'topicCount': 1,
+        'topics': [{
+            'topicNumber': 1, 'topicName': 'Variables', 'infobitCount': 2,
+            'searchResult': {'webResult': [], 'videoResult': []},
+            'infoBits': [{
+                'infoBitId': f'infobit-{number}', 'text': f'infobit {number}', 'keywords': ['k'], 'example': 'e',
+                'quiz': {'text': f'quiz {number}', 'type': 'mc', 'options': ['a', 'b'], 'answer': 'a'}
+            } for number in (1, 2)]
+        }]
+    }]
+}
+USER_ROADMAP = {'status': 'active', 'currentLesson': 1, 'currentPhase': 1, 'quizAnswers': {'infobit-1': 'b'}}
+EXPECTED_ANSWERS = {'infobit-1': 'b', 'infobit-2': ''}
+
+
+def main():
+    index.roadmap_cache.put(ROADMAP_ID, ROADMAP, 1, 1)
+    views = [None] + [
+        {'phase': None, 'fields': fields, 'outline': False}
+        for count in range(len(DETAIL_FIELDS) + 1)
+        for fields in itertools.combinations(DETAIL_FIELDS, count)
+    ]
+    for view in views:
+        roadmap = index.get_user_roadmap('user', ROADMAP_ID, None, user_roadmap=USER_ROADMAP, view=view)
+        fields = DETAIL_FIELDS if view is None else view['fields']
+        topic = roadmap['phases'][0]['topics'][0]
+        if 'infoBits' not in fields:
+            if 'infoBits' in topic:
+                sys.exit(f"fields {','.join(fields)}: infobits returned without being asked for")
+            continue
+        answers = {infobit['infoBitId']: infobit.get('userAnswer') for infobit in topic['infoBits']}
+        if answers != EXPECTED_ANSWERS:
+            sys.exit(f"fields {','.join(fields)}: user answers {answers}, expected {EXPECTED_ANSWERS}")
+        print(f"fields {','.join(fields)}: ok")
+    if 'userAnswer' in ROADMAP['phases'][0]['topics'][0]['infoBits'][0]:
+        sys.exit("The cached roadmap was modified")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,31 @@
+import base64
+import copy
+import hashlib
 import json
+import os
+import time
+import uuid
 import boto3
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 import logging
 from decimal import Decimal
 
-dynamodb = boto3.resource('dynamodb')
+from dynamoBatch import RoundTripCounter, batch_get, batch_write, parallel_scan, query_all, scan_page
+from dynamoJson import dumps
+from httpCompression import compress_response
+from roadmapFingerprint import roadmap_shared, unindex_roadmap, unshare_roadmap
+from roadmapJobs import read_job_status
+from roadmapSnapshot import delete_roadmap_snapshot, load_roadmap_document, write_roadmap_snapshot
+from memoryCache import LRUCache
+from roadmapStore import (
+    DETAIL_FIELDS, PHASE_GENERATING, delete_roadmap_rows, diff_roadmap_rows, project_roadmap,
+    read_roadmap_rows, read_roadmap_view, roadmap_child_rows, roadmap_row, roadmap_version,
+    write_roadmap
+)
+
+# DYNAMODB_ENDPOINT points the function at DynamoDB Local when testing
+dynamodb = boto3.resource('dynamodb', endpoint_url=os.environ.get('DYNAMODB_ENDPOINT'))
 
 
 logger = logging.getLogger()
@@ -18,7 +39,44 @@ formatter = logging.Formatter(
 console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 
+DELETE_TIME_MARGIN_MS = 3000
+CATALOG_PAGE_SIZE = 20
+CATALOG_MAX_PAGE_SIZE = 100
+ROADMAP_CACHE_MAX_BYTES = int(os.environ.get('ROADMAP_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+ROADMAP_CACHE_TTL_SECONDS = int(os.environ.get('ROADMAP_CACHE_TTL_SECONDS', 60))
+# Answers written per UpdateItem, keeps the update expression well under its 4 KB limit
+ANSWERS_PER_UPDATE = 100
+PROGRESS_CURSOR_FIELDS = ('currentLesson', 'currentPhase', 'status')
+CATALOG_PROJECTION = 'id, title, description, phaseCount, imageURL, estimatedLearningDuration, goal, currentSkillLevel, desiredSkillLevel, dailyTime, totalLessons'
+# Roadmaps still being generated, or whose generation failed, carry a status and stay out of the catalog
+CATALOG_FILTER = {
+    'FilterExpression': 'attribute_not_exists(#status)',
+    'ExpressionAttributeNames': {'#status': 'status'}
+}
+
+# Compressed bodies are base64 encoded, which API Gateway only decodes once the
+# REST API lists binary media types ('*/*'), so this stays off until that is set
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'false').lower() == 'true'
+COMPRESSED_CACHE_MAX_BYTES = int(os.environ.get('COMPRESSED_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+
+
+
+class RoadmapShared(Exception):
+    """The roadmap is linked to other users through reuse, it cannot be edited or deleted."""
+
+
+# Assembled roadmaps, kept for the life of a warm container
+roadmap_cache = LRUCache(ROADMAP_CACHE_MAX_BYTES, ROADMAP_CACHE_TTL_SECONDS, name='roadmaps')
+# Encoded response bodies keyed by content coding and ETag
+compressed_body_cache = LRUCache(COMPRESSED_CACHE_MAX_BYTES, name='compressedBodies')
+
 def handler(event, context):
+    response = route_request(event, context)
+    if COMPRESS_RESPONSES:
+        response = compress_response(response, request_header(event, 'Accept-Encoding'), compressed_body_cache)
+    return response
+
+def route_request(event, context):
     try:
         http_method = event['httpMethod']
         path = event.get('path', "")
@@ -26,33 +84,97 @@ def handler(event, context):
         path_parameters = None
         roadmap_id = None
         user_id = None
+        job_id = None
         if path != '/allRoadmap':
             path_parameters = event.get('pathParameters', {})
             roadmap_id = path_parameters.get('roadmapId', "")
             user_id = path_parameters.get('userId', "")
+            job_id = path_parameters.get('jobId', "")
 
         if http_method == 'GET':
             if path == '/allRoadmap':
-                roadmaps = convert_decimals(get_all_roadmap_details(dynamodb))
+                query_parameters = event.get('queryStringParameters') or {}
+                if 'limit' in query_parameters or 'nextToken' in query_parameters:
+                    try:
+                        limit = parse_page_limit(query_parameters.get('limit'))
+                        page = get_roadmap_details_page(dynamodb, limit, query_parameters.get('nextToken'))
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'body': json.dumps({'error': str(e)}),
+                            'headers': {
+                                'Content-Type': 'application/json',
+                                'Access-Control-Allow-Origin': '*'
+                            }
+                        }
+                    body = dumps(page)
+                    etag = make_etag('catalog', body)
+                    if etag_matches(request_header(event, 'If-None-Match'), etag):
+                        return not_modified_response(etag)
+                    return {
+                        'statusCode': 200,
+                        'body': body,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Expose-Headers': 'ETag',
+                            'Cache-Control': 'no-cache',
+                            'ETag': etag
+                        }
+                    }
+
+                body = dumps(get_all_roadmap_details(dynamodb))
+                etag = make_etag('catalog', body)
+                if etag_matches(request_header(event, 'If-None-Match'), etag):
+                    return not_modified_response(etag)
                 return {
                     'statusCode': 200,
-                    'body': json.dumps(roadmaps),
+                    'body': body,
                     'headers': {
                         'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Expose-Headers': 'ETag',
+                        'Cache-Control': 'no-cache',
+                        'ETag': etag
                     }
                 }
             
             if roadmap_id and '/roadmap/' in path:
-                roadmap = get_roadmap(roadmap_id, dynamodb)
-                roadmap = convert_decimals(roadmap)
+                try:
+                    view = parse_roadmap_view(event.get('queryStringParameters'))
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'body': json.dumps({'error': str(e)}),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        }
+                    }
+                counter = RoundTripCounter()
+                if_none_match = request_header(event, 'If-None-Match')
+                if if_none_match:
+                    # Decided from the version attribute alone, nothing is assembled
+                    version = current_roadmap_version(roadmap_id, dynamodb, counter)
+                    if version is not None and etag_matches(if_none_match, roadmap_etag(roadmap_id, version, view)):
+                        logger.info(f"Roadmap {roadmap_id} not modified, checked with {counter}")
+                        return not_modified_response(roadmap_etag(roadmap_id, version, view))
+
+                if view:
+                    roadmap, version = get_roadmap_view(roadmap_id, dynamodb, view, counter)
+                else:
+                    roadmap, version = load_roadmap(roadmap_id, dynamodb, counter)
+                logger.info(f"Roadmap {roadmap_id} assembled with {counter}, cache: {roadmap_cache.stats()}")
                 if roadmap:
                     return {
                         'statusCode': 200,
-                        'body': json.dumps(roadmap),
+                        'body': dumps(roadmap),
                         'headers': {
                             'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
+                            'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Expose-Headers': 'ETag',
+                            'Cache-Control': 'no-cache',
+                            'ETag': roadmap_etag(roadmap_id, version, view)
                         }
                     }
                 else:
@@ -64,13 +186,36 @@ def handler(event, context):
                             'Access-Control-Allow-Origin': '*'
                         }
                     }
+
+            if job_id and '/jobs/' in path:
+                # Polled while a roadmap generates, a single GetItem of the job's status fields
+                job_status = read_job_status(dynamodb, job_id)
+                if job_status:
+                    return {
+                        'statusCode': 200,
+                        'body': dumps(job_status),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*',
+                            'Cache-Control': 'no-cache'
+                        }
+                    }
+                else:
+                    return {
+                        'statusCode': 404,
+                        'body': json.dumps({'error': 'Job not found'}),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        }
+                    }
             
             if user_id and '/allUserRoadmaps/' in path:
-                user_roadmaps = convert_decimals(fetch_all_user_roadmaps(user_id, dynamodb))
+                user_roadmaps = fetch_all_user_roadmaps(user_id, dynamodb)
                 if user_roadmaps:
                     return {
                         'statusCode': 200,
-                        'body': json.dumps(user_roadmaps),
+                        'body': dumps(user_roadmaps),
                         'headers': {
                             'Content-Type': 'application/json',
                             'Access-Control-Allow-Origin': '*'
@@ -87,14 +232,39 @@ def handler(event, context):
                     }
             
             if user_id and roadmap_id and '/userRoadmap/' in path:
-                user_roadmap = convert_decimals(get_user_roadmap(user_id, roadmap_id, dynamodb))
+                try:
+                    view = parse_roadmap_view(event.get('queryStringParameters'))
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'body': json.dumps({'error': str(e)}),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        }
+                    }
+                counter = RoundTripCounter()
+                progress = get_user_roadmap_progress(user_id, roadmap_id, dynamodb, counter)
+                version = current_roadmap_version(roadmap_id, dynamodb, counter)
+                etag = None
+                if progress and version is not None:
+                    etag = user_roadmap_etag(roadmap_id, version, progress, view)
+                    if etag_matches(request_header(event, 'If-None-Match'), etag):
+                        logger.info(f"User roadmap {roadmap_id} not modified, checked with {counter}")
+                        return not_modified_response(etag)
+
+                user_roadmap = get_user_roadmap(user_id, roadmap_id, dynamodb, counter, progress, view)
+                logger.info(f"User roadmap {roadmap_id} assembled with {counter}, cache: {roadmap_cache.stats()}")
                 if user_roadmap:
                     return {
                         'statusCode': 200,
-                        'body': json.dumps(user_roadmap),
+                        'body': dumps(user_roadmap),
                         'headers': {
                             'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
+                            'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Expose-Headers': 'ETag',
+                            'Cache-Control': 'no-cache',
+                            'ETag': etag
                         }
                     }
                 else:
@@ -117,7 +287,7 @@ def handler(event, context):
                 }
 
         if http_method == 'POST':
-            roadmap_data = json.loads(event['body'])
+            roadmap_data = json.loads(request_body(event))
             
             if path == '/allRoadmap':
                 save_roadmap(roadmap_data, dynamodb)
@@ -131,10 +301,20 @@ def handler(event, context):
                 }
 
             if roadmap_id and '/roadmap/' in path:
-                update_roadmap(roadmap_id, roadmap_data, dynamodb)
+                try:
+                    diff = update_roadmap(roadmap_id, roadmap_data, dynamodb)
+                except RoadmapShared as e:
+                    return {
+                        'statusCode': 409,
+                        'body': json.dumps({'error': str(e)}),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        }
+                    }
                 return {
                     'statusCode': 200,
-                    'body': json.dumps({'message': 'Roadmap updated successfully'}),
+                    'body': json.dumps({'message': 'Roadmap updated successfully', 'diff': diff}),
                     'headers': {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
@@ -153,12 +333,67 @@ def handler(event, context):
                     }
                 }
 
+        elif http_method == 'PATCH':
+            if user_id and roadmap_id and '/userRoadmap/' in path:
+                try:
+                    answers, cursor = parse_progress_patch(roadmap_id, request_body(event))
+                    result = apply_user_roadmap_progress(user_id, roadmap_id, answers, cursor, dynamodb)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'body': json.dumps({'error': str(e)}),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        }
+                    }
+                if result is None:
+                    return {
+                        'statusCode': 404,
+                        'body': json.dumps({'error': 'User roadmap not found'}),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        }
+                    }
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({'message': 'User roadmap progress updated successfully', **result}),
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    }
+                }
+
         elif http_method == 'DELETE':
             if roadmap_id and '/roadmap/' in path:
-                delete_roadmap(roadmap_id, dynamodb)
+                try:
+                    result = delete_roadmap(roadmap_id, dynamodb, context)
+                except RoadmapShared as e:
+                    return {
+                        'statusCode': 409,
+                        'body': json.dumps({'error': str(e)}),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        }
+                    }
+                if not result['complete']:
+                    return {
+                        'statusCode': 202,
+                        'body': json.dumps({
+                            'message': 'Roadmap partially deleted, repeat the request to finish',
+                            'deleted': result['deleted'],
+                            'remaining': result['remaining']
+                        }),
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        }
+                    }
                 return {
                     'statusCode': 200,
-                    'body': json.dumps({'message': 'Roadmap deleted successfully'}),
+                    'body': json.dumps({'message': 'Roadmap deleted successfully', 'deleted': result['deleted']}),
                     'headers': {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
@@ -202,108 +437,203 @@ def handler(event, context):
         
 
 
-def get_roadmap(roadmap_id, dynamodb):
+def request_header(event, name):
+    # API Gateway passes headers with the client's casing
+    headers = event.get('headers') or {}
+    for key, value in headers.items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def request_body(event):
+    # With binary media types enabled on the API, request bodies arrive base64 encoded
+    body = event.get('body')
+    if body and event.get('isBase64Encoded'):
+        return base64.b64decode(body).decode('utf-8')
+    return body
+
+def make_etag(*parts):
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+def roadmap_etag(roadmap_id, version, view=None):
+    return make_etag('roadmap', roadmap_id, version, *view_variant(view))
+
+def user_roadmap_etag(roadmap_id, version, progress, view=None):
+    return make_etag(
+        'userRoadmap', roadmap_id, version, dumps(progress, sort_keys=True), *view_variant(view)
+    )
+
+def parse_roadmap_view(query_parameters):
+    """
+    Read the phase, fields and view query parameters of a roadmap request.
+    Returns None when the whole roadmap is asked for.
+    """
+    query_parameters = query_parameters or {}
+    phase = query_parameters.get('phase')
+    fields = query_parameters.get('fields')
+    view_name = query_parameters.get('view')
+    if phase is None and fields is None and view_name is None:
+        return None
+
+    view = {'phase': None, 'fields': DETAIL_FIELDS, 'outline': False}
+    if phase is not None:
+        try:
+            view['phase'] = int(phase)
+        except ValueError:
+            view['phase'] = 0
+        if view['phase'] < 1:
+            raise ValueError("phase must be a positive integer")
+
+    if fields is not None:
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in requested if field not in DETAIL_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(DETAIL_FIELDS)}")
+        view['fields'] = tuple(field for field in DETAIL_FIELDS if field in requested)
+
+    if view_name is not None:
+        if view_name != 'progress':
+            raise ValueError("view must be 'progress'")
+        view['outline'] = True
+
+    return view
+
+def view_variant(view):
+    if not view:
+        return ()
+    return (f"phase={view['phase']};fields={','.join(view['fields'])};outline={view['outline']}",)
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match or not etag:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in [
+        candidate[2:] if candidate.startswith('W/') else candidate for candidate in candidates
+    ]
+
+def not_modified_response(etag):
+    return {
+        'statusCode': 304,
+        'body': '',
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'Cache-Control': 'no-cache',
+            'ETag': etag
+        }
+    }
+
+def current_roadmap_version(roadmap_id, dynamodb, counter=None):
+    """
+    Version of a roadmap, from a fresh cache entry when there is one,
+    otherwise from a projected get_item. None if the roadmap does not exist.
+    """
+    cached = roadmap_cache.get(roadmap_id)
+    if cached and cached.fresh:
+        return cached.version
+    return roadmap_version(dynamodb, roadmap_id, counter)
+
+def cached_roadmap(roadmap_id, dynamodb, counter=None):
+    """
+    Returns (roadmap, version) from the container cache, or (None, None).
+    """
+    cached = roadmap_cache.get(roadmap_id)
+    if not cached:
+        return None, None
+    if cached.fresh:
+        return cached.value, cached.version
+
+    # Past its TTL: one projected get_item decides whether it is still current
+    if roadmap_version(dynamodb, roadmap_id, counter) == cached.version:
+        roadmap_cache.refresh(roadmap_id)
+        return cached.value, cached.version
+    roadmap_cache.invalidate(roadmap_id)
+    return None, None
+
+def load_roadmap(roadmap_id, dynamodb, counter=None):
+    """
+    Returns (roadmap, version). The roadmap may be shared with the container
+    cache, copy it before modifying.
+    """
     try:
-        roadmap_response = dynamodb.Table('Roadmaps').get_item(
-            Key={'id': roadmap_id}
-        )
-        roadmap = roadmap_response.get('Item')
+        roadmap, version = cached_roadmap(roadmap_id, dynamodb, counter)
+        if roadmap:
+            return roadmap, version
+
+        roadmap, version = load_roadmap_document(dynamodb, roadmap_id, counter)
         if not roadmap:
             raise ValueError(f"Roadmap with ID {roadmap_id} not found.")
-        original_object = {
-            'id' : roadmap_id,
-            'title': roadmap['title'],
-            'description': roadmap['description'],
-            'imageURL': roadmap['imageURL'],
-            'estimatedLearningDuration': roadmap['estimatedLearningDuration'],
-            'goal': roadmap['goal'],
-            'currentSkillLevel': roadmap['currentSkillLevel'],
-            'desiredSkillLevel': roadmap['desiredSkillLevel'],
-            'dailyTime': roadmap['dailyTime'],
-            'phaseCount': roadmap['phaseCount'],
-            'totalLessons': roadmap['totalLessons'],
-            'phases': []
-        }
 
-        phases_response = dynamodb.Table('Phases').query(
-            KeyConditionExpression=Key('roadmapId').eq(roadmap_id)
-        )
-        phases = phases_response['Items']
-
-        for phase in phases:
-            phase_object = {
-                'phaseDescription': phase['phaseDescription'],
-                'topicCount' : phase['topicCount'],
-                'phaseNumber' : phase['phaseNumber'],
-                'topics': []
-            }
-            phase_id = phase['phaseId']
+        # A roadmap still being generated gets a new version per phase, the cache would hide them
+        if not roadmap_generating(roadmap):
+            roadmap_cache.put(roadmap_id, roadmap, len(dumps(roadmap)), version)
+        return roadmap, version
 
-            topics_response = dynamodb.Table('Topics').query(
-                KeyConditionExpression=Key('phaseId').eq(phase_id)
-            )
-            topics = topics_response['Items']
-
-            for topic in topics:
-                topic_object = {
-                    'topicName': topic['topicName'],
-                    'searchResult' : topic['searchResult'],
-                    'topicNumber' : topic['topicNumber'],
-                    'infobitCount': topic['infobitCount'],
-                    'infoBits': []
-                }
-                topic_id = topic['topicId']
-
-                infobits_response = dynamodb.Table('InfoBits').query(
-                    KeyConditionExpression=Key('topicId').eq(topic_id)
-                )
-                infobits = infobits_response['Items']
-
-                for infobit in infobits:
-                    quiz_response = dynamodb.Table('Quizzes').query(
-                        KeyConditionExpression=Key('infoBitId').eq(infobit['infoBitId'])
-                    )
-                    quiz = quiz_response['Items'][0]
-
-                    infobit_object = {
-                        'infoBitId': infobit['infoBitId'],
-                        'text': infobit['text'],
-                        'keywords': infobit['keywords'],
-                        'example': infobit.get('example', ''),
-                        'quiz': {
-                            'text': quiz['text'],
-                            'type': quiz['type'],
-                            'options': quiz.get('options', []),
-                            'answer': quiz['answer']
-                        }
-                    }
-                    topic_object['infoBits'].append(infobit_object)
+    except Exception as e:
+        logger.error(f"Error: While retrieving from DB: {str(e)}")
+        raise
 
-                phase_object['topics'].append(topic_object)
-            original_object['phases'].append(phase_object)
+def roadmap_generating(roadmap):
+    return any(phase.get('status') == PHASE_GENERATING for phase in roadmap['phases'])
 
-        return original_object
+def get_roadmap(roadmap_id, dynamodb, counter=None):
+    roadmap, _ = load_roadmap(roadmap_id, dynamodb, counter)
+    return roadmap
+
+def get_roadmap_view(roadmap_id, dynamodb, view, counter=None):
+    """
+    Returns (roadmap, version) limited to the view from parse_roadmap_view.
+    A cached roadmap is projected, otherwise only the partitions the view
+    needs are read. Partial documents are not cached. The result is a new
+    object and can be modified.
+    """
+    try:
+        roadmap, version = cached_roadmap(roadmap_id, dynamodb, counter)
+        if roadmap:
+            return project_roadmap(roadmap, view['fields'], view['phase'], view['outline']), version
+
+        roadmap, version = read_roadmap_view(
+            dynamodb, roadmap_id, view['fields'], view['phase'], view['outline'], counter
+        )
+        if not roadmap:
+            raise ValueError(f"Roadmap with ID {roadmap_id} not found.")
+        return roadmap, version
 
     except Exception as e:
         logger.error(f"Error: While retrieving from DB: {str(e)}")
         raise
 
-def get_user_roadmap(user_id, roadmap_id, dynamodb):
+def get_user_roadmap_progress(user_id, roadmap_id, dynamodb, counter=None):
+    user_roadmap_response = dynamodb.Table('UserRoadmaps').get_item(
+        Key={'userId': user_id, 'roadmapId': roadmap_id}
+    )
+    if counter is not None:
+        counter.add('GetItem')
+    return user_roadmap_response.get('Item')
+
+def get_user_roadmap(user_id, roadmap_id, dynamodb, counter=None, user_roadmap=None, view=None):
     try:
-        roadmap = get_roadmap(roadmap_id, dynamodb)
+        if view:
+            roadmap, _ = get_roadmap_view(roadmap_id, dynamodb, view, counter)
+        else:
+            roadmap = copy.deepcopy(get_roadmap(roadmap_id, dynamodb, counter))
         if not roadmap:
             raise ValueError(f"Roadmap with ID {roadmap_id} not found.")
         
-        user_roadmap_response = dynamodb.Table('UserRoadmaps').get_item(
-            Key={'userId': user_id, 'roadmapId': roadmap_id}
-        )
-        user_roadmap = user_roadmap_response.get('Item')
+        if user_roadmap is None:
+            user_roadmap = get_user_roadmap_progress(user_id, roadmap_id, dynamodb, counter)
         if not user_roadmap:
             raise ValueError(f"User roadmap not found for user {user_id} and roadmap {roadmap_id}.")
         
         roadmap['status'] = user_roadmap['status']
         roadmap['currentLesson'] = user_roadmap['currentLesson']
         roadmap['currentPhase'] = user_roadmap['currentPhase']
+        # userAnswer is the user's own answer, it comes with the infobits whether or not the quiz answers do
+        if view and (view['outline'] or 'infoBits' not in view['fields']):
+            logging.info(f"Roadmap view for user {user_id} and roadmap {roadmap_id} fetched successfully.")
+            return roadmap
+
         for phase in roadmap['phases']:
             for topic in phase['topics']:
                 for infobit in topic['infoBits']:
@@ -320,20 +650,62 @@ def get_user_roadmap(user_id, roadmap_id, dynamodb):
 
 
 def update_roadmap(roadmap_id, updated_roadmap, dynamodb):
+    """
+    Bring the stored roadmap in line with updated_roadmap, writing only the
+    rows that differ and deleting the ones that no longer exist.
+    Returns the per-table diff stats and the resulting version.
+    """
     try:
+        counter = RoundTripCounter()
         existing_roadmap_response = dynamodb.Table('Roadmaps').get_item(
             Key={'id': roadmap_id}
         )
+        counter.add('GetItem')
         existing_roadmap = existing_roadmap_response.get('Item')
         if not existing_roadmap:
             raise ValueError(f"Roadmap with ID {roadmap_id} not found.")
+        if roadmap_shared(existing_roadmap):
+            raise RoadmapShared(f"Roadmap {roadmap_id} is shared with {existing_roadmap['reuseCount']} other user(s)")
         updated_roadmap = convert_decimals(updated_roadmap)
+
+        start_time = time.time()
+        requests_by_table, stats = diff_roadmap_rows(
+            read_roadmap_rows(dynamodb, roadmap_id, counter),
+            roadmap_child_rows(roadmap_id, updated_roadmap)
+        )
+        header = {
+            key: value for key, value in roadmap_row(roadmap_id, updated_roadmap).items()
+            if key not in ('version', 'status')
+        }
+        header_changed = any(existing_roadmap.get(key) != value for key, value in header.items())
+
+        if not requests_by_table and not header_changed:
+            version = int(existing_roadmap.get('version', 0))
+            logging.info(f"Roadmap {roadmap_id} unchanged, nothing written ({counter})")
+            return {'tables': stats, 'headerChanged': False, 'version': version}
+
+        # An edited roadmap no longer answers the request it was generated for
+        if existing_roadmap.get('fingerprint'):
+            unindex_roadmap(dynamodb, existing_roadmap['fingerprint'], roadmap_id)
+        # Readers fall back to the normalized tables until the new snapshot is written
+        delete_roadmap_snapshot(dynamodb, roadmap_id, counter)
+        roadmap_cache.invalidate(roadmap_id)
+
+        write_summary = batch_write(dynamodb, requests_by_table, counter)
+        logging.info(f"Roadmap {roadmap_id} children diffed and written in {time.time() - start_time:.2f}s: {stats}, {write_summary}")
+
+        # The version only moves once the children are written, so a reader that
+        # assembled a half-updated tree never caches it under the new version
         response = dynamodb.Table('Roadmaps').update_item(
             Key={'id': roadmap_id},
             UpdateExpression="SET title = :title, description = :description, imageURL = :imageURL, "
                              "estimatedLearningDuration = :estimatedLearningDuration, goal = :goal, "
                              "currentSkillLevel = :currentSkillLevel, desiredSkillLevel = :desiredSkillLevel, "
-                             ", dailyTime = :dailyTime, phaseCount = :phaseCount, totalLessons = :totalLessons",
+                             "dailyTime = :dailyTime, phaseCount = :phaseCount, totalLessons = :totalLessons, "
+                             "#version = if_not_exists(#version, :zero) + :one",
+            ExpressionAttributeNames={
+                '#version': 'version'
+            },
             ExpressionAttributeValues={
                 ':title': updated_roadmap['title'],
                 ':description': updated_roadmap['description'],
@@ -344,67 +716,19 @@ def update_roadmap(roadmap_id, updated_roadmap, dynamodb):
                 ':desiredSkillLevel': updated_roadmap['desiredSkillLevel'],
                 ':dailyTime': updated_roadmap['dailyTime'],
                 ':phaseCount': updated_roadmap['phaseCount'],
-                ':totalLessons': updated_roadmap['totalLessons']
+                ':totalLessons': updated_roadmap['totalLessons'],
+                ':zero': 0,
+                ':one': 1
             },
             ReturnValues="UPDATED_NEW"
         )
+        counter.add('UpdateItem')
+        version = int(response['Attributes']['version'])
 
-        # Update or recreate Phases, Topics, InfoBits, and Quizzes
-        for phase_index, phase in enumerate(updated_roadmap['phases']):
-            phase_id = f"{roadmap_id}#PHASE#{phase_index + 1}"
-            dynamodb.Table('Phases').put_item(
-                Item={
-                    'roadmapId': roadmap_id,
-                    'phaseNumber': phase_index + 1,
-                    'phaseId': phase_id,
-                    'phaseDescription': phase['phaseDescription'],
-                    'topicCount':phase['topicCount']
-                }
-            )
-
-            # Update or recreate Topics
-            for topic_index, topic in enumerate(phase['topics']):
-                topic_id = f"{phase_id}#TOPIC#{topic_index + 1}"
-                dynamodb.Table('Topics').put_item(
-                    Item={
-                        'phaseId': phase_id,
-                        'topicNumber': int(topic['topicNumber']),
-                        'topicId': topic_id,
-                        'topicName': topic['topicName'],
-                        'searchResult': topic['searchResult'],
-                        'infobitCount': topic['infobitCount']
-                    }
-                )
-
-                # Update or recreate InfoBits
-                for infobit_index, infobit in enumerate(topic['infoBits']):
-                    infobit_id = f"{topic_id}#INFOBIT#{infobit_index + 1}"
-                    dynamodb.Table('InfoBits').put_item(
-                        Item={
-                            'topicId': topic_id,
-                            'infoBitNumber': infobit_index + 1,
-                            'infoBitId': infobit_id,
-                            'text': infobit['text'],
-                            'keywords': infobit['keywords'],
-                            'example': infobit.get('example', "")
-                        }
-                    )
-
-                    # Update or recreate Quizzes
-                    quiz = infobit['quiz']
-                    dynamodb.Table('Quizzes').put_item(
-                        Item={
-                            'infoBitId': infobit_id,
-                            'quizNumber': infobit_index + 1,
-                            'text': quiz['text'],
-                            'type': quiz['type'],
-                            'options': quiz.get('options', ''),
-                            'answer': quiz['answer']
-                        }
-                    )
+        write_roadmap_snapshot(dynamodb, roadmap_id, updated_roadmap, version, counter)
 
-        logging.info(f"Roadmap with ID {roadmap_id} updated successfully.")
-        logging.info(f"dynamodb response= {response}")
+        logging.info(f"Roadmap with ID {roadmap_id} updated successfully to version {version} with {counter}.")
+        return {'tables': stats, 'headerChanged': header_changed, 'version': version}
     except Exception as e:
         raise
 
@@ -446,134 +770,231 @@ def update_user_roadmap(user_id, roadmap_id, user_roadmap, dynamodb):
         raise
 
 
-def delete_roadmap(roadmap_id, dynamodb):
+def parse_progress_patch(roadmap_id, body):
+    """
+    Read a progress patch: {"answers": {infoBitId: answer} or a list of such
+    events applied in order, "currentLesson", "currentPhase", "status"}.
+    Returns (answers, cursor), later events for the same infobit win.
+    """
     try:
-        # Fetch the existing roadmap
-        roadmap_response = dynamodb.Table('Roadmaps').get_item(
-            Key={'id': roadmap_id}
-        )
-        roadmap = roadmap_response.get('Item')
-        if not roadmap:
-            raise ValueError(f"Roadmap with ID {roadmap_id} not found.")
-        
-        # Delete Phases
-        phases_response = dynamodb.Table('Phases').query(
-            KeyConditionExpression=Key('roadmapId').eq(roadmap_id)
-        )
-        phases = phases_response['Items']
-
-        for phase in phases:
-            phase_id = phase['phaseId']
+        patch = json.loads(body or '{}', parse_float=Decimal)
+    except ValueError:
+        raise ValueError("Body must be valid JSON")
+    if not isinstance(patch, dict):
+        raise ValueError("Body must be a JSON object")
+
+    events = patch.get('answers', {})
+    if isinstance(events, dict):
+        events = [events]
+    if not isinstance(events, list) or not all(isinstance(answer_event, dict) for answer_event in events):
+        raise ValueError("answers must be an object or a list of objects")
+
+    answers = {}
+    for answer_event in events:
+        for infobit_id, answer in answer_event.items():
+            if not infobit_id.startswith(f"{roadmap_id}#PHASE#"):
+                raise ValueError(f"InfoBit {infobit_id} does not belong to roadmap {roadmap_id}")
+            answers[infobit_id] = answer
+
+    cursor = {field: patch[field] for field in PROGRESS_CURSOR_FIELDS if field in patch}
+    if not answers and not cursor:
+        raise ValueError("Nothing to update")
+    return answers, cursor
+
+def apply_user_roadmap_progress(user_id, roadmap_id, answers, cursor, dynamodb):
+    """
+    Write answers into quizAnswers with one SET per answered infobit instead of
+    rewriting the whole map, so the cost depends on the batch and not on the
+    roadmap size. Batches up to ANSWERS_PER_UPDATE answers take a single
+    UpdateItem; the cursor is moved with the last one.
 
-            # Delete Topics for each Phase
-            topics_response = dynamodb.Table('Topics').query(
-                KeyConditionExpression=Key('phaseId').eq(phase_id)
+    Returns {'applied': n, 'updates': n}, or None if the user roadmap does not exist.
+    """
+    try:
+        answer_items = list(answers.items())
+        batches = [answer_items[i:i + ANSWERS_PER_UPDATE] for i in range(0, len(answer_items), ANSWERS_PER_UPDATE)] or [[]]
+
+        for batch_index, batch in enumerate(batches):
+            assignments = []
+            attribute_names = {}
+            attribute_values = {}
+            for index, (infobit_id, answer) in enumerate(batch):
+                assignments.append(f"quizAnswers.#a{index} = :a{index}")
+                attribute_names[f"#a{index}"] = infobit_id
+                attribute_values[f":a{index}"] = answer
+
+            if batch_index == len(batches) - 1:
+                for field, value in cursor.items():
+                    assignments.append(f"#{field} = :{field}")
+                    attribute_names[f"#{field}"] = field
+                    attribute_values[f":{field}"] = value
+
+            dynamodb.Table('UserRoadmaps').update_item(
+                Key={
+                    'userId': user_id,
+                    'roadmapId': roadmap_id
+                },
+                UpdateExpression="SET " + ", ".join(assignments),
+                ConditionExpression="attribute_exists(userId)",
+                ExpressionAttributeNames=attribute_names,
+                ExpressionAttributeValues=attribute_values
             )
-            topics = topics_response['Items']
 
-            for topic in topics:
-                topic_id = topic['topicId']
+        logging.info(f"User roadmap for user {user_id} and roadmap {roadmap_id} patched: {len(answer_items)} answers, cursor {cursor}, {len(batches)} updates")
+        return {'applied': len(answer_items), 'updates': len(batches)}
 
-                # Delete InfoBits for each Topic
-                infobits_response = dynamodb.Table('InfoBits').query(
-                    KeyConditionExpression=Key('topicId').eq(topic_id)
-                )
-                infobits = infobits_response['Items']
-
-                for infobit in infobits:
-                    infobit_id = infobit['infoBitId']
-
-                    # Delete Quizzes for each InfoBit
-                    dynamodb.Table('Quizzes').delete_item(
-                        Key={'infoBitId': infobit_id}
-                    )
-
-                    # Delete InfoBit
-                    dynamodb.Table('InfoBits').delete_item(
-                        Key={'topicId': topic_id, 'infoBitId': infobit_id}
-                    )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        logging.error(f"Error patching user roadmap for user {user_id} and roadmap {roadmap_id}: {str(e)}")
+        raise
 
-                # Delete Topic
-                dynamodb.Table('Topics').delete_item(
-                    Key={'phaseId': phase_id, 'topicId': topic_id}
-                )
+    except Exception as e:
+        logging.error(f"Error patching user roadmap for user {user_id} and roadmap {roadmap_id}: {str(e)}")
+        raise
 
-            # Delete Phase
-            dynamodb.Table('Phases').delete_item(
-                Key={'roadmapId': roadmap_id, 'phaseId': phase_id}
-            )
 
-        dynamodb.Table('Roadmaps').delete_item(
+def delete_roadmap(roadmap_id, dynamodb, context=None):
+    try:
+        # Fetch the existing roadmap
+        roadmap_response = dynamodb.Table('Roadmaps').get_item(
             Key={'id': roadmap_id}
         )
+        roadmap = roadmap_response.get('Item')
+        if not roadmap:
+            raise ValueError(f"Roadmap with ID {roadmap_id} not found.")
+        if roadmap_shared(roadmap):
+            raise RoadmapShared(f"Roadmap {roadmap_id} is shared with {roadmap['reuseCount']} other user(s)")
+        if roadmap.get('fingerprint'):
+            unindex_roadmap(dynamodb, roadmap['fingerprint'], roadmap_id)
+
+        # Stop between levels once the invocation is close to its timeout,
+        # the next call finishes the remaining rows.
+        has_time_left = None
+        if context is not None:
+            has_time_left = lambda: context.get_remaining_time_in_millis() > DELETE_TIME_MARGIN_MS
+
+        counter = RoundTripCounter()
+        delete_roadmap_snapshot(dynamodb, roadmap_id, counter)
+        roadmap_cache.invalidate(roadmap_id)
+        result = delete_roadmap_rows(dynamodb, roadmap_id, counter, has_time_left)
+
+        if result['complete']:
+            logging.info(f"Roadmap with ID {roadmap_id} and all related data deleted successfully: {result['deleted']}, {counter}")
+        else:
+            logging.info(f"Roadmap with ID {roadmap_id} partially deleted: {result['deleted']}, left {result['remaining']}, {counter}")
+        return result
 
-        logging.info(f"Roadmap with ID {roadmap_id} and all related data deleted successfully.")
-
+    except RoadmapShared:
+        raise
     except Exception as e:
         logging.error(f"Error while deleting roadmap: {str(e)}")
         raise
 
 def delete_user_roadmap(user_id, roadmap_id, dynamodb):
     try:
-        dynamodb.Table('UserRoadmaps').delete_item(
+        deleted = dynamodb.Table('UserRoadmaps').delete_item(
             Key={
                 'userId': user_id,
                 'roadmapId': roadmap_id
-            }
+            },
+            ReturnValues='ALL_OLD'
         )
+        if deleted.get('Attributes'):
+            unshare_roadmap(dynamodb, roadmap_id)
         logging.info(f"User {user_id}'s relationship with roadmap {roadmap_id} deleted successfully.")
 
     except Exception as e:
         logging.error(f"Error while deleting user-roadmap relationship for user {user_id} and roadmap {roadmap_id}: {str(e)}")
         raise
 
+def format_roadmap_details(item):
+    return {
+        'id': item['id'],
+        'title': item['title'],
+        'description': item['description'],
+        'imageURL': item['imageURL'],
+        'estimatedLearningDuration': item['estimatedLearningDuration'],
+        'goal': item['goal'],
+        'currentSkillLevel': item['currentSkillLevel'],
+        'desiredSkillLevel': item['desiredSkillLevel'],
+        'dailyTime': item['dailyTime'],
+        'phaseCount': item['phaseCount'],
+        'totalLessons': item['totalLessons']
+    }
+
+def parse_page_limit(limit):
+    if limit is None:
+        return CATALOG_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a positive integer")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, CATALOG_MAX_PAGE_SIZE)
+
 def get_all_roadmap_details(dynamodb):
+    """
+    Bulk export of the whole catalog using parallel scan segments.
+    """
     try:
-        # Scan the Roadmaps table to get all items
-        response = dynamodb.Table('Roadmaps').scan(
-            ProjectionExpression='id, title, description, phaseCount, imageURL, estimatedLearningDuration, goal, currentSkillLevel, desiredSkillLevel, dailyTime, totalLessons'
-        )
+        counter = RoundTripCounter()
+        items = parallel_scan(dynamodb, 'Roadmaps', counter, ProjectionExpression=CATALOG_PROJECTION, **CATALOG_FILTER)
 
-        roadmap_details = []
-        for item in response['Items']:
-            roadmap_details.append({
-                'id': item['id'],
-                'title': item['title'],
-                'description': item['description'],
-                'imageURL': item['imageURL'],
-                'estimatedLearningDuration': item['estimatedLearningDuration'],
-                'goal': item['goal'],
-                'currentSkillLevel': item['currentSkillLevel'],
-                'desiredSkillLevel': item['desiredSkillLevel'],
-                'dailyTime': item['dailyTime'],
-                'phaseCount': item['phaseCount'],
-                'totalLessons': item['totalLessons']
-            })
-        
-        logging.info(f"Fetched {len(roadmap_details)} roadmap details.")
+        roadmap_details = [format_roadmap_details(item) for item in items]
+
+        logging.info(f"Fetched {len(roadmap_details)} roadmap details with {counter}.")
         return roadmap_details
 
     except Exception as e:
         logging.error(f"Error while retrieving roadmap details: {str(e)}")
         raise
 
+def get_roadmap_details_page(dynamodb, limit, next_token=None):
+    """
+    One page of the catalog. Pass the returned nextToken back to get the next page;
+    it is None once the catalog is exhausted. The limit counts roadmaps before
+    the unfinished ones are filtered out, a page can come back short.
+    """
+    try:
+        items, next_token = scan_page(
+            dynamodb, 'Roadmaps', limit, next_token,
+            ProjectionExpression=CATALOG_PROJECTION, **CATALOG_FILTER
+        )
+
+        roadmap_details = [format_roadmap_details(item) for item in items]
+
+        logging.info(f"Fetched a page of {len(roadmap_details)} roadmap details.")
+        return {'roadmaps': roadmap_details, 'nextToken': next_token}
+
+    except Exception as e:
+        logging.error(f"Error while retrieving roadmap details page: {str(e)}")
+        raise
+
 def fetch_all_user_roadmaps(user_id, dynamodb):
     try:
-        user_roadmaps_response = dynamodb.Table('UserRoadmaps').query(
+        counter = RoundTripCounter()
+        user_roadmaps = query_all(
+            dynamodb, 'UserRoadmaps', counter,
             KeyConditionExpression=Key('userId').eq(user_id)
         )
-        user_roadmaps = user_roadmaps_response['Items']
+
+        # One BatchGetItem per 100 enrollments, chunks are fetched concurrently
+        roadmaps = {
+            roadmap['id']: roadmap
+            for roadmap in batch_get(
+                dynamodb, 'Roadmaps',
+                [{'id': user_roadmap['roadmapId']} for user_roadmap in user_roadmaps],
+                counter,
+                projection='id, title, description, imageURL, estimatedLearningDuration, goal, currentSkillLevel, desiredSkillLevel, dailyTime, totalLessons, phaseCount'
+            )
+        }
 
         roadmap_details = []
 
         for user_roadmap in user_roadmaps:
-            roadmap_id = user_roadmap['roadmapId']
-
-            roadmap_response = dynamodb.Table('Roadmaps').get_item(
-                Key={'id': roadmap_id},
-                ProjectionExpression='id, title, description, imageURL, estimatedLearningDuration, goal, currentSkillLevel, desiredSkillLevel, dailyTime, totalLessons, phaseCount'
-            )
-            roadmap = roadmap_response.get('Item')
+            roadmap = roadmaps.get(user_roadmap['roadmapId'])
 
             if roadmap:
                 roadmap_details.append({
@@ -593,7 +1014,7 @@ def fetch_all_user_roadmaps(user_id, dynamodb):
                     'phaseCount': roadmap['phaseCount']
                 })
 
-        logging.info(f"Fetched {len(roadmap_details)} roadmaps for user {user_id}.")
+        logging.info(f"Fetched {len(roadmap_details)} roadmaps for user {user_id} with {counter}.")
         return roadmap_details
 
     except Exception as e:
@@ -604,78 +1025,13 @@ def save_roadmap(enhanced_roadmap, dynamodb):
     try:
         roadmap_id = str(uuid.uuid4())
 
-        # Save Roadmap
-        dynamodb.Table('Roadmaps').put_item(
-            Item={
-                'id': roadmap_id,
-                'title': enhanced_roadmap['title'],
-                'description': enhanced_roadmap['description'],
-                'imageURL': enhanced_roadmap['imageURL'],
-                'estimatedLearningDuration': enhanced_roadmap['estimatedLearningDuration'],
-                'goal': enhanced_roadmap['goal'],
-                'currentSkillLevel': enhanced_roadmap['currentSkillLevel'],
-                'desiredSkillLevel': enhanced_roadmap['desiredSkillLevel'],
-                'dailyTime': enhanced_roadmap['dailyTime'],
-                'phaseCount': enhanced_roadmap['phaseCount'],
-                'totalLessons': enhanced_roadmap['totalLessons']
-            }
-        )
+        # Save Roadmap, Phases, Topics, InfoBits and Quizzes in batches
+        start_time = time.time()
+        write_summary = write_roadmap(dynamodb, roadmap_id, enhanced_roadmap)
+        write_roadmap_snapshot(dynamodb, roadmap_id, enhanced_roadmap, version=1)
 
-        # Save Phases
-        for phase_index, phase in enumerate(enhanced_roadmap['phases']):
-            phase_id = f"{roadmap_id}#PHASE#{phase_index + 1}"
-            dynamodb.Table('Phases').put_item(
-                Item={
-                    'roadmapId': roadmap_id,
-                    'phaseNumber': phase_index + 1,
-                    'phaseId': phase_id,
-                    'phaseDescription': phase['phaseDescription'],
-                    'topicCount': phase['topicCount']
-                }
-            )
-
-            # Save Topics
-            for topic_index, topic in enumerate(phase['topics']):
-                topic_id = f"{phase_id}#TOPIC#{topic_index + 1}"
-                dynamodb.Table('Topics').put_item(
-                    Item={
-                        'phaseId': phase_id,
-                        'topicNumber': int(topic['topicNumber']),
-                        'topicId': topic_id,
-                        'topicName': topic['topicName'],
-                        'searchResult': topic['searchResult'],
-                        'infobitCount' : topic['infobitCount']
-                    }
-                )
-
-                # Save InfoBits
-                for infobit_index, infobit in enumerate(topic['infoBits']):
-                    infobit_id = f"{topic_id}#INFOBIT#{infobit_index + 1}"
-                    dynamodb.Table('InfoBits').put_item(
-                        Item={
-                            'topicId': topic_id,
-                            'infoBitNumber': infobit_index + 1,
-                            'infoBitId': infobit_id,
-                            'text': infobit['text'],
-                            'keywords': infobit['keywords'],
-                            'example': infobit.get('example', "")
-                        }
-                    )
-
-                    # Save Quiz
-                    quiz = infobit['quiz']
-                    dynamodb.Table('Quizzes').put_item(
-                        Item={
-                            'infoBitId': infobit_id,
-                            'quizNumber':  infobit_index + 1,
-                            'text': quiz['text'],
-                            'type': quiz['type'],
-                            'options': quiz.get('options', ''),
-                            'answer': quiz['answer']
-                        }
-                    )
-            
-        logging.info("Roadmap saved to DB successfully")
+        logging.info(f"Roadmap saved to DB successfully in {time.time() - start_time:.2f}s: {write_summary}")
+        return roadmap_id
     except Exception as e:
         logging.error(f"Error saving to db: {str(e)}")
         raise
@@ -1,5 +1,5 @@
 from parsel import Selector
-import requests, json, re
+import requests, json
 from youtubesearchpython import VideosSearch
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.formatters import TextFormatter
@@ -9,6 +9,8 @@ import boto3
 import logging
 
 from book_processor import search_download_books, find_TOC
+from jsonRepair import repair_json, summarize_fixes
+from llmCache import cache_key, default_llm_cache
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -16,6 +18,10 @@ bedrock = boto3.client(
             service_name='bedrock-runtime',
             region_name='eu-central-1'  # Frankfurt region
         )
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+SAMPLING_PARAMS = {"max_tokens": 300000, "temperature": 0.2, "top_p": 0.9}
+# Search queries by prompt and topic, shared by warm invocations and across containers
+llm_cache = default_llm_cache(boto3.resource('dynamodb', region_name='eu-central-1'))
 
 def scrape_books(query):
     params = {
@@ -123,58 +129,28 @@ def scrape_youtube(search_query, search_limit=1):
     # Optionally print the JSON data or save it to a file
     return video_data
 
-def extract_json(response):
-    try:
-        json_start = response.index("{")
-        json_end = response.rfind("}")
-        string_result = response[json_start:json_end + 1]
-        result =  json.loads(string_result)
-        
-        return result
-    except Exception as e:
-        logger.error(f"Error: While parsing JSON: {str(e)}")
-        
-        # If there's a JSON decode error, check if it's due to a missing comma
-        match = re.search(r"Expecting ',' delimiter: line (\d+) column (\d+) \(char (\d+)\)", str(e))
-        if match:
-            logging.info("matched error to JSON Decode Error")
-            char_position = int(match.group(3))
-            # Attempt to fix the JSON by inserting a comma at the specified position
-            fixed_json_str = response[:char_position] + ',' + response[char_position:]
-            try:
-                # Try to parse the JSON again after the fix
-                json_start = response.index("{")
-                json_end = response.rfind("}")
-                string_result = response[json_start:json_end + 1]
-                result =  json.loads(string_result)
-            except Exception as ex:
-                # If there's still an error, return a message
-                logger.error(f"Error: While parsing JSON after fix: {str(ex)}")
-                logger.error(f"string_result = {str(string_result)[char_position-40:char_position+40]}")
-                raise
-        else:
-            # logger.error(f"string_result = {str(string_result)[char_position-10:char_position+10]}")
-            raise 
+def sonnect_api_call(bedrock, prompt, input_data, bypass_cache=False):
+    key = cache_key(MODEL_ID, prompt, input_data, SAMPLING_PARAMS)
+    cached = llm_cache.get(key, bypass=bypass_cache)
+    if cached is not None:
+        return cached
 
-def sonnect_api_call(bedrock, prompt, input_data):
     try:
         request_body = {
             "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 300000,
             "messages": [
                 {
                     "role": "user",
                     "content": f'{prompt} INPUT = {input_data}'
                 }
             ],
-            "temperature": 0.2,
-            "top_p": 0.9,
+            **SAMPLING_PARAMS
         }
         
         # Invoke the model
         response = bedrock.invoke_model(
             body=json.dumps(request_body),
-            modelId="anthropic.claude-3-sonnet-20240229-v1:0",
+            modelId=MODEL_ID,
             contentType="application/json",
             accept="application/json"
         )
@@ -186,8 +162,10 @@ def sonnect_api_call(bedrock, prompt, input_data):
         try:
             result = json.loads(response_content)
         except Exception as e:
-            result = extract_json(response_content)
-            
+            result, fixes = repair_json(response_content)
+            logger.info(f"Repaired model output: {summarize_fixes(fixes)}")
+
+        llm_cache.put(key, result, bypass=bypass_cache)
         return result
     
     except Exception as e:
@@ -240,7 +218,7 @@ def lambda_handler(event, context):
     try:
         input_data = json.loads(json.dumps(event))
         topic_name = input_data['topic']
-        queries_json = sonnect_api_call(bedrock, PROMPT_SKELETON, topic_name)
+        queries_json = sonnect_api_call(bedrock, PROMPT_SKELETON, topic_name, bool(input_data.get('bypassCache', False)))
         queries = json.loads(queries_json)["queries"]
         print(queries)
         video_data = scrape_youtube(queries[0])
@@ -0,0 +1,178 @@
+"""
+Compare roadmap generation with and without splitting phases by output budget,
+against a streaming Bedrock stub that behaves like the model on long answers.
+
+Usage:
+    python output_budget_benchmark.py [topics_per_phase] [chars_per_second]
+
+The stub writes infobits and quizzes of typical length and takes time in
+proportion to what it writes. Like the model, it drops a comma once an answer
+passes CORRUPT_AFTER characters, so an oversized call is abandoned, retried
+and finally read to the end and repaired. The run without splitting sets a
+budget no phase reaches. The check fails if a split call's answer still passes
+CORRUPT_AFTER, if the roadmaps differ or if splitting is not faster.
+"""
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(HERE, '..', 'src'),
+    os.path.join(HERE, '..', '..', 'skillsprintbackinfiniteLayer', 'lib', 'python'),
+]
+
+# Stub calls take milliseconds, not the tens of seconds the limiter's pacing is tuned for
+os.environ.setdefault('BEDROCK_RATE_PER_SECOND', '1000')
+os.environ.setdefault('BEDROCK_MAX_RATE_PER_SECOND', '1000')
+os.environ.setdefault('LLM_CACHE_ENABLED', 'false')
+os.environ['BEDROCK_STREAMING'] = 'true'
+
+import index  # noqa: E402
+import outputBudget  # noqa: E402
+
+CORRUPT_AFTER = 19000
+CHUNK_CHARS = 200
+SENTENCE = 'This sentence stands in for an explanation the model would write. '
+
+
+class StreamBody:
+    def __init__(self, text, chars_per_second):
+        self.text = text
+        self.chars_per_second = chars_per_second
+        self.closed = False
+
+    def __iter__(self):
+        for start in range(0, len(self.text), CHUNK_CHARS):
+            if self.closed:
+                return
+            piece = self.text[start:start + CHUNK_CHARS]
+            time.sleep(len(piece) / self.chars_per_second)
+            event = {'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': piece}}
+            yield {'chunk': {'bytes': json.dumps(event).encode('utf-8')}}
+
+    def close(self):
+        self.closed = True
+
+
+class StreamingBedrock:
+    def __init__(self, chars_per_second):
+        self.chars_per_second = chars_per_second
+        self.calls = []
+        self.corrupted = 0
+        self._lock = threading.Lock()
+
+    def answer(self, prompt_name, data):
+        if prompt_name == 'PROMPT_INFOBIT':
+            phase = data['phases']
+            return {'phases': [{
+                'phaseDescription': phase['phaseDescription'],
+                'topics': [{
+                    'topicName': topic['topicName'],
+                    'topicSearchTerm': f"{topic['topicName']} tutorial",
+                    'infoBits': [{
+                        'text': f"{point}. " + SENTENCE * 5,
+                        'keywords': ['first', 'second', 'third', 'fourth'],
+                        'example': 'for item in items:\n    print(item)  # prints every item'
+                    } for point in topic['topicOutline']]
+                } for topic in phase['topics']]
+            }]}
+        if prompt_name == 'PROMPT_QUIZ':
+            return {'topics': [{
+                'topicName': topic['topicName'],
+                'quizzes': [{
+                    'text': f"Question on {infobit['text'][:20]}: " + SENTENCE,
+                    'type': 'multiple-choice',
+                    'options': ['The first possible answer', 'The second possible answer',
+                                'The third possible answer', 'The fourth possible answer'],
+                    'answer': 'The first possible answer'
+                } for infobit in topic['infoBits']]
+            } for topic in data['topics']]}
+        return {'quizzes': [{'text': 'final', 'type': 'mc', 'options': ['a', 'b'], 'answer': 'a'}]}
+
+    def invoke_model_with_response_stream(self, body, **kwargs):
+        content = json.loads(body)['messages'][0]['content']
+        for prompt_name in ('PROMPT_INFOBIT', 'PROMPT_QUIZ_LAST', 'PROMPT_QUIZ'):
+            prefix = getattr(index, prompt_name) + ' INPUT = '
+            if content.startswith(prefix):
+                text = json.dumps(self.answer(prompt_name, json.loads(content[len(prefix):])), indent=2)
+                break
+
+        with self._lock:
+            self.calls.append((prompt_name, len(text)))
+            if len(text) > CORRUPT_AFTER:
+                # Drop the first comma between members past the limit
+                comma = text.index(',\n', CORRUPT_AFTER)
+                text = text[:comma] + text[comma + 1:]
+                self.corrupted += 1
+        return {'body': StreamBody(text, self.chars_per_second)}
+
+
+class StubLambda:
+    def invoke(self, FunctionName, InvocationType, Payload):
+        data = json.loads(json.loads(Payload)['body'])
+        if 'searchKeyword' in data:
+            data['imageURL'] = f"https://example.com/{data['searchKeyword']}.png"
+        for phase in data['phases']:
+            for topic in phase['topics']:
+                topic['searchResult'] = {'webResult': [topic['topicSearchTerm']], 'videoResult': []}
+        payload = {'statusCode': 200, 'body': json.dumps(data)}
+        return {'Payload': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+
+def run(skeleton, input_data, budget, chars_per_second):
+    outputBudget.OUTPUT_CHAR_BUDGET = budget
+    bedrock = StreamingBedrock(chars_per_second)
+    start_time = time.monotonic()
+    roadmap = index.generate_roadmap(bedrock, StubLambda(), skeleton, input_data)
+    return roadmap, time.monotonic() - start_time, bedrock
+
+
+def main(topics_per_phase=6, chars_per_second=200000):
+    skeleton = {
+        'title': 'Stub roadmap',
+        'description': 'Roadmap used to time output budget splitting',
+        'imageURL': 'https://example.com/cover.png',
+        'searchKeyword': 'stub',
+        'phases': [{
+            'phaseDescription': f'phase {n}',
+            'topics': [{
+                'topicName': f'topic {n}.{t}',
+                'topicOutline': [f'point {n}.{t}.{p}' for p in range(1, 6)]
+            } for t in range(1, topics_per_phase + 1)]
+        } for n in range(1, 5)]
+    }
+    input_data = {
+        'goal': 'g', 'currentSkillLevel': 'beginner', 'desiredSkillLevel': 'advanced',
+        'estimatedLearningDuration': '4 weeks', 'dailyTime': '1 hour'
+    }
+
+    budget = outputBudget.OUTPUT_CHAR_BUDGET
+    whole, whole_time, whole_bedrock = run(skeleton, input_data, 10 ** 9, chars_per_second)
+    split, split_time, split_bedrock = run(skeleton, input_data, budget, chars_per_second)
+
+    for name, seconds, bedrock in (('whole phases', whole_time, whole_bedrock), (f'budget {budget}', split_time, split_bedrock)):
+        sizes = [size for prompt_name, size in bedrock.calls if prompt_name != 'PROMPT_QUIZ_LAST']
+        print(f"{name}: {seconds:.2f}s, {len(bedrock.calls)} Bedrock calls, {bedrock.corrupted} corrupted, "
+              f"largest answer {max(sizes)} chars")
+
+    estimates = [size for phase in skeleton['phases']
+                 for _, size in outputBudget.split_by_budget(phase['topics'], outputBudget.estimate_infobit_topic)]
+    actual = [size for prompt_name, size in split_bedrock.calls if prompt_name == 'PROMPT_INFOBIT']
+    print(f"infobit answers estimated at {min(estimates)}-{max(estimates)} chars, written {min(actual)}-{max(actual)}")
+    print(f"{whole_time / split_time:.2f}x faster with splitting")
+
+    if split_bedrock.corrupted:
+        sys.exit("An answer still passed the corruption limit after splitting")
+    if split != whole:
+        sys.exit("Split roadmap differs from the one generated from whole phases")
+    if split_time >= whole_time:
+        sys.exit("Splitting was not faster")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 6, float(args[1]) if len(args) > 1 else 200000)
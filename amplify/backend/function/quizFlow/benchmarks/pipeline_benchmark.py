@@ -0,0 +1,153 @@
+"""
+Run the roadmap generation graph against local Bedrock and infiniteLambda stubs
+with injected latency.
+
+Usage:
+    python pipeline_benchmark.py [phase_count] [latency_seconds]
+
+Every stubbed call takes the same time, except that later phases answer first,
+so tasks complete out of phase order. The check fails if the merged roadmap is
+out of order, if Bedrock concurrency exceeds BEDROCK_MAX_CONCURRENCY, or if the
+graph is not faster than running the stages one after another.
+"""
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(HERE, '..', 'src'),
+    os.path.join(HERE, '..', '..', 'skillsprintbackinfiniteLayer', 'lib', 'python'),
+]
+
+# Stub calls take milliseconds, not the tens of seconds the limiter's pacing is tuned for
+os.environ.setdefault('BEDROCK_RATE_PER_SECOND', '1000')
+os.environ.setdefault('BEDROCK_MAX_RATE_PER_SECOND', '1000')
+os.environ.setdefault('LLM_CACHE_ENABLED', 'false')
+os.environ.setdefault('BEDROCK_STREAMING', 'false')
+
+import index  # noqa: E402
+
+
+def phase_delay(latency, phase_description):
+    # 'phase 1' is the slowest, the last phase the fastest
+    number = int(phase_description.split(' ')[-1])
+    return latency * (1 + 1.0 / number)
+
+
+class StubBedrock:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def answer(self, prompt_name, data):
+        if prompt_name == 'PROMPT_INFOBIT':
+            phase = data['phases']
+            return phase_delay(self.latency, phase['phaseDescription']), {'phases': [{
+                'phaseDescription': phase['phaseDescription'],
+                'topics': [{
+                    'topicName': topic['topicName'],
+                    'topicSearchTerm': topic['topicName'],
+                    'infoBits': [{'text': f"{topic['topicName']} infobit", 'keywords': ['k'], 'example': 'e'}]
+                } for topic in phase['topics']]
+            }]}
+        if prompt_name == 'PROMPT_QUIZ':
+            return phase_delay(self.latency, data['phaseDescription']), {'topics': [{
+                'topicName': topic['topicName'],
+                'quizzes': [{'text': f"quiz {topic['topicName']}", 'type': 'mc', 'options': ['a', 'b'], 'answer': 'a'}]
+            } for topic in data['topics']]}
+        return self.latency, {'quizzes': [{'text': 'final', 'type': 'mc', 'options': ['a', 'b'], 'answer': 'a'}]}
+
+    def invoke_model(self, body, **kwargs):
+        content = json.loads(body)['messages'][0]['content']
+        for prompt_name in ('PROMPT_INFOBIT', 'PROMPT_QUIZ_LAST', 'PROMPT_QUIZ'):
+            prefix = getattr(index, prompt_name) + ' INPUT = '
+            if content.startswith(prefix):
+                delay, result = self.answer(prompt_name, json.loads(content[len(prefix):]))
+                break
+
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(delay)
+        with self._lock:
+            self.in_flight -= 1
+        return {'body': io.BytesIO(json.dumps({'content': [{'text': json.dumps(result)}]}).encode('utf-8'))}
+
+
+class StubLambda:
+    """Stands in for infiniteLambda: fills searchResult and the cover image."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        data = json.loads(json.loads(Payload)['body'])
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if 'searchKeyword' in data:
+            data['imageURL'] = f"https://example.com/{data['searchKeyword']}.png"
+        for phase in data['phases']:
+            for topic in phase['topics']:
+                topic['searchResult'] = {'webResult': [topic['topicSearchTerm']], 'videoResult': []}
+        payload = {'statusCode': 200, 'body': json.dumps(data)}
+        return {'Payload': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+
+def main(phase_count=6, latency=0.2):
+    skeleton = {
+        'title': 'Stub roadmap',
+        'description': 'Roadmap used to time the generation graph',
+        'imageURL': 'https://example.com/cover.png',
+        'searchKeyword': 'stub',
+        'phases': [{
+            'phaseDescription': f'phase {n}',
+            'topics': [{'topicName': f'topic {n}.{t}', 'topicOutline': ['outline']} for t in range(1, 4)]
+        } for n in range(1, phase_count + 1)]
+    }
+    input_data = {
+        'goal': 'g', 'currentSkillLevel': 'beginner', 'desiredSkillLevel': 'advanced',
+        'estimatedLearningDuration': '4 weeks', 'dailyTime': '1 hour'
+    }
+
+    bedrock = StubBedrock(latency)
+    lambda_client = StubLambda(latency)
+    start_time = time.time()
+    roadmap = index.generate_roadmap(bedrock, lambda_client, skeleton, input_data)
+    wall_time = time.time() - start_time
+
+    # The stages as barriers, one call at a time: infobits, quizzes, final quiz, one search call
+    phase_time = sum(phase_delay(latency, f'phase {n}') for n in range(1, phase_count + 1))
+    sequential_time = 2 * phase_time + 2 * latency
+    print(f"{phase_count} phases: {wall_time:.2f}s vs {sequential_time:.2f}s sequential "
+          f"({sequential_time / wall_time:.2f}x), {bedrock.calls} Bedrock calls "
+          f"(max {bedrock.max_in_flight} in flight), {lambda_client.calls} search calls")
+
+    order = [phase['phaseDescription'] for phase in roadmap['phases']]
+    expected = [f'phase {n}' for n in range(1, phase_count + 1)] + ['final']
+    if order != expected:
+        sys.exit(f"Phases merged out of order: {order}")
+    topic_numbers = [topic['topicNumber'] for phase in roadmap['phases'][:-1] for topic in phase['topics']]
+    if topic_numbers != list(range(1, 3 * phase_count + 1)):
+        sys.exit(f"Topics numbered out of order: {topic_numbers}")
+    if any('searchResult' not in topic for phase in roadmap['phases'] for topic in phase['topics']):
+        sys.exit("Topic without search results")
+    if bedrock.max_in_flight > index.BEDROCK_MAX_CONCURRENCY:
+        sys.exit(f"Bedrock concurrency exceeded its bound: {bedrock.max_in_flight}")
+    if wall_time >= sequential_time:
+        sys.exit("No speedup over running the stages in sequence")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 6, float(args[1]) if len(args) > 1 else 0.2)
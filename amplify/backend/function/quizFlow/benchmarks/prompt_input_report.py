@@ -0,0 +1,129 @@
+"""
+Report the estimated input tokens of every Bedrock stage for recorded
+roadmaps, as the prompts embedded them before (Python repr of the whole
+input) and as they are sent now (compact JSON of the fields each prompt reads,
+a per-phase digest for the final quiz).
+
+Usage:
+    python prompt_input_report.py [roadmap.json ...]
+
+A roadmap file is the body quizFlow returns or a RoadmapSnapshots document.
+Their topics have no outline, so infobit inputs are rebuilt from topic names
+only. Without files, the skeleton recorded in streams/skeleton.jsonl is filled
+with infobits and quizzes of typical length and measured instead.
+The check fails if any stage's input grew.
+"""
+import copy
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(HERE, '..', 'src'),
+    os.path.join(HERE, '..', '..', 'skillsprintbackinfiniteLayer', 'lib', 'python'),
+]
+
+os.environ.setdefault('LLM_CACHE_ENABLED', 'false')
+
+import index  # noqa: E402
+from promptInput import PromptInputStats, build_prompt_input  # noqa: E402
+
+SENTENCE = 'This sentence stands in for an explanation the model would write. '
+REQUEST = {
+    'goal': 'Build and test small Python applications', 'currentSkillLevel': 'beginner',
+    'desiredSkillLevel': 'intermediate', 'estimatedLearningDuration': '3 months', 'dailyTime': '1 hour'
+}
+
+
+def recorded_skeleton():
+    with open(os.path.join(HERE, 'streams', 'skeleton.jsonl')) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    text = ''.join(event['delta']['text'] for event in events if event['type'] == 'content_block_delta')
+    return json.loads(text[text.index('{'):])
+
+
+def filled_roadmap(skeleton):
+    roadmap = dict(index.roadmap_header(skeleton, dict(REQUEST, title=skeleton['title'])))
+    roadmap['phases'] = [{
+        'phaseDescription': phase['phaseDescription'],
+        'topics': [{
+            'topicName': topic['topicName'],
+            'topicSearchTerm': f"{topic['topicName']} tutorial",
+            'infoBits': [{
+                'text': f"{point}. " + SENTENCE * 4,
+                'keywords': point.lower().split()[:5],
+                'example': 'for item in items:\n    print(item)',
+                'quiz': {
+                    'text': f"Which statement about {point.lower()} is correct?",
+                    'type': 'multiple-choice',
+                    'options': ['The first possible answer', 'The second possible answer',
+                                'The third possible answer', 'The fourth possible answer'],
+                    'answer': 'The first possible answer'
+                }
+            } for point in topic['topicOutline']]
+        } for topic in phase['topics']]
+    } for phase in skeleton['phases']]
+    return index.enhance_roadmap(roadmap)
+
+
+def measure(roadmap, stats, skeleton=None):
+    phases = [phase for phase in roadmap['phases'] if phase['phaseDescription'] != 'final']
+    request = {key: roadmap[key] for key in ('title', 'goal', 'currentSkillLevel', 'desiredSkillLevel',
+                                             'estimatedLearningDuration', 'dailyTime') if key in roadmap}
+    build_prompt_input('skeleton', request, stats)
+
+    # The roadmap as the stages saw it: no search results yet, quizzes only once they were generated
+    generated = copy.deepcopy(dict(roadmap, phases=phases))
+    for phase in generated['phases']:
+        for topic in phase['topics']:
+            topic.pop('searchResult', None)
+    for number, phase in enumerate(generated['phases']):
+        if skeleton is not None:
+            skeleton_phase = skeleton['phases'][number]
+        else:
+            skeleton_phase = {
+                'phaseDescription': phase['phaseDescription'],
+                'topics': [{'topicName': topic['topicName'], 'topicOutline': []} for topic in phase['topics']]
+            }
+        build_prompt_input('infobit', index.infobit_input(roadmap, skeleton_phase, request), stats)
+
+        quiz_topics = copy.deepcopy(phase['topics'])
+        for topic in quiz_topics:
+            for infobit in topic['infoBits']:
+                infobit.pop('quiz', None)
+        build_prompt_input('quiz', dict(request, phaseDescription=phase['phaseDescription'], topics=quiz_topics), stats)
+    build_prompt_input('finalQuiz', generated, stats)
+
+
+def main(paths):
+    if paths:
+        roadmaps = []
+        for path in paths:
+            with open(path) as f:
+                roadmaps.append((path, json.load(f), None))
+    else:
+        skeleton = recorded_skeleton()
+        roadmaps = [('streams/skeleton.jsonl, filled', filled_roadmap(skeleton), skeleton)]
+
+    total = PromptInputStats()
+    for name, roadmap, skeleton in roadmaps:
+        stats = PromptInputStats()
+        measure(roadmap, stats, skeleton)
+        measure(roadmap, total, skeleton)
+        print(f"{name}:")
+        for stage, counts in stats.metrics().items():
+            print(f"  {stage}: {counts['calls']} calls, {counts['tokensBefore']} -> {counts['tokensAfter']} "
+                  f"tokens ({counts['saved']:.0%} saved)")
+
+    metrics = total.metrics()
+    before = sum(counts['tokensBefore'] for counts in metrics.values())
+    after = sum(counts['tokensAfter'] for counts in metrics.values())
+    print(f"all stages: {before} -> {after} input tokens ({1 - after / before:.0%} saved)")
+    grown = [stage for stage, counts in metrics.items() if counts['tokensAfter'] > counts['tokensBefore']]
+    if grown:
+        sys.exit(f"Input grew for: {', '.join(grown)}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
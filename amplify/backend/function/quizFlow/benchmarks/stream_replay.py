@@ -0,0 +1,200 @@
+"""
+Replay recorded Bedrock response streams through quizFlow's streaming path.
+
+Usage:
+    python stream_replay.py [event_delay_seconds]
+
+streams/*.jsonl hold one response stream each, one event payload per line as
+invoke_model_with_response_stream delivers them in chunk['bytes'].
+skeleton_corrupted.jsonl is skeleton.jsonl with the comma between phases 2
+and 3 missing.
+
+The skeleton call is answered with the corrupted stream first and the good
+one on the retry. Infobit and quiz calls are answered with streams generated
+from stub answers. The check fails unless the corrupted stream is abandoned
+at the missing comma, the retried skeleton matches the recording, infobits
+start before the skeleton stream has ended and no phase's infobits are
+generated twice.
+"""
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(HERE, '..', 'src'),
+    os.path.join(HERE, '..', '..', 'skillsprintbackinfiniteLayer', 'lib', 'python'),
+]
+
+# Stub calls take milliseconds, not the tens of seconds the limiter's pacing is tuned for
+os.environ.setdefault('BEDROCK_RATE_PER_SECOND', '1000')
+os.environ.setdefault('BEDROCK_MAX_RATE_PER_SECOND', '1000')
+os.environ.setdefault('LLM_CACHE_ENABLED', 'false')
+os.environ['BEDROCK_STREAMING'] = 'true'
+
+import index  # noqa: E402
+from jsonStream import IncrementalJSONParser, JSONStreamError  # noqa: E402
+
+
+def load_stream(name):
+    with open(os.path.join(HERE, 'streams', name)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stream_of(answer):
+    text = json.dumps(answer, indent=2)
+    pieces = [text[i:i + 6] for i in range(0, len(text), 6)]
+    return [{'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': piece}} for piece in pieces]
+
+
+def text_of(events):
+    return ''.join(event['delta']['text'] for event in events if event['type'] == 'content_block_delta')
+
+
+class ReplayBody:
+    def __init__(self, events, delay):
+        self.events = events
+        self.delay = delay
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for event in self.events:
+            if self.closed:
+                return
+            time.sleep(self.delay)
+            self.read += 1
+            yield {'chunk': {'bytes': json.dumps(event).encode('utf-8')}}
+
+    def close(self):
+        self.closed = True
+
+
+class ReplayBedrock:
+    def __init__(self, skeleton_streams, delay):
+        self.skeleton_streams = list(skeleton_streams)
+        self.delay = delay
+        self.bodies = []
+        self.log = []
+        self._lock = threading.Lock()
+
+    def answer(self, prompt_name, data):
+        if prompt_name == 'PROMPT_INFOBIT':
+            phase = data['phases']
+            return {'phases': [{
+                'phaseDescription': phase['phaseDescription'],
+                'topics': [{
+                    'topicName': topic['topicName'],
+                    'topicSearchTerm': topic['topicName'],
+                    'infoBits': [{'text': f"{topic['topicName']} infobit", 'keywords': ['k'], 'example': 'e'}]
+                } for topic in phase['topics']]
+            }]}
+        if prompt_name == 'PROMPT_QUIZ':
+            return {'topics': [{
+                'topicName': topic['topicName'],
+                'quizzes': [{'text': f"quiz {topic['topicName']}", 'type': 'mc', 'options': ['a', 'b'], 'answer': 'a'}]
+            } for topic in data['topics']]}
+        return {'quizzes': [{'text': 'final', 'type': 'mc', 'options': ['a', 'b'], 'answer': 'a'}]}
+
+    def invoke_model_with_response_stream(self, body, **kwargs):
+        content = json.loads(body)['messages'][0]['content']
+        with self._lock:
+            if content.startswith(index.PROMPT_SKELETON + ' INPUT = '):
+                name, events = 'skeleton', self.skeleton_streams.pop(0)
+            else:
+                for name in ('PROMPT_INFOBIT', 'PROMPT_QUIZ_LAST', 'PROMPT_QUIZ'):
+                    prefix = getattr(index, name) + ' INPUT = '
+                    if content.startswith(prefix):
+                        events = stream_of(self.answer(name, json.loads(content[len(prefix):])))
+                        break
+            self.log.append((name, time.monotonic()))
+            body = ReplayBody(events, self.delay)
+            self.bodies.append((name, body))
+        return {'body': body}
+
+
+class StubLambda:
+    """Stands in for infiniteLambda: fills searchResult and the cover image."""
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        data = json.loads(json.loads(Payload)['body'])
+        if 'searchKeyword' in data:
+            data['imageURL'] = f"https://example.com/{data['searchKeyword']}.png"
+        for phase in data['phases']:
+            for topic in phase['topics']:
+                topic['searchResult'] = {'webResult': [topic['topicSearchTerm']], 'videoResult': []}
+        payload = {'statusCode': 200, 'body': json.dumps(data)}
+        return {'Payload': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+
+def replay_parser(name):
+    events = load_stream(name)
+    text = text_of(events)
+    phases = []
+    parser = IncrementalJSONParser([('phases', '*')], lambda path, value: phases.append(parser.position))
+    try:
+        for event in events:
+            if event['type'] == 'content_block_delta':
+                parser.feed(event['delta']['text'])
+        parser.close()
+        print(f"{name}: {len(text)} chars, phases complete at char {phases}")
+        return None
+    except JSONStreamError as e:
+        print(f"{name}: {len(text)} chars, abandoned at char {e.position} "
+              f"({e.position / len(text):.0%} of the stream) after {len(phases)} phases: {str(e)}")
+        return e.position, text
+
+
+def main(delay=0.002):
+    replay_parser('skeleton.jsonl')
+    abandoned = replay_parser('skeleton_corrupted.jsonl')
+    if abandoned is None:
+        sys.exit("Corrupted stream was not detected")
+    position, text = abandoned
+    if not text[:position].rstrip().endswith('}'):
+        sys.exit(f"Corrupted stream abandoned at the wrong place: {text[position - 40:position]!r}")
+
+    good = load_stream('skeleton.jsonl')
+    expected = json.loads(text_of(good)[text_of(good).index('{'):])
+    bedrock = ReplayBedrock([load_stream('skeleton_corrupted.jsonl'), good], delay)
+    input_data = {
+        'title': 'Python', 'goal': 'g', 'currentSkillLevel': 'beginner', 'desiredSkillLevel': 'intermediate',
+        'estimatedLearningDuration': '3 months', 'dailyTime': '1 hour'
+    }
+
+    cancelled = threading.Event()
+    executor = index.ThreadPoolExecutor(max_workers=index.BEDROCK_MAX_CONCURRENCY)
+    start_time = time.monotonic()
+    try:
+        skeleton, prefetched = index.generate_skeleton(bedrock, input_data, False, executor, cancelled)
+        skeleton_time = time.monotonic() - start_time
+        roadmap = index.generate_roadmap(bedrock, StubLambda(), skeleton, input_data, False, prefetched)
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False)
+    wall_time = time.monotonic() - start_time
+
+    corrupted_body = bedrock.bodies[0][1]
+    skeleton_end = start_time + skeleton_time
+    infobit_starts = [moment for name, moment in bedrock.log if name == 'PROMPT_INFOBIT']
+    early = sum(1 for moment in infobit_starts if moment < skeleton_end)
+    print(f"corrupted stream read {corrupted_body.read} of {len(corrupted_body.events)} events before the retry")
+    print(f"skeleton in {skeleton_time:.2f}s, {early} of {len(infobit_starts)} infobit calls started before "
+          f"it finished streaming, roadmap in {wall_time:.2f}s")
+
+    if skeleton != expected:
+        sys.exit("Retried skeleton does not match the recorded stream")
+    if len(infobit_starts) != len(skeleton['phases']):
+        sys.exit(f"{len(infobit_starts)} infobit calls for {len(skeleton['phases'])} phases")
+    if early == 0:
+        sys.exit("No infobits started while the skeleton was streaming")
+    if [phase['phaseDescription'] for phase in roadmap['phases'][:-1]] != [phase['phaseDescription'] for phase in expected['phases']]:
+        sys.exit("Phases merged out of order")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(float(args[0]) if args else 0.002)
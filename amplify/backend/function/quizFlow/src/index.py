@@ -1,3 +1,6 @@
+import copy
+import os
+import threading
 import time
 import random
 import boto3
@@ -5,8 +8,31 @@ import json
 import logging
 import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
 from botocore.exceptions import ClientError
 
+from bedrockStream import close_stream, stream_text
+
+from dynamoJson import dumps
+from jsonRepair import repair_json, summarize_fixes
+from jsonStream import IncrementalJSONParser, JSONStreamError, WILDCARD
+from roadmapJobs import (
+    QUEUED, FAILED, create_job, find_failed_job, finish_job, get_job, load_checkpoints, new_job_id,
+    report_progress, roadmap_request, save_checkpoint, start_run, update_job
+)
+from roadmapFingerprint import find_roadmap, index_roadmap, request_fingerprint, share_roadmap
+from roadmapSnapshot import load_roadmap_document, write_roadmap_snapshot
+from roadmapStore import (
+    PHASE_GENERATING, PHASE_READY, ROADMAP_FAILED, roadmap_version, set_roadmap_status, write_roadmap,
+    write_roadmap_phases
+)
+from rateLimiter import AdaptiveRateLimiter
+from llmCache import cache_key, default_llm_cache
+from outputBudget import estimate_infobit_topic, estimate_quiz_topic, split_by_budget
+from promptInput import PromptInputStats, build_prompt_input
+from taskGraph import TaskGraph, TaskGraphSuspended
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 console_handler = logging.StreamHandler()
@@ -204,29 +230,17 @@ PROMPT_QUIZ_LAST = """
     <INPUT>
     title: The title of the learning roadmap. A concise name that reflects the overarching theme or skill focus of the roadmap.
     description: A detailed overview of what the roadmap covers and what users will gain from following it. Include the scope, key topics, and progression details.
-    imageURL: A URL link to an image that represents or complements the learning roadmap visually.
     estimatedLearningDuration: The anticipated amount of time needed to complete the entire learning roadmap, usually expressed in months or weeks.
     goal: The end objective or skill that users will achieve by the completion of the roadmap.
     currentSkillLevel: The initial proficiency or knowledge level of the user before starting the roadmap.
     desiredSkillLevel: The target proficiency or knowledge level that the user aims to achieve upon completing the roadmap.
-    currentLesson: The lesson number or identifier indicating the user's current progress within the roadmap.
-    currentPhase: The phase number or identifier indicating the current stage of the learning process.
-    dailyTime: The suggested amount of time the user should dedicate each day to learning.
-    phases: Array of objects representing different stages in the learning roadmap.
+    phases: Array of objects summarizing the different stages in the learning roadmap.
+    phaseNumber: The position of the phase in the roadmap.
     phaseDescription: A summary of what each phase covers and how it contributes to the overall learning objectives.
-    topics: Array of objects representing individual topics within each phase.
+    topics: Array of objects summarizing the individual topics within each phase.
     topicName: The title or name of the topic covered in the phase.
-    topicSearchTerm: The search term for google and youtube that gives relevant results for this topic.
-    topicOutline: Array of strings outlining the key points and details included in the topic.
-    infoBits: Array of objects providing detailed pieces of information for each topic.
-    text: A brief explanation or description of a specific aspect of the topic.
-    keywords: Array of strings highlighting the main concepts or terms related to the text.
-    example: An optional string providing an example to clarify or illustrate the content described in the text.
-    quiz: an object containing all the info for a quiz for that infobit within that topic.
-    text: The actual quiz question to test the user's understanding of the topic.
-    type: The type of quiz question (e.g., multiple-choice, true-false).
-    options: Array of strings providing possible answers for multiple-choice questions.
-    answer: The correct answer to the quiz question.
+    keywords: Array of strings highlighting the main concepts taught in the topic.
+    quizzes: Array of strings, the quiz questions the user already answered for the topic.
     <INPUT/>
 
     <OUTPUT>
@@ -295,7 +309,79 @@ Only return a valid JSON. use double quotes.
     """
 #Claude gives misformatted JSON if Response Character count goes upto 19000
 region_name = 'eu-central-1'  
+# Concurrent Bedrock requests per invocation, keep it within the account's model quota
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get('BEDROCK_MAX_CONCURRENCY', 4))
+# Concurrent web search invocations, each one is a separate infiniteLambda run
+SEARCH_MAX_CONCURRENCY = int(os.environ.get('SEARCH_MAX_CONCURRENCY', 4))
+FINAL_QUIZ_SEARCH_TERM = "python programming tutorial"
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+SAMPLING_PARAMS = {"max_tokens": 300000, "temperature": 0.2, "top_p": 0.9}
+# Read model output as it is written, so corrupted JSON is caught before the response ends
+BEDROCK_STREAMING = os.environ.get('BEDROCK_STREAMING', 'true').lower() == 'true'
+# Corrupted streams abandoned and retried before the last try is read to the end and repaired
+STREAM_CORRUPTION_RETRIES = int(os.environ.get('STREAM_CORRUPTION_RETRIES', 2))
+# Skeleton values handed out while it streams: infobits start per phase, they need the title and description
+SKELETON_STREAM_PATHS = (('title',), ('description',), ('phases', WILDCARD))
+# Input fields each prompt is sent, see promptInput
+PROMPT_STAGES = {PROMPT_SKELETON: 'skeleton', PROMPT_INFOBIT: 'infobit', PROMPT_QUIZ: 'quiz', PROMPT_QUIZ_LAST: 'finalQuiz'}
+# Stop starting stages this long before the timeout, checkpoint and continue in a new invocation
+JOB_TIME_MARGIN_MS = int(os.environ.get('JOB_TIME_MARGIN_MS', 180000))
+# Invocations a job gets before it is marked failed, guards against re-enqueueing forever
+JOB_MAX_RUNS = int(os.environ.get('JOB_MAX_RUNS', 6))
+CANCEL_POLL_SECONDS = 0.5
+
+# Paces every Bedrock call made by this container against the model quota
+bedrock_limiter = AdaptiveRateLimiter(
+    rate=float(os.environ.get('BEDROCK_RATE_PER_SECOND', 2.0)),
+    max_rate=float(os.environ.get('BEDROCK_MAX_RATE_PER_SECOND', 10.0)),
+    burst=BEDROCK_MAX_CONCURRENCY,
+    max_in_flight=BEDROCK_MAX_CONCURRENCY,
+    name='bedrock'
+)
+# Parsed model results by prompt and input, shared by warm invocations and across containers
+llm_cache = default_llm_cache(boto3.resource('dynamodb', region_name=region_name))
+# Estimated input tokens per stage, before and after trimming the prompt inputs
+prompt_stats = PromptInputStats()
+
+
+class CancelEvent:
+    """
+    A cancellation flag of its own that also reads as set once its parent
+    is, e.g. one prefetched call within the whole run. Has the part of
+    threading.Event that the limiter and the retries use.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._event = threading.Event()
+
+    def set(self):
+        self._event.set()
+
+    def is_set(self):
+        return self._event.is_set() or (self.parent is not None and self.parent.is_set())
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Setting the parent does not wake this wait, look at it every CANCEL_POLL_SECONDS
+            self._event.wait(min(remaining, CANCEL_POLL_SECONDS))
+        return True
+
+
+class WebSearchError(Exception):
+    """infiniteLambda answered with an error; response is returned to the caller as is."""
+
+    def __init__(self, response):
+        super().__init__(f"Web search failed: {response.get('body')}")
+        self.response = response
+
 def handler(event, context):
+    dynamodb = None
+    job = None
     try:
         bedrock = boto3.client(
             service_name='bedrock-runtime',
@@ -303,210 +389,779 @@ def handler(event, context):
         )
         
         dynamodb = boto3.resource('dynamodb', region_name=region_name)
+        lambda_client = boto3.client('lambda')
 
         data = json.loads(event['body'])
+        # A job id alone resumes that job with the request it was created for
+        if data.get('jobId'):
+            job = get_job(dynamodb, data['jobId'])
+            if job is not None:
+                data = job['request']
+            elif 'userId' not in data:
+                raise ValueError(f"Job {data['jobId']} not found")
         user_id = data['userId']
+        # A fresh roadmap must not be rebuilt from cached model results either
+        fresh_roadmap = bool(data.get('freshRoadmap', False))
+        bypass_cache = bool(data.get('bypassCache', False)) or fresh_roadmap
 
-        input_data = {key: value for key, value in data.items() if key != "userId"}
+        input_data = roadmap_request(data)
 
-        
-        roadmap_skeleton = sonnect_api_call(bedrock, PROMPT_SKELETON, input_data)
-        phase_count = len(roadmap_skeleton['phases'])
-        logging.info(f"Roadmap Skeleton Generated Successfully with {phase_count} Phases")
-        
-        phases = []
-        counter = 1
-        
-        for phase in roadmap_skeleton['phases']:
-        
-            input_infobit = {
-                'title': roadmap_skeleton['title'],
-                'description': roadmap_skeleton['description'],
-                'phases': phase,
-                'goal': input_data['goal'],
-                'currentSkillLevel': input_data['currentSkillLevel'],
-                'desiredSkillLevel': input_data['desiredSkillLevel']
-            }
-            
-            infobit_roadmap = sonnect_api_call(bedrock, PROMPT_INFOBIT, input_infobit)
-            phases.extend(infobit_roadmap['phases'])
-            logging.info(f"Roadmap InfoBits Generated Successfully for Phase {counter}")
-            counter += 1
-        
-        logging.info("Roadmap InfoBits Generated Successfully")
-        
-        appended_roadmap = {
-            'title': roadmap_skeleton['title'],
-            'description': roadmap_skeleton['description'],
-            "imageURL": roadmap_skeleton['imageURL'],
-            'estimatedLearningDuration':  input_data['estimatedLearningDuration'],
-            'goal': input_data['goal'],
-            'currentSkillLevel': input_data['currentSkillLevel'],
-            'desiredSkillLevel': input_data['desiredSkillLevel'],
-            'dailyTime': input_data['dailyTime'],
-            'searchKeyword' : roadmap_skeleton['searchKeyword'],
-            'phases': phases,
-        }
-        
-        enhanced_roadmap = enhance_roadmap(appended_roadmap)
-        for phase in enhanced_roadmap['phases']:
-            input_quiz = {
-                'title': enhanced_roadmap['title'],
-                'goal': input_data['goal'],
-                'currentSkillLevel': input_data['currentSkillLevel'],
-                'desiredSkillLevel': input_data['desiredSkillLevel'],
-                'estimatedLearningDuration': input_data['estimatedLearningDuration'],
-                'phaseDescription': phase['phaseDescription'],
-                'topics': phase['topics'],
-            }
-            
-            quiz_data = sonnect_api_call(bedrock, PROMPT_QUIZ, input_quiz)
-            
-            # Merge the quizzes with the infobits in the phase
-            for topic_index, topic in enumerate(phase['topics']):
-                for infobit_index, infobit in enumerate(topic['infoBits']):
-                    infobit['quiz'] = quiz_data['topics'][topic_index]['quizzes'][infobit_index]
-        
-        logging.info("Quizzes Generated Successfully")
-        
-        last_quiz = sonnect_api_call(bedrock, PROMPT_QUIZ_LAST, enhanced_roadmap)
-        final_phase = {
-                "phaseDescription": "final",
-                "phaseNumber": len(enhanced_roadmap['phases']) + 1,
-                "topicCount": len(last_quiz['quizzes']),
-                "topics": []
-            }
-            
-        final_topic = {
-            "topicName": "Final Comprehensive Quiz",
-            "topicNumber": 1,
-            "topicSearchTerm" : "python programming tutorial",
-            "infobitCount": len(last_quiz['quizzes']),
-            "infoBits": []
-        }
-        
-        for quiz in last_quiz["quizzes"]:
-            infobit = {
-                "text": "infobit",
-                "keywords": ["keyword"],
-                "example": "example",
-                "quiz": quiz
-            }
+        fingerprint = request_fingerprint(input_data)
+        # Jobs quizflowFront queued have not run yet, they can still be answered with an existing roadmap
+        if not fresh_roadmap and (job is None or job['runs'] == 0):
+            reused = reuse_roadmap(user_id, fingerprint, dynamodb, job)
+            if reused is not None:
+                return reused
+        if job is None:
+            if not fresh_roadmap:
+                # A retry of a request that failed carries on where it stopped
+                job = find_failed_job(dynamodb, user_id, fingerprint)
+            if job is None:
+                job_id = data.get('jobId') or new_job_id()
+                request = {key: value for key, value in data.items() if key != 'jobId'}
+                create_job(dynamodb, job_id, user_id, request, fingerprint)
+                job = {'id': job_id, 'userId': user_id, 'fingerprint': fingerprint}
 
-            final_topic["infoBits"].append(infobit) 
+        runs = start_run(dynamodb, job['id'])
+        if runs > JOB_MAX_RUNS:
+            raise Exception(f"Job {job['id']} gave up after {JOB_MAX_RUNS} runs")
+        checkpoints = load_checkpoints(dynamodb, job['id'])
+        logging.info(f"Job {job['id']} run {runs}, resuming from {len(checkpoints)} checkpoints")
 
-        final_phase['topics'].append(final_topic)
-        
-        enhanced_roadmap['phases'].append(final_phase)
+        progress = None
+        writer = None
 
-        logging.info("Roadmap with quizzes generated successfully")
-        
-        lambda_response = invoke_next_lambda(enhanced_roadmap)
-        if int(lambda_response['statusCode']) == 200:
-            #save roadmap to DB
-            save_roadmap(json.loads(lambda_response['body']), user_id, dynamodb)
-            logging.info("Final Roadmap Generated Successfully")
+        def checkpoint(stage, output):
+            save_checkpoint(dynamodb, job['id'], stage, output)
+            if progress is not None:
+                progress.done(stage)
+            if writer is not None:
+                writer.done(stage, output)
 
+        has_time_left = None
+        if hasattr(context, 'get_remaining_time_in_millis'):
+            has_time_left = lambda: context.get_remaining_time_in_millis() > JOB_TIME_MARGIN_MS
+
+        # Infobits started while the skeleton streams in, the ones generation does not use are cancelled
+        prefetch_cancelled = threading.Event()
+        prefetch_executor = ThreadPoolExecutor(max_workers=BEDROCK_MAX_CONCURRENCY)
+        try:
+            if 'skeleton' in checkpoints:
+                roadmap_skeleton, prefetched = checkpoints['skeleton'], {}
+            else:
+                roadmap_skeleton, prefetched = generate_skeleton(
+                    bedrock, input_data, bypass_cache, prefetch_executor, prefetch_cancelled
+                )
+                checkpoint('skeleton', roadmap_skeleton)
+            phase_count = len(roadmap_skeleton['phases'])
+            writer = open_roadmap(dynamodb, job, user_id, roadmap_skeleton, input_data, checkpoints)
+            progress = JobProgress(dynamodb, job['id'], phase_count, checkpoints)
+            logging.info(f"Roadmap Skeleton Generated Successfully with {phase_count} Phases, "
+                         f"infobits of {len(prefetched)} started early")
+
+            final_roadmap = generate_roadmap(
+                bedrock, lambda_client, roadmap_skeleton, input_data, bypass_cache, prefetched,
+                restored=checkpoints, on_done=checkpoint, has_time_left=has_time_left
+            )
+        finally:
+            prefetch_cancelled.set()
+            prefetch_executor.shutdown(wait=False)
+        logging.info(f"Roadmap with quizzes and search results generated successfully, Bedrock limiter: {bedrock_limiter.metrics()}, "
+                     f"LLM cache: {llm_cache.metrics()}, prompt input tokens: {prompt_stats.metrics()}")
+
+        #save roadmap to DB
+        roadmap_id, version = save_roadmap(final_roadmap, user_id, dynamodb, writer)
+        if roadmap_id is not None:
+            index_roadmap(dynamodb, fingerprint, roadmap_id, version)
+            finish_job(dynamodb, job, roadmap_id)
+        else:
+            record_job_failure(dynamodb, job, "Roadmap was not saved")
+        logging.info("Final Roadmap Generated Successfully")
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Headers': '*',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps(final_roadmap)
+        }
+
+    except TaskGraphSuspended as e:
+        logging.info(f"Job {job['id']} is running out of time, continuing in a new invocation: {str(e)}")
+        update_job(dynamodb, job['id'], status=QUEUED)
+        enqueue_job(lambda_client, context.function_name, job['id'])
+        return {
+            'statusCode': 202,
+            'headers': {
+                'Access-Control-Allow-Headers': '*',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps({'jobId': job['id'], 'status': QUEUED})
+        }
+
+    except WebSearchError as e:
         #error invoked
-        return lambda_response
+        logger.error(f"Error: While searching resources: {str(e)}")
+        record_job_failure(dynamodb, job, str(e))
+        return e.response
 
     except Exception as e:
         logger.error(f"Error: While generating roadmap: {str(e)}")
+        record_job_failure(dynamodb, job, str(e))
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
 
+
+class JobProgress:
+    """
+    Reports a job's progress as its stages finish: the skeleton, infobits,
+    quizzes and search per phase, the final quiz, its search, the cover image
+    and saving. The current phase is the first one whose quizzes are missing.
+    """
+
+    def __init__(self, dynamodb, job_id, phase_count, checkpoints):
+        self.dynamodb = dynamodb
+        self.job_id = job_id
+        self.phase_count = phase_count
+        self.total = 3 * phase_count + 5
+        self._lock = threading.Lock()
+        self._done = set(checkpoints) | {'skeleton'}
+        self._report('skeleton')
+
+    def done(self, stage):
+        with self._lock:
+            self._done.add(stage)
+        self._report(stage)
+
+    def _report(self, stage):
+        with self._lock:
+            done = len(self._done)
+            current_phase = next(
+                (number for number in range(1, self.phase_count + 1) if f'quizzes:{number}' not in self._done),
+                self.phase_count + 1
+            )
+        # 100 is left to finish_job, once the roadmap is saved
+        report_progress(
+            self.dynamodb, self.job_id, min(99, done * 100 // self.total),
+            lastStage=stage, currentPhase=current_phase, phaseCount=self.phase_count
+        )
+
+
+class RoadmapWriter:
+    """
+    Writes each phase of a roadmap opened by open_roadmap once its quizzes and
+    search results are done, so it can be studied before the rest is
+    generated. Phases restored from checkpoints were written by an earlier
+    run. A failed write is only logged, save_roadmap writes every phase.
+    """
+
+    def __init__(self, dynamodb, roadmap_id, version, restored):
+        self.dynamodb = dynamodb
+        self.roadmap_id = roadmap_id
+        self.version = version
+        self._lock = threading.Lock()
+        self._outputs = {stage: output for stage, output in restored.items() if stage.startswith(('quizzes:', 'search:'))}
+
+    def done(self, stage, output):
+        kind, _, number = stage.partition(':')
+        if kind not in ('quizzes', 'search') or number == 'final':
+            return
+        with self._lock:
+            self._outputs[stage] = output
+            quizzes = self._outputs.get(f'quizzes:{number}')
+            search_results = self._outputs.get(f'search:{number}')
+            if quizzes is None or search_results is None:
+                return
+            # The graph's results are still read by later stages
+            phases = finish_phases(copy.deepcopy(quizzes), search_results)
+            self.version += 1
+            try:
+                summary = write_roadmap_phases(self.dynamodb, self.roadmap_id, phases, self.version)
+                logging.info(f"Phase {number} of roadmap {self.roadmap_id} saved as version {self.version}: {summary}")
+            except Exception as e:
+                logger.error(f"Error: While saving phase {number} of roadmap {self.roadmap_id}: {str(e)}")
+
+
+def open_roadmap(dynamodb, job, user_id, roadmap_skeleton, input_data, restored):
+    """
+    Save the outline of the roadmap about to be generated and link the user to
+    it, every phase PHASE_GENERATING. A resumed job carries on with the roadmap
+    it opened before. Returns the RoadmapWriter for its phases, or None when
+    the roadmap can only be saved once it is finished.
+    """
+    try:
+        roadmap_id = job.get('roadmapId')
+        version = roadmap_version(dynamodb, roadmap_id) if roadmap_id else None
+        if version is None:
+            roadmap_id = str(uuid.uuid4())
+            version = 1
+            write_roadmap(dynamodb, roadmap_id, roadmap_outline(roadmap_skeleton, input_data), version=version)
+            save_user_roadmap(user_id, roadmap_id, dynamodb)
+            update_job(dynamodb, job['id'], roadmapId=roadmap_id)
+            logging.info(f"Outline of roadmap {roadmap_id} saved for job {job['id']}")
+        elif set_roadmap_status(dynamodb, roadmap_id, PHASE_GENERATING):
+            # Marked failed by the run that gave up, this one carries on with it
+            version += 1
+        job['roadmapId'] = roadmap_id
+        return RoadmapWriter(dynamodb, roadmap_id, version, restored)
+    except Exception as e:
+        logger.error(f"Error: While saving the roadmap outline, saving it once finished: {str(e)}")
+        return None
+
+
+def record_job_failure(dynamodb, job, error):
+    # The checkpoints stay, rerunning the job or retrying the request resumes from them
+    if job is None:
+        return
+    try:
+        update_job(dynamodb, job['id'], status=FAILED, error=error)
+    except Exception as e:
+        logger.error(f"Error: While marking job {job['id']} failed: {str(e)}")
+
+    # The roadmap open_roadmap saved so far would otherwise stay generating
+    if job.get('roadmapId'):
+        try:
+            if set_roadmap_status(dynamodb, job['roadmapId'], ROADMAP_FAILED):
+                logging.info(f"Roadmap {job['roadmapId']} of job {job['id']} marked {ROADMAP_FAILED}")
+        except Exception as e:
+            logger.error(f"Error: While marking roadmap {job['roadmapId']} failed: {str(e)}")
+
+
+def enqueue_job(lambda_client, function_name, job_id):
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'body': json.dumps({'jobId': job_id})})
+    )
+
+
+def reuse_roadmap(user_id, fingerprint, dynamodb, job=None):
+    """
+    Link the user to a roadmap already generated for an equivalent request and
+    return the response for it, or None when there is nothing to reuse.
+    A queued job is finished with the reused roadmap.
+    """
+    try:
+        roadmap_id = find_roadmap(dynamodb, fingerprint)
+        if roadmap_id is None:
+            return None
+
+        roadmap, _ = load_roadmap_document(dynamodb, roadmap_id)
+        if roadmap is None:
+            logger.warning(f"Roadmap {roadmap_id} for fingerprint {fingerprint} could not be read, generating a new one")
+            return None
+
+        # Relinking would reset the progress of a user who already has it
+        existing = dynamodb.Table('UserRoadmaps').get_item(
+            Key={'userId': user_id, 'roadmapId': roadmap_id}
+        ).get('Item')
+        if existing is None:
+            # Counted before the link exists, an edit or delete in between is refused rather than hitting this user
+            share_roadmap(dynamodb, roadmap_id)
+            save_user_roadmap(user_id, roadmap_id, dynamodb)
+
+        logging.info(f"Reused roadmap {roadmap_id} for user {user_id}, fingerprint {fingerprint}")
+        if job is not None:
+            finish_job(dynamodb, job, roadmap_id)
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Headers': '*',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': dumps(roadmap)
+        }
+    except Exception as e:
+        logger.error(f"Error: While looking up roadmap {fingerprint}, generating a new one: {str(e)}")
+        return None
+
+
+def roadmap_header(roadmap_skeleton, input_data):
+    return {
+        'title': roadmap_skeleton['title'],
+        'description': roadmap_skeleton['description'],
+        "imageURL": roadmap_skeleton['imageURL'],
+        'estimatedLearningDuration':  input_data['estimatedLearningDuration'],
+        'goal': input_data['goal'],
+        'currentSkillLevel': input_data['currentSkillLevel'],
+        'desiredSkillLevel': input_data['desiredSkillLevel'],
+        'dailyTime': input_data['dailyTime'],
+        'searchKeyword' : roadmap_skeleton['searchKeyword'],
+    }
+
+
+def roadmap_outline(roadmap_skeleton, input_data):
+    """The roadmap as the skeleton describes it, phases without topics, the final quiz phase included."""
+    outline = roadmap_header(roadmap_skeleton, input_data)
+    outline['status'] = PHASE_GENERATING
+    outline['phases'] = [{
+        'phaseDescription': phase['phaseDescription'],
+        'phaseNumber': number,
+        'topicCount': len(phase['topics']),
+        'status': PHASE_GENERATING,
+        'topics': []
+    } for number, phase in enumerate(roadmap_skeleton['phases'], start=1)]
+    outline['phaseCount'] = len(outline['phases'])
+    outline['totalLessons'] = sum(phase['topicCount'] for phase in outline['phases'])
+    outline['phases'].append({
+        'phaseDescription': 'final',
+        'phaseNumber': len(outline['phases']) + 1,
+        'topicCount': 0,
+        'status': PHASE_GENERATING,
+        'topics': []
+    })
+    return outline
+
+
+def infobit_input(roadmap_skeleton, phase, input_data):
+    return {
+        'title': roadmap_skeleton['title'],
+        'description': roadmap_skeleton['description'],
+        'phases': phase,
+        'goal': input_data['goal'],
+        'currentSkillLevel': input_data['currentSkillLevel'],
+        'desiredSkillLevel': input_data['desiredSkillLevel']
+    }
+
+
+def infobit_inputs(roadmap_skeleton, phase, input_data):
+    """PROMPT_INFOBIT inputs for a phase, split by topic when one answer would pass OUTPUT_CHAR_BUDGET."""
+    return [
+        infobit_input(roadmap_skeleton, dict(phase, topics=topics), input_data)
+        for topics, _ in split_by_budget(phase['topics'], estimate_infobit_topic)
+    ]
+
+
+def call_in_parts(bedrock, prompt, inputs, cancelled=None, bypass_cache=False, prefetched=None):
+    """
+    Make one call per input, concurrently, and return the results in input
+    order. Calls already started by generate_skeleton are taken from prefetched.
+    """
+    futures = [(prefetched or {}).get(dumps(part, sort_keys=True)) for part in inputs]
+    missing = [index for index, future in enumerate(futures) if future is None]
+    if missing == [0] and len(inputs) == 1:
+        return [sonnect_api_call(bedrock, prompt, inputs[0], cancelled, bypass_cache)]
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(missing)))
+    try:
+        for index in missing:
+            futures[index] = executor.submit(sonnect_api_call, bedrock, prompt, inputs[index], cancelled, bypass_cache)
+        return [future.result() for future in futures]
+    finally:
+        # On a failure the caller cancels the rest instead of waiting for them
+        executor.shutdown(wait=False)
+
+
+def generate_skeleton(bedrock, input_data, bypass_cache, executor, cancelled):
+    """
+    Generate the roadmap skeleton, starting each phase's infobits on executor
+    as soon as the phase has streamed in.
+
+    Returns the skeleton and {infobit input: future}, one future per part of
+    a phase split by infobit_inputs. A retried or repaired stream can end
+    with other phases than it streamed, the calls the final skeleton has no
+    input for are cancelled and left out. Setting cancelled stops them all.
+    """
+    header = {}
+    prefetched = {}
+    stops = {}
+
+    def on_item(path, value):
+        if path[0] != 'phases':
+            header[path[0]] = value
+            return
+        if 'title' not in header or 'description' not in header:
+            return
+        for input_infobit in infobit_inputs(header, value, input_data):
+            key = dumps(input_infobit, sort_keys=True)
+            if key not in prefetched:
+                stops[key] = CancelEvent(cancelled)
+                prefetched[key] = executor.submit(
+                    sonnect_api_call, bedrock, PROMPT_INFOBIT, input_infobit, stops[key], bypass_cache
+                )
+
+    roadmap_skeleton = sonnect_api_call(
+        bedrock, PROMPT_SKELETON, input_data, bypass_cache=bypass_cache,
+        stream_paths=SKELETON_STREAM_PATHS, on_item=on_item
+    )
+
+    wanted = {
+        dumps(input_infobit, sort_keys=True)
+        for phase in roadmap_skeleton['phases']
+        for input_infobit in infobit_inputs(roadmap_skeleton, phase, input_data)
+    }
+    unused = [key for key in prefetched if key not in wanted]
+    for key in unused:
+        # Queued calls never start, running ones stop at their next chunk or limiter wait
+        stops[key].set()
+        prefetched.pop(key).cancel()
+    if unused:
+        logging.info(f"Cancelled {len(unused)} infobit calls for phases the final skeleton does not have")
+    return roadmap_skeleton, prefetched
+
+
+def generate_roadmap(bedrock, lambda_client, roadmap_skeleton, input_data, bypass_cache=False, prefetched=None,
+                     restored=None, on_done=None, has_time_left=None):
+    """
+    Generate infobits, quizzes and search results as a graph of per-phase tasks,
+    so each step starts as soon as what it needs exists:
+
+    infobits:<n>  the skeleton
+    quizzes:<n>   infobits:<n>, numbered from the skeleton's topic counts
+    search:<n>    infobits:<n>, for the topic search terms
+    finalQuiz     every quizzes:<n>
+    search:final and coverImage only need the skeleton
+
+    Phases whose infobits or quizzes would come back longer than
+    OUTPUT_CHAR_BUDGET are asked for in parts of a few topics, run
+    concurrently and merged back in topic order.
+    Infobits already started by generate_skeleton are taken from prefetched.
+    A resumed job passes the task results it has checkpointed as restored,
+    see TaskGraph.run for on_done and has_time_left.
+    Returns the finished roadmap with the final quiz phase appended.
+    """
+    graph = TaskGraph(
+        max_workers=BEDROCK_MAX_CONCURRENCY + SEARCH_MAX_CONCURRENCY,
+        group_limits={'bedrock': BEDROCK_MAX_CONCURRENCY, 'search': SEARCH_MAX_CONCURRENCY},
+        name='roadmapGeneration'
+    )
+    phase_numbers = range(1, len(roadmap_skeleton['phases']) + 1)
+    # Numbered as roadmap_outline numbers them, so no phase's quizzes wait on the infobits before it
+    topic_offsets = list(accumulate((len(phase['topics']) for phase in roadmap_skeleton['phases']), initial=0))
+
+    def infobits_task(phase_number, phase):
+        def run(inputs):
+            inputs = infobit_inputs(roadmap_skeleton, phase, input_data)
+            if len(inputs) > 1:
+                logging.info(f"Phase {phase_number} infobits requested in {len(inputs)} parts of "
+                             f"{[len(part['phases']['topics']) for part in inputs]} topics")
+            parts = call_in_parts(bedrock, PROMPT_INFOBIT, inputs, graph.cancelled, bypass_cache, prefetched)
+            logging.info(f"Roadmap InfoBits Generated Successfully for Phase {phase_number}")
+            if len(parts) == 1:
+                return parts[0]['phases']
+            merged = dict(parts[0]['phases'][0])
+            merged['topics'] = [topic for part in parts for part_phase in part['phases'] for topic in part_phase['topics']]
+            return [merged]
+        return run
+
+    def quizzes_task(phase_number):
+        def run(inputs):
+            phase_offset = phase_number - 1
+            topic_offset = topic_offsets[phase_number - 1]
+
+            # search:<n> reads the same infobits concurrently, work on a copy
+            phases = copy.deepcopy(inputs[f'infobits:{phase_number}'])
+            for phase in phases:
+                phase_offset += 1
+                enhance_phase(phase, phase_offset, topic_offset)
+                topic_offset += len(phase['topics'])
+
+                inputs = [{
+                    'title': roadmap_skeleton['title'],
+                    'goal': input_data['goal'],
+                    'currentSkillLevel': input_data['currentSkillLevel'],
+                    'desiredSkillLevel': input_data['desiredSkillLevel'],
+                    'estimatedLearningDuration': input_data['estimatedLearningDuration'],
+                    'phaseDescription': phase['phaseDescription'],
+                    'topics': topics,
+                } for topics, _ in split_by_budget(phase['topics'], estimate_quiz_topic)]
+                if len(inputs) > 1:
+                    logging.info(f"Phase {phase_offset} quizzes requested in {len(inputs)} parts of "
+                                 f"{[len(part['topics']) for part in inputs]} topics")
+                parts = call_in_parts(bedrock, PROMPT_QUIZ, inputs, graph.cancelled, bypass_cache)
+                quiz_topics = [topic for part in parts for topic in part['topics']]
+
+                # Merge the quizzes with the infobits in the phase
+                for topic_index, topic in enumerate(phase['topics']):
+                    for infobit_index, infobit in enumerate(topic['infoBits']):
+                        infobit['quiz'] = quiz_topics[topic_index]['quizzes'][infobit_index]
+
+            logging.info(f"Quizzes Generated Successfully for Phase {phase_number}")
+            return phases
+        return run
+
+    def search_task(phase_number):
+        def run(inputs):
+            return search_topics(lambda_client, inputs[f'infobits:{phase_number}'])
+        return run
+
+    def final_quiz(inputs):
+        roadmap = roadmap_header(roadmap_skeleton, input_data)
+        roadmap['phases'] = [phase for number in phase_numbers for phase in inputs[f'quizzes:{number}']]
+        # Sent as a digest of topics, keywords and questions, see roadmap_digest
+        last_quiz = sonnect_api_call(bedrock, PROMPT_QUIZ_LAST, enhance_roadmap(roadmap), graph.cancelled, bypass_cache)
+        return final_quiz_phase(last_quiz, len(roadmap['phases']) + 1)
+
+    def final_search(inputs):
+        return search_topics(lambda_client, [{'topics': [{'topicSearchTerm': FINAL_QUIZ_SEARCH_TERM}]}])
+
+    def cover_image(inputs):
+        response = invoke_next_lambda({
+            'searchKeyword': roadmap_skeleton['searchKeyword'],
+            'imageURL': roadmap_skeleton['imageURL'],
+            'phases': []
+        }, lambda_client)
+        if int(response['statusCode']) != 200:
+            raise WebSearchError(response)
+        return json.loads(response['body'])['imageURL']
+
+    graph.add('coverImage', cover_image, group='search')
+    graph.add('search:final', final_search, group='search')
+    for phase_number, phase in zip(phase_numbers, roadmap_skeleton['phases']):
+        graph.add(f'infobits:{phase_number}', infobits_task(phase_number, phase), group='bedrock')
+    for phase_number in phase_numbers:
+        graph.add(
+            f'quizzes:{phase_number}', quizzes_task(phase_number),
+            deps=[f'infobits:{phase_number}'], group='bedrock'
+        )
+        graph.add(f'search:{phase_number}', search_task(phase_number), deps=[f'infobits:{phase_number}'], group='search')
+    graph.add('finalQuiz', final_quiz, deps=[f'quizzes:{number}' for number in phase_numbers], group='bedrock')
+
+    results = graph.run(restored, on_done, has_time_left)
+
+    roadmap = roadmap_header(roadmap_skeleton, input_data)
+    roadmap['imageURL'] = results['coverImage']
+    roadmap['phases'] = []
+    for phase_number in phase_numbers:
+        roadmap['phases'].extend(finish_phases(results[f'quizzes:{phase_number}'], results[f'search:{phase_number}']))
+    enhanced_roadmap = enhance_roadmap(roadmap)
+
+    final_phase = results['finalQuiz']
+    final_phase['topics'][0]['searchResult'] = results['search:final'][0][0]
+    final_phase['status'] = PHASE_READY
+    enhanced_roadmap['phases'].append(final_phase)
+    return enhanced_roadmap
+
+
+def finish_phases(phases, search_results):
+    """Add the search results to the phases a quizzes task returned and mark them PHASE_READY."""
+    for phase, phase_search_results in zip(phases, search_results):
+        for topic, search_result in zip(phase['topics'], phase_search_results):
+            topic['searchResult'] = search_result
+        phase['status'] = PHASE_READY
+    return phases
+
+
+def final_quiz_phase(last_quiz, phase_number):
+    final_phase = {
+            "phaseDescription": "final",
+            "phaseNumber": phase_number,
+            "topicCount": len(last_quiz['quizzes']),
+            "topics": []
+        }
+        
+    final_topic = {
+        "topicName": "Final Comprehensive Quiz",
+        "topicNumber": 1,
+        "topicSearchTerm" : FINAL_QUIZ_SEARCH_TERM,
+        "infobitCount": len(last_quiz['quizzes']),
+        "infoBits": []
+    }
+    
+    for quiz in last_quiz["quizzes"]:
+        infobit = {
+            "text": "infobit",
+            "keywords": ["keyword"],
+            "example": "example",
+            "quiz": quiz
+        }
+
+        final_topic["infoBits"].append(infobit) 
+
+    final_phase['topics'].append(final_topic)
+    return final_phase
+
+
+def search_topics(lambda_client, phases):
+    """
+    Search resources for the topics of some phases through infiniteLambda.
+    Only the search terms are sent. Returns the searchResult of every topic,
+    as a list per phase.
+    """
+    search_input = {
+        'phases': [
+            {'topics': [{'topicSearchTerm': topic['topicSearchTerm']} for topic in phase['topics']]}
+            for phase in phases
+        ]
+    }
+    response = invoke_next_lambda(search_input, lambda_client)
+    if int(response['statusCode']) != 200:
+        raise WebSearchError(response)
+
+    searched = json.loads(response['body'])
+    return [[topic['searchResult'] for topic in phase['topics']] for phase in searched['phases']]
+
         
-def sonnect_api_call(bedrock, prompt, input_data):
+def sonnect_api_call(bedrock, prompt, input_data, cancelled=None, bypass_cache=False, stream_paths=(), on_item=None):
+    """
+    Call the model and return its JSON output. When streaming, values at
+    stream_paths are passed to on_item(path, value) as soon as they are
+    complete, see IncrementalJSONParser.
+    """
+    prompt_input = build_prompt_input(PROMPT_STAGES.get(prompt), input_data, prompt_stats)
+    key = cache_key(MODEL_ID, prompt, prompt_input, SAMPLING_PARAMS)
+    cached = llm_cache.get(key, bypass=bypass_cache)
+    if cached is not None:
+        return cached
+
     max_retries = 10
     retry_attempts = 0
+    corrupted_streams = 0
+    # Raised once the retries run out, so the caller sees why the calls kept failing
+    last_error = None
     request_body = {
             "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 300000,
             "messages": [
                 {
                     "role": "user",
-                    "content": f'{prompt} INPUT = {input_data}'
+                    "content": f'{prompt} INPUT = {prompt_input}'
                 }
             ],
-            "temperature": 0.2,
-            "top_p": 0.9,
+            **SAMPLING_PARAMS
         }
     while retry_attempts < max_retries:
         try:
             # Invoke the model
-            response = bedrock.invoke_model(
-                body=json.dumps(request_body),
-                modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-                contentType="application/json",
-                accept="application/json"
-            )
-            
-            # Parse and return the response
-            response_body = json.loads(response['body'].read())
-            response_content = response_body['content'][0]['text']
-            
-            try:
-                result = json.loads(response_content)
-            except Exception as e:
-                result = extract_json(response_content)
-                
+            with bedrock_limiter.slot(cancelled) as call:
+                try:
+                    if BEDROCK_STREAMING:
+                        # The stream is read inside the slot, the model is busy until it ends
+                        result = invoke_streaming(
+                            bedrock, request_body, stream_paths, on_item,
+                            abort_on_error=corrupted_streams < STREAM_CORRUPTION_RETRIES, cancelled=cancelled
+                        )
+                    else:
+                        response = bedrock.invoke_model(
+                            body=json.dumps(request_body),
+                            modelId=MODEL_ID,
+                            contentType="application/json",
+                            accept="application/json"
+                        )
+                except ClientError as e:
+                    if client_error_code(e) == 'ThrottlingException':
+                        call.throttled()
+                    raise
+
+            if not BEDROCK_STREAMING:
+                # Parse and return the response
+                response_body = json.loads(response['body'].read())
+                result = parse_model_output(response_body['content'][0]['text'])
+
+            llm_cache.put(key, result, bypass=bypass_cache)
             return result
-        
+
+        except JSONStreamError as e:
+            last_error = e
+            corrupted_streams += 1
+            retry_attempts += 1
+            logger.error(f"Malformed model output, stream abandoned: {str(e)}. Retry attempt {retry_attempts}")
+
         except ClientError as e:
-            error_code = e.response['Error']['Code']
+            error_code = client_error_code(e)
 
-            if error_code == 'ThrottlingException' or error_code == 'InternalServerException':
+            if error_code == 'ThrottlingException':
+                # The limiter has lowered its rate, the retry waits for its next token
+                last_error = e
                 retry_attempts += 1
-                wait_time = 2 ** retry_attempts + random.uniform(0, 1)
-                if retry_attempts > 5 :
-                    wait_time = 30.2
-
                 logger.error(f"Throttling. Retry attempt {retry_attempts}. "
+                             f"Limiter: {bedrock_limiter.metrics()}")
+            elif error_code in ('InternalServerException', 'ModelStreamErrorException'):
+                last_error = e
+                retry_attempts += 1
+                wait_time = min(2 ** retry_attempts + random.uniform(0, 1), 30.2)
+
+                logger.error(f"Internal server error. Retry attempt {retry_attempts}. "
                              f"Waiting {wait_time:.2f}")
-                time.sleep(wait_time)
+                # Stop waiting once another step of the pipeline has failed
+                if cancelled is not None:
+                    if cancelled.wait(wait_time):
+                        raise Exception("Cancelled after another generation step failed")
+                else:
+                    time.sleep(wait_time)
             else:
                 logger.error(f"Error: While making API call to AI: {str(e)}")
                 raise e
         except Exception as e:
             logger.error(f"Error: While making API call to AI: {str(e)}")
             raise 
-    raise Exception("Max retries reached. ThrottlingException persists.")
-    
-def extract_json(response):
+    logger.error(f"Max retries reached, last error: {str(last_error)}")
+    raise last_error
+
+
+def client_error_code(error):
+    # Errors raised mid-stream carry the event name instead, e.g. throttlingException
+    code = error.response['Error']['Code']
+    return code[:1].upper() + code[1:]
+
+
+def parse_model_output(response_content):
     try:
-        json_start = response.index("{")
-        json_end = response.rfind("}")
-        string_result = response[json_start:json_end + 1]
-        result =  json.loads(string_result)
-        
-        return result
+        return json.loads(response_content)
     except Exception as e:
-        logger.error(f"Error: While parsing JSON: {str(e)}")
-        
-        # If there's a JSON decode error, check if it's due to a missing comma
-        match = re.search(r"Expecting ',' delimiter: line (\d+) column (\d+) \(char (\d+)\)", str(e))
-        if match:
-            logging.info("matched error to JSON Decode Error")
-            char_position = int(match.group(3))
-            # Attempt to fix the JSON by inserting a comma at the specified position
-            fixed_json_str = response[:char_position] + ',' + response[char_position:]
+        result, fixes = repair_json(response_content)
+        logger.info(f"Repaired model output: {summarize_fixes(fixes)}")
+        return result
+
+
+def invoke_streaming(bedrock, request_body, stream_paths, on_item, abort_on_error=True, cancelled=None):
+    """
+    Stream the model's answer through IncrementalJSONParser.
+
+    With abort_on_error the stream is dropped at the first structural error or
+    if it ends inside the document, and JSONStreamError is raised for the
+    caller to retry. Otherwise it is read to the end and repaired, as a
+    non-streamed answer would be. The stream is also dropped once cancelled is set.
+    """
+    response = bedrock.invoke_model_with_response_stream(
+        body=json.dumps(request_body),
+        modelId=MODEL_ID,
+        contentType="application/json",
+        accept="application/json"
+    )
+    parser = IncrementalJSONParser(stream_paths, on_item)
+    pieces = []
+    try:
+        for text in stream_text(response):
+            if cancelled is not None and cancelled.is_set():
+                raise Exception("Cancelled while streaming")
+            pieces.append(text)
+            if parser is None:
+                continue
             try:
-                # Try to parse the JSON again after the fix
-                json_start = response.index("{")
-                json_end = response.rfind("}")
-                string_result = response[json_start:json_end + 1]
-                result =  json.loads(string_result)
-            except Exception as ex:
-                # If there's still an error, return a message
-                logger.error(f"Error: While parsing JSON after fix: {str(ex)}")
-                logger.error(f"string_result = {str(string_result)[char_position-40:char_position+40]}")
+                parser.feed(text)
+            except JSONStreamError:
+                if abort_on_error:
+                    raise
+                parser = None
+            if parser is not None and parser.complete:
+                break
+    finally:
+        close_stream(response)
+
+    if parser is not None:
+        try:
+            return parser.close()
+        except JSONStreamError:
+            if abort_on_error:
                 raise
-        else:
-            # logger.error(f"string_result = {str(string_result)[char_position-10:char_position+10]}")
-            raise 
-        
+    return parse_model_output(''.join(pieces))
+    
+def enhance_phase(phase, phase_number, topic_offset):
+    phase['phaseNumber'] = phase_number
+    phase['topicCount'] = len(phase['topics'])
+
+    for j, topic in enumerate(phase['topics'], start=1):
+        topic['topicNumber'] = j + topic_offset
+        topic['infobitCount'] = len(topic['infoBits'])
+    return phase
+
 def enhance_roadmap(json_input):
     try:
         # Load the input JSON into a Python dictionary if it's a string
@@ -520,18 +1175,8 @@ def enhance_roadmap(json_input):
         total_topics = 0
         
         for i, phase in enumerate(data['phases'], start=1):
-            phase['phaseNumber'] = i
-            
-            topic_count = len(phase['topics'])
-            phase['topicCount'] = topic_count
-            
-            for j, topic in enumerate(phase['topics'], start=1):
-                topic['topicNumber'] = j + total_topics
-                
-                infobit_count = len(topic['infoBits'])
-                topic['infobitCount'] = infobit_count
-            
-            total_topics = total_topics + topic_count
+            enhance_phase(phase, i, total_topics)
+            total_topics = total_topics + phase['topicCount']
         
         data['totalLessons'] = total_topics
         return data
@@ -540,85 +1185,30 @@ def enhance_roadmap(json_input):
         logger.error(f"Error: While adding phase counts to roadmap: {str(ex)}")
         raise
 
-def save_roadmap(enhanced_roadmap, user_id, dynamodb):
+def save_roadmap(enhanced_roadmap, user_id, dynamodb, writer=None):
+    """Returns (roadmap id, version), or (None, None) if the roadmap was not saved."""
     try:
-        roadmap_id = str(uuid.uuid4())
-
-        # Save Roadmap
-        dynamodb.Table('Roadmaps').put_item(
-            Item={
-                'id': roadmap_id,
-                'title': enhanced_roadmap['title'],
-                'description': enhanced_roadmap['description'],
-                'imageURL': enhanced_roadmap['imageURL'],
-                'estimatedLearningDuration': enhanced_roadmap['estimatedLearningDuration'],
-                'goal': enhanced_roadmap['goal'],
-                'currentSkillLevel': enhanced_roadmap['currentSkillLevel'],
-                'desiredSkillLevel': enhanced_roadmap['desiredSkillLevel'],
-                'dailyTime': enhanced_roadmap['dailyTime'],
-                'phaseCount': enhanced_roadmap['phaseCount'],
-                'totalLessons': enhanced_roadmap['totalLessons']
-            }
-        )
-
-        # Save Phases
-        for phase_index, phase in enumerate(enhanced_roadmap['phases']):
-            phase_id = f"{roadmap_id}#PHASE#{phase_index + 1}"
-            dynamodb.Table('Phases').put_item(
-                Item={
-                    'roadmapId': roadmap_id,
-                    'phaseNumber': phase_index + 1,
-                    'phaseId': phase_id,
-                    'phaseDescription': phase['phaseDescription'],
-                    'topicCount': phase['topicCount']
-                }
-            )
+        # A roadmap saved phase by phase gets its final version, one after the last phase
+        if writer is None:
+            roadmap_id = str(uuid.uuid4())
+            version = 1
+        else:
+            roadmap_id = writer.roadmap_id
+            version = writer.version + 1
 
-            # Save Topics
-            for topic_index, topic in enumerate(phase['topics']):
-                topic_id = f"{phase_id}#TOPIC#{topic_index + 1}"
-                dynamodb.Table('Topics').put_item(
-                    Item={
-                        'phaseId': phase_id,
-                        'topicNumber': int(topic['topicNumber']),
-                        'topicId': topic_id,
-                        'topicName': topic['topicName'],
-                        'searchResult': topic['searchResult'],
-                        'infobitCount' : topic['infobitCount']
-                    }
-                )
+        # Save Roadmap, Phases, Topics, InfoBits and Quizzes in batches
+        start_time = time.time()
+        write_summary = write_roadmap(dynamodb, roadmap_id, enhanced_roadmap, version=version)
+        write_roadmap_snapshot(dynamodb, roadmap_id, enhanced_roadmap, version=version)
 
-                # Save InfoBits
-                for infobit_index, infobit in enumerate(topic['infoBits']):
-                    infobit_id = f"{topic_id}#INFOBIT#{infobit_index + 1}"
-                    dynamodb.Table('InfoBits').put_item(
-                        Item={
-                            'topicId': topic_id,
-                            'infoBitNumber': infobit_index + 1,
-                            'infoBitId': infobit_id,
-                            'text': infobit['text'],
-                            'keywords': infobit['keywords'],
-                            'example': infobit.get('example', "")
-                        }
-                    )
-
-                    # Save Quiz
-                    quiz = infobit['quiz']
-                    dynamodb.Table('Quizzes').put_item(
-                        Item={
-                            'infoBitId': infobit_id,
-                            'quizNumber':  infobit_index + 1,
-                            'text': quiz['text'],
-                            'type': quiz['type'],
-                            'options': quiz.get('options', ''),
-                            'answer': quiz['answer']
-                        }
-                    )
-            
-        logging.info("Roadmap saved to DB successfully")
-        save_user_roadmap(user_id, roadmap_id, dynamodb)
+        logging.info(f"Roadmap saved to DB successfully in {time.time() - start_time:.2f}s: {write_summary}")
+        # open_roadmap linked the user already, linking again would reset their progress
+        if writer is None:
+            save_user_roadmap(user_id, roadmap_id, dynamodb)
+        return roadmap_id, version
     except Exception as e:
         logging.error(f"Error saving to db: {str(e)}")
+        return None, None
 
 
 def save_user_roadmap(user_id, roadmap_id, dynamodb):
@@ -639,9 +1229,10 @@ def save_user_roadmap(user_id, roadmap_id, dynamodb):
 
 
 
-def invoke_next_lambda(lambda_input):    
+def invoke_next_lambda(lambda_input, client=None):    
     try:
-        client = boto3.client('lambda')
+        if client is None:
+            client = boto3.client('lambda')
         
         response = client.invoke(
             FunctionName='infiniteLambda' + "-frontend", 
@@ -1,17 +1,34 @@
-
 import boto3
 import json
+
+from roadmapFingerprint import request_fingerprint
+from roadmapJobs import QUEUED, create_job, find_failed_job, new_job_id, roadmap_request, update_job
+
+
 def handler(event, context):
     try:
-        
+        dynamodb = boto3.resource('dynamodb')
+        data = json.loads(event['body'])
+        user_id = data['userId']
+
+        # The job is created here so its id can be returned before quizFlow starts on it
+        fingerprint = request_fingerprint(roadmap_request(data))
+        job = None if data.get('freshRoadmap', False) else find_failed_job(dynamodb, user_id, fingerprint)
+        if job is None:
+            job_id = new_job_id()
+            request = {key: value for key, value in data.items() if key != 'jobId'}
+            create_job(dynamodb, job_id, user_id, request, fingerprint)
+        else:
+            job_id = job['id']
+            update_job(dynamodb, job_id, status=QUEUED)
 
         client = boto3.client('lambda')
-            
+
         response = client.invoke(
-            FunctionName= "quizFlow-frontend", 
+            FunctionName= "quizFlow-frontend",
             InvocationType='Event',
             Payload=json.dumps({
-                'body': event['body']
+                'body': json.dumps({'jobId': job_id})
             })
         )
         return {
@@ -21,7 +38,7 @@ def handler(event, context):
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
             },
-            'body': 'quizflow invoked successfuly'
+            'body': json.dumps({'jobId': job_id, 'status': QUEUED, 'statusUrl': f'/jobs/{job_id}'})
         }
     except Exception as e:
          return {
@@ -32,4 +49,4 @@ def handler(event, context):
                 'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
             },
             'body': f'error: {str(e)}'
-        }
\ No newline at end of file
+        }
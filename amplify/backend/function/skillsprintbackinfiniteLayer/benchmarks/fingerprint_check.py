@@ -0,0 +1,55 @@
+"""
+Check that request fingerprints tell apart the durations and daily times
+users write, and still match the ways of writing the same one.
+
+Usage:
+    python fingerprint_check.py
+
+Each case is a field, the raw values and the normalized value they must all
+map to. The check fails on the first value that normalizes to anything else,
+or if requests that differ only in such a value share a fingerprint.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lib', 'python'))
+
+from roadmapFingerprint import NORMALIZERS, request_fingerprint  # noqa: E402
+
+CASES = [
+    ('dailyTime', ['1.5 hours', '1.5 hrs', '90 minutes', '1 hour 30 min', 'an hour and a half',
+                   '1 and a half hours'], '90m'),
+    ('dailyTime', ['5 hours', 'five hours'], '300m'),
+    ('dailyTime', ['half an hour', 'a half hour', '30 mins', '.5 hours'], '30m'),
+    ('dailyTime', ['1 hour', 'an hour', 'Daily, 1 hour.'], '60m'),
+    ('estimatedLearningDuration', ['1.5 months', '45 days', 'a month and a half'], '45d'),
+    ('estimatedLearningDuration', ['15 months'], '450d'),
+    ('estimatedLearningDuration', ['two and a half weeks', '17.5 days'], '18d'),
+    ('estimatedLearningDuration', ['half a year', '182 days'], '182d'),
+]
+REQUEST = {
+    'title': 'Python', 'goal': 'Build web apps', 'currentSkillLevel': 'beginner',
+    'desiredSkillLevel': 'advanced', 'estimatedLearningDuration': '3 months', 'dailyTime': '1 hour'
+}
+
+
+def main():
+    for field, values, expected in CASES:
+        for value in values:
+            normalized = NORMALIZERS[field](value)
+            if normalized != expected:
+                sys.exit(f"{field} {value!r}: normalized to {normalized!r}, expected {expected!r}")
+        print(f"{field} {expected}: ok ({len(values)} ways of writing it)")
+
+    fingerprints = {}
+    for field, values, expected in CASES:
+        fingerprint = request_fingerprint(dict(REQUEST, **{field: values[0]}))
+        other = fingerprints.setdefault(fingerprint, (field, expected))
+        if other != (field, expected):
+            sys.exit(f"{field} {expected} shares a fingerprint with {other[0]} {other[1]}")
+    print(f"{len(fingerprints)} distinct fingerprints for {len(CASES)} distinct requests")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Check jsonRepair against the corpus of bad model outputs and time its repair
+throughput.
+
+Usage:
+    python json_repair_benchmark.py [corpus.jsonl]
+
+Each corpus line holds a model output ("output"), the document it should
+repair to ("expected") and the fix kinds it should report ("fixes"). The run
+fails on the first case that repairs to anything else, or that takes longer
+than CASE_TIMEOUT_SECONDS so a repair that stops making progress fails the
+check instead of hanging it. Throughput is measured on a generated infobit answer of typical size, clean and with faults injected
+at every infobit, and at 8x that size to show the pass stays linear.
+"""
+import json
+import os
+import signal
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lib', 'python'))
+
+from jsonRepair import repair_json, summarize_fixes  # noqa: E402
+
+REPEAT = 5
+CASE_TIMEOUT_SECONDS = 5
+
+
+def repair_in_time(text):
+    def timed_out(signum, frame):
+        raise TimeoutError
+
+    # SIGALRM is POSIX only, elsewhere the cases run without a limit
+    if not hasattr(signal, 'SIGALRM'):
+        return repair_json(text)
+    previous = signal.signal(signal.SIGALRM, timed_out)
+    signal.alarm(CASE_TIMEOUT_SECONDS)
+    try:
+        return repair_json(text)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def check_corpus(path):
+    with open(path) as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    for case in cases:
+        try:
+            value, fixes = repair_in_time(case['output'])
+        except TimeoutError:
+            sys.exit(f"{case['name']}: no result after {CASE_TIMEOUT_SECONDS}s")
+        kinds = sorted(kind for kind, _ in fixes)
+        if value != case['expected']:
+            sys.exit(f"{case['name']}: repaired to {json.dumps(value)[:200]}")
+        if kinds != sorted(case['fixes']):
+            sys.exit(f"{case['name']}: reported {kinds}, expected {sorted(case['fixes'])}")
+        print(f"{case['name']}: ok ({summarize_fixes(fixes) or 'nothing to fix'})")
+    print(f"{len(cases)} corpus cases repaired")
+
+
+def infobit_answer(topics):
+    return {'phases': [{
+        'phaseDescription': 'Working with data: ' + 'p' * 120,
+        'topics': [{
+            'topicName': f'Topic {t}',
+            'topicSearchTerm': f'topic {t} tutorial',
+            'infoBits': [{
+                'text': f'Infobit {i} of topic {t}. ' + 'Explains the "idea" in a few sentences. ' * 12,
+                'keywords': ['alpha', 'beta', 'gamma', 'delta'],
+                'example': 'for row in rows:\n    print(row)'
+            } for i in range(1, 6)]
+        } for t in range(1, topics + 1)]
+    }]}
+
+
+def broken(text):
+    # Every infobit gets unescaped quotes, a missing comma and a raw newline in its example
+    return (text.replace('Explains the \\"idea\\"', 'Explains the "idea"')
+            .replace('],\n              "example"', ']\n              "example"')
+            .replace('\\n    print', '\n    print'))
+
+
+def throughput(name, text):
+    runs = max(1, int(2_000_000 / len(text)))
+    seconds = min(timeit.repeat(lambda: repair_json(text), number=runs, repeat=REPEAT)) / runs
+    _, fixes = repair_json(text)
+    print(f"{name}: {len(text) / 1024:.0f} KB in {seconds * 1000:.2f} ms, "
+          f"{len(text) / seconds / 1024 / 1024:.1f} MB/s, {len(fixes)} fixes")
+    return seconds
+
+
+def main(corpus=os.path.join(HERE, 'json_repair_corpus.jsonl')):
+    check_corpus(corpus)
+
+    clean = json.dumps(infobit_answer(6), indent=2)
+    faulty = broken(clean)
+    if repair_json(faulty)[0] != json.loads(clean):
+        sys.exit("Generated faults were not repaired")
+
+    runs = max(1, int(2_000_000 / len(clean)))
+    loads = min(timeit.repeat(lambda: json.loads(clean), number=runs, repeat=REPEAT)) / runs
+    print(f"json.loads, clean: {len(clean) / 1024:.0f} KB in {loads * 1000:.2f} ms")
+    throughput("repair_json, clean", clean)
+    small = throughput("repair_json, faulty", faulty)
+    large = throughput("repair_json, faulty x8", broken(json.dumps(infobit_answer(48), indent=2)))
+    print(f"8x the input took {large / small:.1f}x the time")
+    if large / small > 12:
+        sys.exit("Repair time grows faster than the input")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
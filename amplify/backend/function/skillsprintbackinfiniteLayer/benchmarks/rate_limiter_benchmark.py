@@ -0,0 +1,110 @@
+"""
+Drive AdaptiveRateLimiter with a stub service that throttles above a fixed quota.
+
+Usage:
+    python rate_limiter_benchmark.py [quota_per_second] [callers] [calls_per_caller]
+
+Compares independent exponential backoff (what sonnect_api_call did before)
+with all callers sharing one limiter, and prints the limiter metrics.
+Exits non-zero unless the limiter cuts the throttle count and finishes
+no later than the backoff callers.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'python'))
+
+from rateLimiter import AdaptiveRateLimiter  # noqa: E402
+
+SERVICE_LATENCY = 0.02
+
+
+class Throttled(Exception):
+    pass
+
+
+class ThrottlingStub:
+    """Accepts at most quota calls in any one-second window."""
+
+    def __init__(self, quota):
+        self.quota = quota
+        self.accepted = deque()
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            now = time.monotonic()
+            while self.accepted and now - self.accepted[0] >= 1.0:
+                self.accepted.popleft()
+            if len(self.accepted) >= self.quota:
+                self.throttles += 1
+                raise Throttled()
+            self.accepted.append(now)
+        time.sleep(SERVICE_LATENCY)
+
+
+def backoff_caller(service, calls):
+    for _ in range(calls):
+        attempt = 0
+        while True:
+            try:
+                service.call()
+                break
+            except Throttled:
+                attempt += 1
+                time.sleep(min(0.05 * 2 ** attempt + random.uniform(0, 0.05), 1.0))
+
+
+def limited_caller(service, limiter, calls):
+    for _ in range(calls):
+        while True:
+            try:
+                with limiter.slot() as call:
+                    try:
+                        service.call()
+                    except Throttled:
+                        call.throttled()
+                        raise
+                break
+            except Throttled:
+                continue
+
+
+def run(label, target, callers):
+    threads = [threading.Thread(target=target) for _ in range(callers)]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start_time
+
+
+def main(quota=10, callers=8, calls_per_caller=10):
+    naive = ThrottlingStub(quota)
+    naive_time = run('backoff', lambda: backoff_caller(naive, calls_per_caller), callers)
+
+    limited = ThrottlingStub(quota)
+    limiter = AdaptiveRateLimiter(rate=quota / 2, max_rate=quota * 2, burst=2, max_in_flight=callers, increase=quota / 10)
+    limited_time = run('limiter', lambda: limited_caller(limited, limiter, calls_per_caller), callers)
+
+    total = callers * calls_per_caller
+    ideal = total / quota
+    print(f"{total} calls, quota {quota}/s (ideal {ideal:.1f}s)")
+    print(f"independent backoff: {naive_time:.2f}s, {naive.throttles} throttles")
+    print(f"shared limiter:      {limited_time:.2f}s, {limited.throttles} throttles, {limiter.metrics()}")
+
+    if limited.throttles >= naive.throttles:
+        sys.exit("The limiter did not reduce throttling")
+    if limited_time > naive_time:
+        sys.exit("The limiter was slower than independent backoff")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,76 @@
+"""
+Compare dynamoJson.dumps with the old convert_decimals + json.dumps response path.
+
+Usage:
+    python serializer_benchmark.py [recorded_roadmap.json ...]
+
+Recorded payloads are responses saved from GET /roadmap or /userRoadmap. They
+are loaded with numbers as Decimal, the way boto3 returns them from DynamoDB.
+Without arguments a generated roadmap of typical size is used.
+"""
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'python'))
+
+from dynamoJson import dumps  # noqa: E402
+
+REPEAT = 5
+
+
+def convert_decimals(obj):
+    # Copy of the helper dbOperations used before dynamoJson
+    if isinstance(obj, list):
+        return [convert_decimals(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {key: convert_decimals(value) for key, value in obj.items()}
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    else:
+        return obj
+
+
+def generated_roadmap(phases=6, topics=6, infobits=6):
+    return {
+        'id': 'benchmark', 'title': 'Benchmark roadmap', 'description': 'd' * 200, 'imageURL': 'https://example.com/i.png',
+        'estimatedLearningDuration': '6 weeks', 'goal': 'g' * 100, 'currentSkillLevel': 'beginner',
+        'desiredSkillLevel': 'advanced', 'dailyTime': '1 hour', 'phaseCount': Decimal(phases),
+        'totalLessons': Decimal(phases * topics),
+        'phases': [{
+            'phaseDescription': 'p' * 150, 'topicCount': Decimal(topics), 'phaseNumber': Decimal(p),
+            'topics': [{
+                'topicName': f'Topic {t}', 'topicNumber': Decimal(t), 'infobitCount': Decimal(infobits),
+                'searchResult': {'webResult': [{'title': 'r' * 60, 'url': 'https://example.com/' + 'u' * 40, 'snippet': 's' * 300} for _ in range(5)]},
+                'infoBits': [{
+                    'infoBitId': f'benchmark#PHASE#{p}#TOPIC#{t}#INFOBIT#{i}', 'text': 'x' * 600,
+                    'keywords': ['alpha', 'beta', 'gamma'], 'example': 'e' * 200,
+                    'quiz': {'text': 'q' * 150, 'type': 'multiple_choice', 'options': ['a' * 40] * 4, 'answer': 'a' * 40}
+                } for i in range(1, infobits + 1)]
+            } for t in range(1, topics + 1)]
+        } for p in range(1, phases + 1)]
+    }
+
+
+def benchmark(name, payload):
+    size = len(dumps(payload))
+    runs = max(1, int(2_000_000 / size))
+    old = min(timeit.repeat(lambda: json.dumps(convert_decimals(payload)), number=runs, repeat=REPEAT)) / runs
+    new = min(timeit.repeat(lambda: dumps(payload), number=runs, repeat=REPEAT)) / runs
+    old_size = len(json.dumps(convert_decimals(payload)))
+    print(f"{name}: {old_size} -> {size} bytes, convert_decimals+json.dumps {old * 1000:.2f} ms, "
+          f"dumps {new * 1000:.2f} ms, {old / new:.2f}x")
+
+
+def main(paths):
+    if not paths:
+        benchmark('generated roadmap', generated_roadmap())
+    for path in paths:
+        with open(path) as f:
+            benchmark(os.path.basename(path), json.load(f, parse_int=Decimal, parse_float=Decimal))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
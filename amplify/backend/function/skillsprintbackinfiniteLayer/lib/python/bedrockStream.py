@@ -0,0 +1,26 @@
+import json
+
+
+def stream_text(response):
+    """
+    Yield the text of an invoke_model_with_response_stream response for an
+    Anthropic messages request, piece by piece as the model writes it.
+    Error events (throttling, model stream errors) are raised by botocore
+    while iterating, as EventStreamError with the event name as error code.
+    """
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if chunk is None:
+            continue
+        payload = json.loads(chunk['bytes'])
+        if payload.get('type') == 'content_block_delta':
+            text = payload['delta'].get('text')
+            if text:
+                yield text
+
+
+def close_stream(response):
+    # Stops the model from being read any further, e.g. after corrupted output
+    close = getattr(response.get('body'), 'close', None)
+    if close is not None:
+        close()
@@ -0,0 +1,269 @@
+import base64
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+MAX_WORKERS = 16
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+MAX_BATCH_RETRIES = 8
+SCAN_SEGMENTS = 8
+
+
+class RoundTripCounter:
+    """
+    Thread-safe count of DynamoDB requests, grouped by operation name.
+    Pass one into the helpers below and log it to compare access paths.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def add(self, operation, count=1):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + count
+
+    @property
+    def total(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def __repr__(self):
+        with self._lock:
+            total = sum(self.calls.values())
+            calls = ', '.join(f"{op}={n}" for op, n in sorted(self.calls.items()))
+        return f"RoundTripCounter(total={total}, {calls})"
+
+
+def _count(counter, operation):
+    if counter is not None:
+        counter.add(operation)
+
+
+def backoff_sleep(attempt, base=0.05, cap=2.0):
+    # Full jitter, as recommended for DynamoDB batch retries
+    time.sleep(random.uniform(0, min(cap, base * (2 ** attempt))))
+
+
+def run_parallel(fn, items, max_workers=MAX_WORKERS):
+    """
+    Apply fn to every item on a thread pool and return the results in input order.
+    Small inputs run inline to skip the pool overhead.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(fn, items))
+
+
+def chunked(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def query_all(dynamodb, table_name, counter=None, **query_kwargs):
+    """
+    Run a query and follow LastEvaluatedKey until the partition is exhausted.
+    """
+    table = dynamodb.Table(table_name)
+    items = []
+    while True:
+        response = table.query(**query_kwargs)
+        _count(counter, 'Query')
+        items.extend(response.get('Items', []))
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return items
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
+def scan_page(dynamodb, table_name, limit, page_token=None, counter=None, **scan_kwargs):
+    """
+    Read one page of a scan. page_token is the opaque string returned by the
+    previous page, or None for the first page.
+
+    Returns (items, next_page_token); next_page_token is None on the last page.
+    """
+    if page_token:
+        scan_kwargs['ExclusiveStartKey'] = decode_page_token(page_token)
+
+    response = dynamodb.Table(table_name).scan(Limit=limit, **scan_kwargs)
+    _count(counter, 'Scan')
+
+    last_key = response.get('LastEvaluatedKey')
+    return response.get('Items', []), encode_page_token(last_key) if last_key else None
+
+
+def parallel_scan(dynamodb, table_name, counter=None, total_segments=SCAN_SEGMENTS, **scan_kwargs):
+    """
+    Read a whole table with DynamoDB parallel scan, one worker per segment.
+    Every segment follows LastEvaluatedKey, so results are never truncated.
+    """
+    def scan_segment(segment):
+        segment_kwargs = dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)
+        table = dynamodb.Table(table_name)
+        items = []
+        while True:
+            response = table.scan(**segment_kwargs)
+            _count(counter, 'Scan')
+            items.extend(response.get('Items', []))
+
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return items
+            segment_kwargs['ExclusiveStartKey'] = last_key
+
+    items = []
+    for segment_items in run_parallel(scan_segment, range(total_segments), total_segments):
+        items.extend(segment_items)
+    return items
+
+
+def encode_page_token(last_evaluated_key):
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key, default=str).encode('utf-8')).decode('ascii')
+
+
+def decode_page_token(page_token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(page_token.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid page token")
+
+
+def batch_get(dynamodb, table_name, keys, counter=None, projection=None, attribute_names=None, max_workers=MAX_WORKERS):
+    """
+    Fetch items by primary key with BatchGetItem.
+
+    Keys are de-duplicated and split into chunks of 100; the chunks are sent
+    concurrently and any UnprocessedKeys are retried with jittered backoff.
+    Items come back in no particular order.
+    """
+    unique_keys = []
+    seen = set()
+    for key in keys:
+        marker = tuple(sorted(key.items()))
+        if marker not in seen:
+            seen.add(marker)
+            unique_keys.append(key)
+
+    def fetch_chunk(chunk):
+        request = {'Keys': chunk}
+        if projection:
+            request['ProjectionExpression'] = projection
+        if attribute_names:
+            request['ExpressionAttributeNames'] = attribute_names
+
+        pending = {table_name: request}
+        found = []
+        attempt = 0
+        while pending:
+            response = dynamodb.batch_get_item(RequestItems=pending)
+            _count(counter, 'BatchGetItem')
+            found.extend(response.get('Responses', {}).get(table_name, []))
+
+            pending = response.get('UnprocessedKeys') or {}
+            if pending:
+                attempt += 1
+                if attempt > MAX_BATCH_RETRIES:
+                    raise RuntimeError(f"BatchGetItem on {table_name} left keys unprocessed after {MAX_BATCH_RETRIES} retries")
+                logger.info(f"Retrying {len(pending[table_name]['Keys'])} unprocessed keys on {table_name}, attempt {attempt}")
+                backoff_sleep(attempt)
+        return found
+
+    items = []
+    for chunk_items in run_parallel(fetch_chunk, chunked(unique_keys, BATCH_GET_LIMIT), max_workers):
+        items.extend(chunk_items)
+    return items
+
+
+def get_items(dynamodb, requests_by_table, counter=None):
+    """
+    Fetch a few items from several tables in one BatchGetItem, retrying any
+    UnprocessedKeys with jittered backoff. requests_by_table maps a table
+    name to its request ({'Keys': [...], optionally 'ProjectionExpression'
+    and 'ExpressionAttributeNames'}), at most BATCH_GET_LIMIT keys in all.
+    Returns the items found per table name.
+    """
+    found = {table_name: [] for table_name in requests_by_table}
+    pending = requests_by_table
+    attempt = 0
+    while pending:
+        response = dynamodb.batch_get_item(RequestItems=pending)
+        _count(counter, 'BatchGetItem')
+        for table_name, items in response.get('Responses', {}).items():
+            found[table_name].extend(items)
+
+        pending = response.get('UnprocessedKeys') or {}
+        if pending:
+            attempt += 1
+            if attempt > MAX_BATCH_RETRIES:
+                raise RuntimeError(f"BatchGetItem on {', '.join(pending)} left keys unprocessed after {MAX_BATCH_RETRIES} retries")
+            backoff_sleep(attempt)
+    return found
+
+
+def put_request(item):
+    return {'PutRequest': {'Item': item}}
+
+
+def delete_request(key):
+    return {'DeleteRequest': {'Key': key}}
+
+
+def batch_write(dynamodb, requests_by_table, counter=None, max_workers=MAX_WORKERS):
+    """
+    Send put and delete requests for any number of tables with BatchWriteItem.
+
+    requests_by_table maps a table name to a list of put_request/delete_request
+    entries. Requests from all tables are packed into 25-item chunks, the chunks
+    are sent concurrently and UnprocessedItems are resent with jittered backoff.
+    A chunk must not touch the same key twice.
+
+    Returns a per-table summary: {table: {'puts': n, 'deletes': n, 'retried': n}}.
+    """
+    summary = {}
+    flat_requests = []
+    for table_name, requests in requests_by_table.items():
+        table_summary = summary.setdefault(table_name, {'puts': 0, 'deletes': 0, 'retried': 0})
+        for request in requests:
+            if 'PutRequest' in request:
+                table_summary['puts'] += 1
+            else:
+                table_summary['deletes'] += 1
+            flat_requests.append((table_name, request))
+
+    def write_chunk(chunk):
+        pending = {}
+        for table_name, request in chunk:
+            pending.setdefault(table_name, []).append(request)
+
+        retried = {}
+        attempt = 0
+        while pending:
+            response = dynamodb.batch_write_item(RequestItems=pending)
+            _count(counter, 'BatchWriteItem')
+
+            pending = response.get('UnprocessedItems') or {}
+            if pending:
+                attempt += 1
+                if attempt > MAX_BATCH_RETRIES:
+                    raise RuntimeError(f"BatchWriteItem left items unprocessed after {MAX_BATCH_RETRIES} retries")
+                for table_name, requests in pending.items():
+                    retried[table_name] = retried.get(table_name, 0) + len(requests)
+                backoff_sleep(attempt)
+        return retried
+
+    for retried in run_parallel(write_chunk, chunked(flat_requests, BATCH_WRITE_LIMIT), max_workers):
+        for table_name, count in retried.items():
+            summary[table_name]['retried'] += count
+
+    return summary
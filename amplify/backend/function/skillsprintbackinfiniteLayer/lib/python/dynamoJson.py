@@ -0,0 +1,45 @@
+import base64
+import gzip
+import json
+from decimal import Decimal
+
+# No whitespace between tokens, API Gateway and the snapshot store pay for every byte
+COMPACT_SEPARATORS = (',', ':')
+
+
+def encode_dynamo_value(value):
+    """
+    json.dumps default hook for the types boto3 returns from DynamoDB.
+
+    Numbers come back as Decimal and are written as int when integral and as
+    float otherwise. Sets become sorted lists so the output is stable, binary
+    attributes become base64 strings.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    # boto3 wraps binary attributes in a Binary object
+    if hasattr(value, 'value') and isinstance(value.value, (bytes, bytearray)):
+        return base64.b64encode(value.value).decode('ascii')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj, sort_keys=False):
+    """
+    Serialize items read from DynamoDB in a single pass, without first copying
+    the tree to convert its numbers.
+    """
+    return json.dumps(obj, separators=COMPACT_SEPARATORS, default=encode_dynamo_value, sort_keys=sort_keys)
+
+
+def dumps_bytes(obj, compress=False, compresslevel=6):
+    """
+    Serialize to UTF-8 bytes, gzip-compressed when compress is set.
+    """
+    data = dumps(obj).encode('utf-8')
+    if compress:
+        return gzip.compress(data, compresslevel=compresslevel)
+    return data
@@ -0,0 +1,96 @@
+import base64
+import gzip
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger()
+
+# Below this many bytes compression saves less than the base64 and header overhead adds
+COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings():
+    # Server preference order, brotli only when the module is packaged
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the content coding for an Accept-Encoding header, or None for identity.
+    Honors q-values (q=0 refuses a coding) and '*'; ties go to the server preference.
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    best = None
+    best_weight = 0.0
+    for coding in supported_encodings():
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def compress_response(response, accept_encoding, cache=None, min_bytes=COMPRESSION_MIN_BYTES):
+    """
+    Compress the body of an API Gateway proxy response when the client accepts it.
+
+    Only 200 responses of at least min_bytes are compressed; the body is
+    returned base64 encoded with isBase64Encoded set. When the response has an
+    ETag and a cache (memoryCache.LRUCache) is given, the encoded body is cached
+    under the ETag, which already changes with the content version.
+    """
+    headers = dict(response.get('headers') or {})
+    body = response.get('body')
+    if response.get('statusCode') != 200 or not body or response.get('isBase64Encoded'):
+        return response
+
+    vary = headers.get('Vary')
+    headers['Vary'] = f"{vary}, Accept-Encoding" if vary else 'Accept-Encoding'
+    data = body.encode('utf-8')
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None or len(data) < min_bytes:
+        return dict(response, headers=headers)
+
+    cache_key = f"{encoding}:{headers['ETag']}" if cache is not None and headers.get('ETag') else None
+    cached = cache.get(cache_key) if cache_key else None
+    if cached:
+        encoded = cached.value
+    else:
+        encoded = base64.b64encode(compress(data, encoding)).decode('ascii')
+        if cache_key:
+            cache.put(cache_key, encoded, len(encoded))
+        logger.info(f"Compressed response body with {encoding}: {len(data)} -> {len(encoded)} bytes (base64)")
+
+    headers['Content-Encoding'] = encoding
+    return dict(response, headers=headers, body=encoded, isBase64Encoded=True)
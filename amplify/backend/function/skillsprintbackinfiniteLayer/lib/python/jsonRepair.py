@@ -0,0 +1,361 @@
+import json
+import re
+
+WHITESPACE = ' \t\r\n'
+SIGNIFICANT = re.compile(r'[^ \t\r\n]')
+CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'}
+VALID_ESCAPES = '"\\/bfnrtu'
+# Characters that end a run of plain string content
+STRING_STOP = {
+    '"': re.compile(r'["\\\x00-\x1f]'),
+    "'": re.compile(r'["\'\\\x00-\x1f]'),
+}
+# Unquoted keys and values, \w so that non-ASCII letters are read as part of them
+WORD = re.compile(r'[\w$.+\-]+')
+NUMBER = re.compile(r'-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?$')
+WORD_LITERALS = {'true': 'true', 'false': 'false', 'null': 'null', 'True': 'true', 'False': 'false', 'None': 'null'}
+VALUE_START = '"\'{[-0123456789'
+
+# Container states: what the next significant character should be
+KEY_OR_END = 'key or }'
+KEY = 'key'
+COLON = ':'
+VALUE_OR_END = 'value or ]'
+VALUE = 'value'
+COMMA_OR_END = ', or end'
+
+# Fix kinds
+MISSING_COMMA = 'missing comma'
+TRAILING_COMMA = 'trailing comma'
+EXTRA_COMMA = 'extra comma'
+MISSING_COLON = 'missing colon'
+MISSING_VALUE = 'missing value'
+UNESCAPED_QUOTE = 'unescaped quote'
+CONTROL_CHARACTER = 'unescaped control character'
+INVALID_ESCAPE = 'invalid escape'
+SINGLE_QUOTES = 'single-quoted string'
+UNQUOTED_KEY = 'unquoted key'
+UNQUOTED_VALUE = 'unquoted value'
+PYTHON_LITERAL = 'python literal'
+UNCLOSED_BRACKET = 'unclosed bracket'
+STRAY_CHARACTER = 'stray character'
+TRUNCATED = 'truncated'
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+class _Frame:
+    __slots__ = ('kind', 'state', 'start', 'member_start')
+
+    def __init__(self, kind, start):
+        self.kind = kind
+        self.state = KEY_OR_END if kind == '{' else VALUE_OR_END
+        # Indexes in the output: the first member, and the current member with its comma
+        self.start = start
+        self.member_start = start
+
+
+class _Repairer:
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        self.out = []
+        self.fixes = []
+        self.stack = []
+
+    def fix(self, kind, position):
+        self.fixes.append((kind, position))
+
+    def next_significant(self, position):
+        match = SIGNIFICANT.search(self.text, position)
+        return match.start() if match is not None else self.length
+
+    def string_closes(self, position, is_key):
+        """
+        Whether a quote found inside a string ends it, judged by what follows:
+        a colon after a key, a comma or the closing bracket after a value.
+        """
+        position = self.next_significant(position)
+        if position >= self.length:
+            return True
+        char = self.text[position]
+        if is_key:
+            return char == ':'
+        if char in '}]"':
+            return True
+        if char != ',':
+            return False
+        # A comma inside the text is followed by more words, one between members by a key or value
+        position = self.next_significant(position + 1)
+        if position >= self.length:
+            return True
+        follow = self.text[position]
+        if self.stack[-1].kind == '{':
+            if follow in '"\'}':
+                return True
+            # An unquoted key: a word and a colon
+            match = WORD.match(self.text, position)
+            if match is None:
+                return False
+            position = self.next_significant(match.end())
+            return position < self.length and self.text[position] == ':'
+        return follow in VALUE_START or follow in ']}' or follow in 'tfnTFN'
+
+    def read_string(self, start, is_key):
+        text = self.text
+        quote = text[start]
+        if quote == "'":
+            self.fix(SINGLE_QUOTES, start)
+        stop = STRING_STOP[quote]
+        pieces = ['"']
+        position = start + 1
+        while True:
+            match = stop.search(text, position)
+            if match is None:
+                pieces.append(text[position:])
+                pieces.append('"')
+                return ''.join(pieces), self.length, True
+
+            end = match.start()
+            pieces.append(text[position:end])
+            char = text[end]
+            if char == '\\':
+                if end + 1 >= self.length:
+                    position = self.length
+                elif text[end + 1] in VALID_ESCAPES:
+                    pieces.append(text[end:end + 2])
+                    position = end + 2
+                elif text[end + 1] == "'":
+                    pieces.append("'")
+                    position = end + 2
+                else:
+                    self.fix(INVALID_ESCAPE, end)
+                    pieces.append('\\\\')
+                    position = end + 1
+            elif char < ' ':
+                self.fix(CONTROL_CHARACTER, end)
+                pieces.append(CONTROL_ESCAPES.get(char) or f'\\u{ord(char):04x}')
+                position = end + 1
+            elif char == quote and self.string_closes(end + 1, is_key):
+                pieces.append('"')
+                return ''.join(pieces), end + 1, False
+            else:
+                # A double quote inside the text, or one inside a single-quoted string
+                if quote == '"':
+                    self.fix(UNESCAPED_QUOTE, end)
+                pieces.append('\\"' if char == '"' else char)
+                position = end + 1
+
+    def open(self, char):
+        self.out.append(char)
+        self.stack.append(_Frame(char, len(self.out)))
+
+    def close(self):
+        frame = self.stack.pop()
+        self.out.append('}' if frame.kind == '{' else ']')
+        if self.stack:
+            self.stack[-1].state = COMMA_OR_END
+
+    def drop_member(self, frame):
+        del self.out[frame.member_start:]
+        if frame.member_start > frame.start:
+            frame.state = COMMA_OR_END
+        else:
+            frame.state = KEY_OR_END if frame.kind == '{' else VALUE_OR_END
+
+    def add_comma(self, frame):
+        frame.member_start = len(self.out)
+        self.out.append(',')
+        frame.state = KEY if frame.kind == '{' else VALUE
+
+    def value(self, frame, position):
+        """Read the value starting at position, return where it ends."""
+        text = self.text
+        char = text[position]
+        if char == '{' or char == '[':
+            self.open(char)
+            return position + 1
+        if char == '"' or char == "'":
+            string, end, _ = self.read_string(position, is_key=False)
+            self.out.append(string)
+            frame.state = COMMA_OR_END
+            return end
+
+        match = WORD.match(text, position)
+        if match is None:
+            self.fix(STRAY_CHARACTER, position)
+            return position + 1
+        word = match.group()
+        if match.end() >= self.length:
+            # Cut off mid-literal, the member is dropped when the document is closed
+            return self.length
+        if word in WORD_LITERALS:
+            if word != WORD_LITERALS[word]:
+                self.fix(PYTHON_LITERAL, position)
+            self.out.append(WORD_LITERALS[word])
+        elif NUMBER.match(word):
+            self.out.append(word)
+        else:
+            self.fix(UNQUOTED_VALUE, position)
+            self.out.append(json.dumps(word))
+        frame.state = COMMA_OR_END
+        return match.end()
+
+    def closing(self, char, position):
+        """Close the innermost container, or the ones above the bracket's match."""
+        wanted = '{' if char == '}' else '['
+        if self.stack[-1].kind != wanted:
+            if not any(frame.kind == wanted for frame in self.stack):
+                self.fix(STRAY_CHARACTER, position)
+                return
+            while self.stack[-1].kind != wanted:
+                self.fix(UNCLOSED_BRACKET, position)
+                self.finish_frame(self.stack[-1])
+                self.close()
+        self.close()
+
+    def finish_frame(self, frame):
+        # Drop whatever member was left half written
+        if frame.state in (KEY, COLON, VALUE):
+            self.drop_member(frame)
+
+    def run(self):
+        text = self.text
+        starts = [index for index in (text.find('{'), text.find('[')) if index >= 0]
+        if not starts:
+            raise JSONRepairError("No JSON object or array in the text")
+        position = min(starts)
+        self.open(text[position])
+        position += 1
+
+        while position < self.length and self.stack:
+            char = text[position]
+            if char in WHITESPACE:
+                position = self.next_significant(position)
+                continue
+
+            frame = self.stack[-1]
+            state = frame.state
+
+            if state == COMMA_OR_END:
+                if char == ',':
+                    self.add_comma(frame)
+                    position += 1
+                elif char == '}' or char == ']':
+                    self.closing(char, position)
+                    position += 1
+                elif (frame.kind == '{' and (char in '"\'' or char.isalpha() or char == '_')) or \
+                        (frame.kind == '[' and (char in VALUE_START or char.isalpha())):
+                    # Re-read as the next member
+                    self.fix(MISSING_COMMA, position)
+                    self.add_comma(frame)
+                else:
+                    self.fix(STRAY_CHARACTER, position)
+                    position += 1
+
+            elif state == KEY or state == KEY_OR_END:
+                if char == '"' or char == "'":
+                    key, position, truncated = self.read_string(position, is_key=True)
+                    if not truncated:
+                        self.out.append(key)
+                        self.out.append(':')
+                        frame.state = COLON
+                elif char == '}':
+                    if state == KEY:
+                        self.fix(TRAILING_COMMA, position)
+                        self.drop_member(frame)
+                    self.close()
+                    position += 1
+                elif char == ',':
+                    self.fix(EXTRA_COMMA, position)
+                    position += 1
+                elif char.isalpha() or char == '_':
+                    match = WORD.match(text, position)
+                    if match is None:
+                        self.fix(STRAY_CHARACTER, position)
+                        position += 1
+                        continue
+                    self.fix(UNQUOTED_KEY, position)
+                    self.out.append(json.dumps(match.group()))
+                    self.out.append(':')
+                    frame.state = COLON
+                    position = match.end()
+                elif char == ']':
+                    self.closing(char, position)
+                    position += 1
+                else:
+                    self.fix(STRAY_CHARACTER, position)
+                    position += 1
+
+            elif state == COLON:
+                if char == ':':
+                    frame.state = VALUE
+                    position += 1
+                elif char in VALUE_START or char.isalpha():
+                    self.fix(MISSING_COLON, position)
+                    frame.state = VALUE
+                elif char == '}' or char == ',':
+                    self.fix(MISSING_VALUE, position)
+                    self.drop_member(frame)
+                else:
+                    self.fix(STRAY_CHARACTER, position)
+                    position += 1
+
+            else:  # VALUE or VALUE_OR_END
+                if char == ']' and frame.kind == '[':
+                    if state == VALUE:
+                        self.fix(TRAILING_COMMA, position)
+                        self.drop_member(frame)
+                    self.close()
+                    position += 1
+                elif frame.kind == '{' and (char == '}' or char == ','):
+                    self.fix(MISSING_VALUE, position)
+                    self.drop_member(frame)
+                elif char == ',':
+                    self.fix(EXTRA_COMMA, position)
+                    position += 1
+                elif char == ']' or char == '}':
+                    # Always moves on: a '}' in an array closes the object around it or is dropped
+                    self.closing(char, position)
+                    position += 1
+                else:
+                    position = self.value(frame, position)
+
+        if self.stack:
+            self.fix(TRUNCATED, self.length)
+            while self.stack:
+                self.finish_frame(self.stack[-1])
+                self.close()
+
+        repaired = ''.join(self.out)
+        try:
+            return json.loads(repaired), self.fixes
+        except ValueError as e:
+            raise JSONRepairError(f"Could not repair JSON: {str(e)}")
+
+
+def repair_json(text):
+    """
+    Parse JSON written by a model, repairing it on the way.
+
+    One left-to-right pass rebuilds the document and fixes what our model
+    outputs get wrong: missing, trailing and doubled commas, unescaped quotes
+    and control characters inside strings, single-quoted strings, unquoted
+    keys, Python literals and output cut off before the end (open brackets
+    are closed, a string value cut off is kept as far as it goes, any other
+    half-written member is dropped). Text before the first '{' or '[' and
+    after the document is ignored.
+
+    Returns (value, fixes), fixes is a list of (kind, position in text).
+    Raises JSONRepairError when there is no document to recover.
+    """
+    return _Repairer(text).run()
+
+
+def summarize_fixes(fixes):
+    counts = {}
+    for kind, _ in fixes:
+        counts[kind] = counts.get(kind, 0) + 1
+    return ', '.join(f"{kind} x{count}" for kind, count in counts.items())
@@ -0,0 +1,230 @@
+import json
+import re
+from bisect import bisect_left, bisect_right
+
+WILDCARD = '*'
+WHITESPACE = ' \t\r\n'
+LITERAL_START = '-0123456789tfn'
+LITERAL_END = re.compile(r'[\s,\]}]')
+STRING_STOP = re.compile(r'["\\]')
+NUMBER = re.compile(r'-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$')
+
+# Container states: what the next significant character may be
+KEY_OR_END = 'key or }'
+KEY = 'key'
+COLON = ':'
+VALUE_OR_END = 'value or ]'
+VALUE = 'value'
+COMMA_OR_END = ', or end'
+
+
+class JSONStreamError(ValueError):
+    def __init__(self, message, position):
+        super().__init__(f"{message} at char {position}")
+        self.position = position
+
+
+class _Frame:
+    __slots__ = ('kind', 'state', 'key', 'index', 'start')
+
+    def __init__(self, kind, start):
+        self.kind = kind
+        self.state = KEY_OR_END if kind == '{' else VALUE_OR_END
+        self.key = None
+        self.index = -1
+        self.start = start
+
+
+class IncrementalJSONParser:
+    """
+    Push parser for a JSON document that arrives in pieces, e.g. a model
+    response stream.
+
+    feed() checks the structure as text comes in and raises JSONStreamError at
+    the first character that cannot continue a valid document, so a corrupted
+    response can be abandoned long before it ends. Every value whose path
+    matches one of paths is decoded and passed to on_item(path, value) as soon
+    as it is complete. A path is a tuple of object keys and array indices,
+    WILDCARD matches any one of them: ('phases', WILDCARD) emits each phase.
+
+    Text before the first '{' or '[' (e.g. a sentence in front of the JSON) and
+    anything after the document is closed are ignored. Strings are decoded
+    with strict=False, raw newlines in them are accepted.
+    """
+
+    def __init__(self, paths=(), on_item=None):
+        self.paths = [tuple(path) for path in paths]
+        self.on_item = on_item
+        self.complete = False
+        self.items = 0
+        # Fed chunks and the position each starts at, joined only where a value is read
+        self._parts = []
+        self._part_starts = []
+        self._length = 0
+        self._stack = []
+        self._root_start = None
+        self._root_end = None
+        self._in_string = False
+        self._string_is_key = False
+        self._escaped = False
+        self._value_start = None
+        self._literal_start = None
+
+    @property
+    def position(self):
+        return self._length
+
+    def _text(self, start, end):
+        first = bisect_right(self._part_starts, start) - 1
+        last = bisect_left(self._part_starts, end)
+        offset = self._part_starts[first]
+        return ''.join(self._parts[first:last])[start - offset:end - offset]
+
+    def _error(self, message, position):
+        raise JSONStreamError(message, position)
+
+    def _matches(self, path):
+        for pattern in self.paths:
+            if len(pattern) == len(path) and all(p == WILDCARD or p == q for p, q in zip(pattern, path)):
+                return True
+        return False
+
+    def _path(self):
+        return tuple(frame.key if frame.kind == '{' else frame.index for frame in self._stack)
+
+    def _value_done(self, start, end):
+        if self._stack:
+            if self.paths and self.on_item is not None:
+                path = self._path()
+                if self._matches(path):
+                    self.items += 1
+                    self.on_item(path, json.loads(self._text(start, end), strict=False))
+            self._stack[-1].state = COMMA_OR_END
+
+    def _start_value(self, char, position):
+        frame = self._stack[-1]
+        if frame.kind == '[':
+            frame.index += 1
+        if char == '{' or char == '[':
+            self._stack.append(_Frame(char, position))
+        elif char == '"':
+            self._in_string = True
+            self._string_is_key = False
+            self._value_start = position
+        elif char in LITERAL_START:
+            self._literal_start = position
+        else:
+            self._error(f"Expected a value, got {char!r}", position)
+
+    def _end_literal(self, end):
+        literal = self._text(self._literal_start, end)
+        if literal not in ('true', 'false', 'null') and not NUMBER.match(literal):
+            self._error(f"Invalid literal {literal!r}", self._literal_start)
+        start = self._literal_start
+        self._literal_start = None
+        self._value_done(start, end)
+
+    def feed(self, chunk):
+        offset = self._length
+        if chunk:
+            self._parts.append(chunk)
+            self._part_starts.append(offset)
+            self._length += len(chunk)
+        if self.complete:
+            return
+
+        i = 0
+        size = len(chunk)
+        while i < size:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    i += 1
+                    continue
+                match = STRING_STOP.search(chunk, i)
+                if match is None:
+                    break
+                i = match.start()
+                if chunk[i] == '\\':
+                    self._escaped = True
+                    i += 1
+                    continue
+                self._in_string = False
+                i += 1
+                end = offset + i
+                if self._string_is_key:
+                    frame = self._stack[-1]
+                    frame.key = json.loads(self._text(self._value_start, end), strict=False)
+                    frame.state = COLON
+                else:
+                    self._value_done(self._value_start, end)
+                continue
+
+            if self._literal_start is not None:
+                match = LITERAL_END.search(chunk, i)
+                if match is None:
+                    break
+                i = match.start()
+                self._end_literal(offset + i)
+
+            char = chunk[i]
+            position = offset + i
+            i += 1
+            if char in WHITESPACE:
+                continue
+
+            if not self._stack:
+                # Skip anything in front of the document
+                if char == '{' or char == '[':
+                    self._root_start = position
+                    self._stack.append(_Frame(char, position))
+                continue
+
+            frame = self._stack[-1]
+            state = frame.state
+            if state == VALUE or state == VALUE_OR_END:
+                if char == ']' and state == VALUE_OR_END:
+                    self._close(position)
+                else:
+                    self._start_value(char, position)
+            elif state == COMMA_OR_END:
+                if char == ',':
+                    frame.state = KEY if frame.kind == '{' else VALUE
+                elif (char == '}' and frame.kind == '{') or (char == ']' and frame.kind == '['):
+                    self._close(position)
+                else:
+                    closing = '}' if frame.kind == '{' else ']'
+                    self._error(f"Expected ',' or {closing!r}, got {char!r}", position)
+            elif state == KEY or state == KEY_OR_END:
+                if char == '"':
+                    self._in_string = True
+                    self._string_is_key = True
+                    self._value_start = position
+                elif char == '}' and state == KEY_OR_END:
+                    self._close(position)
+                else:
+                    self._error(f"Expected a key, got {char!r}", position)
+            elif state == COLON:
+                if char != ':':
+                    self._error(f"Expected ':', got {char!r}", position)
+                frame.state = VALUE
+
+            if self.complete:
+                return
+
+    def _close(self, position):
+        frame = self._stack.pop()
+        if self._stack:
+            self._value_done(frame.start, position + 1)
+        else:
+            self._root_end = position + 1
+            self.complete = True
+
+    def close(self):
+        """
+        Return the decoded document, or raise JSONStreamError if the stream
+        ended before the document did (e.g. the model hit max_tokens).
+        """
+        if not self.complete:
+            self._error("Stream ended inside the document" if self._stack else "No JSON document in the stream", self._length)
+        return json.loads(self._text(self._root_start, self._root_end), strict=False)
@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from dynamoJson import dumps, dumps_bytes
+from memoryCache import LRUCache
+
+logger = logging.getLogger()
+
+LLM_CACHE_TABLE = os.environ.get('LLM_CACHE_TABLE', 'LLMResponseCache')
+LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+LLM_CACHE_MEMORY_BYTES = int(os.environ.get('LLM_CACHE_MEMORY_BYTES', 16 * 1024 * 1024))
+# Larger results are not cached, keeps items well under DynamoDB's 400 KB limit
+LLM_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('LLM_CACHE_MAX_ENTRY_BYTES', 300 * 1024))
+# Bump when cached results must no longer be served, e.g. after a parser change
+LLM_CACHE_FORMAT = 1
+
+
+def cache_key(model_id, prompt, input_data, params):
+    """
+    Content address of a model call: the model id, the prompt template, the
+    input with its keys sorted and the sampling params. Key order and
+    whitespace in the input do not change the key.
+    """
+    material = dumps({
+        'format': LLM_CACHE_FORMAT,
+        'modelId': model_id,
+        'prompt': hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+        'input': input_data,
+        'params': params
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """
+    Warm-container backend. Values are kept serialized, so every hit hands
+    out a fresh copy the caller can mutate.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_bytes=LLM_CACHE_MEMORY_BYTES):
+        self.cache = LRUCache(max_bytes, name='llm-responses')
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        return json.loads(entry.value) if entry is not None else None
+
+    def put(self, key, value, serialized):
+        return self.cache.put(key, serialized, len(serialized))
+
+
+class DynamoBackend:
+    """
+    Cross-invocation backend. One item per key with the result stored as
+    gzip-compressed JSON and an expiresAt attribute for DynamoDB's TTL.
+    Expired items are ignored on read since TTL deletion is not immediate.
+    Errors are logged and treated as misses, the cache never fails a call.
+    """
+
+    name = 'dynamodb'
+
+    def __init__(self, dynamodb, table_name=LLM_CACHE_TABLE, ttl_seconds=LLM_CACHE_TTL_SECONDS):
+        self.table = dynamodb.Table(table_name)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        try:
+            item = self.table.get_item(Key={'id': key}).get('Item')
+            if not item or int(item.get('expiresAt', 0)) <= time.time():
+                return None
+            data = getattr(item['data'], 'value', item['data'])
+            return json.loads(gzip.decompress(data))
+        except Exception as e:
+            # A corrupt or truncated item is a miss, the call goes to the model and overwrites it
+            logger.error(f"Error reading LLM cache item {key}: {str(e)}")
+            return None
+
+    def put(self, key, value, serialized):
+        try:
+            data = dumps_bytes(value, compress=True)
+            if len(data) > LLM_CACHE_MAX_ENTRY_BYTES:
+                return False
+            self.table.put_item(Item={
+                'id': key,
+                'data': data,
+                'createdAt': int(time.time()),
+                'expiresAt': int(time.time()) + self.ttl_seconds
+            })
+            return True
+        except Exception as e:
+            logger.error(f"Error writing LLM cache item {key}: {str(e)}")
+            return False
+
+
+class LLMResponseCache:
+    """
+    Read-through cache for parsed model results over an ordered list of
+    backends, fastest first. A hit in a slower backend is copied into the
+    faster ones. Only JSON objects and arrays are stored, so a failed or
+    unparsed response is never served from the cache.
+    """
+
+    def __init__(self, backends, enabled=True, max_entry_bytes=LLM_CACHE_MAX_ENTRY_BYTES):
+        self.backends = list(backends)
+        self.enabled = enabled
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        self.hits = {backend.name: 0 for backend in self.backends}
+        self.misses = 0
+        self.puts = 0
+        self.oversized = 0
+        self.bypassed = 0
+
+    def _count(self, attribute):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def _count_hit(self, backend):
+        with self._lock:
+            self.hits[backend.name] += 1
+
+    def get(self, key, bypass=False):
+        if not self.enabled or bypass:
+            self._count('bypassed')
+            return None
+
+        for index, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is None:
+                continue
+            self._count_hit(backend)
+            if index > 0:
+                serialized = dumps(value)
+                for faster in self.backends[:index]:
+                    faster.put(key, value, serialized)
+            return value
+
+        self._count('misses')
+        return None
+
+    def put(self, key, value, bypass=False):
+        if not self.enabled or bypass or not isinstance(value, (dict, list)):
+            return False
+
+        serialized = dumps(value)
+        if len(serialized) > self.max_entry_bytes:
+            self._count('oversized')
+            return False
+
+        stored = [backend.put(key, value, serialized) for backend in self.backends]
+        if any(stored):
+            self._count('puts')
+        return any(stored)
+
+    def metrics(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+            return {
+                'hits': dict(self.hits),
+                'misses': self.misses,
+                'hitRate': round(hits / lookups, 3) if lookups else 0.0,
+                'puts': self.puts,
+                'oversized': self.oversized,
+                'bypassed': self.bypassed
+            }
+
+
+def default_llm_cache(dynamodb=None):
+    """
+    Memory backend, plus the DynamoDB table when a resource is given.
+    LLM_CACHE_ENABLED=false turns the cache off for the whole function.
+    """
+    backends = [MemoryBackend()]
+    if dynamodb is not None and LLM_CACHE_TABLE:
+        backends.append(DynamoBackend(dynamodb))
+    enabled = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    return LLMResponseCache(backends, enabled=enabled)
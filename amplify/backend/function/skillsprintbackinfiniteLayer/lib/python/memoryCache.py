@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    def __init__(self, value, size, version, expires_at):
+        self.value = value
+        self.size = size
+        self.version = version
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return self.expires_at is None or time.monotonic() < self.expires_at
+
+
+class LRUCache:
+    """
+    In-process cache for warm Lambda containers.
+
+    Entries are evicted least-recently-used first once the summed entry sizes
+    pass max_bytes. Sizes are whatever the caller passes to put, usually the
+    length of the serialized value, so the bound is approximate. Entries older
+    than ttl_seconds are still returned by get but marked stale, so the caller
+    can revalidate them (e.g. against a version attribute) instead of reloading.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds=None, name='cache'):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expiry(self):
+        return time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if entry.fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry
+
+    def put(self, key, value, size, version=None):
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+
+            self._entries[key] = CacheEntry(value, size, version, self._expiry())
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+        return True
+
+    def refresh(self, key):
+        """Restart the TTL of an entry that was revalidated."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = self._expiry()
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'hits': self.hits,
+                'staleHits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes
+            }
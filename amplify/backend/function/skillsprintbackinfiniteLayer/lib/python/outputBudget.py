@@ -0,0 +1,53 @@
+import math
+import os
+
+# Claude gives misformatted JSON once a response passes about 19000 characters
+OUTPUT_CHAR_BUDGET = int(os.environ.get('OUTPUT_CHAR_BUDGET', 18000))
+
+# Typical answer sizes, measured on generated roadmaps
+REQUEST_CHARS = 200
+TOPIC_CHARS = 150
+INFOBIT_CHARS = 650
+QUIZ_CHARS = 450
+# PROMPT_INFOBIT asks for 4-5 infobits per topic, one per outline point when there are more
+MIN_INFOBITS_PER_TOPIC = 5
+
+
+def estimate_infobit_topic(topic):
+    """Characters PROMPT_INFOBIT is expected to write for a skeleton topic."""
+    infobits = max(MIN_INFOBITS_PER_TOPIC, len(topic.get('topicOutline') or ()))
+    return TOPIC_CHARS + len(topic.get('topicName', '')) + infobits * INFOBIT_CHARS
+
+
+def estimate_quiz_topic(topic):
+    """Characters PROMPT_QUIZ is expected to write for a topic with infobits, one quiz per infobit."""
+    quizzes = len(topic.get('infoBits') or ()) or MIN_INFOBITS_PER_TOPIC
+    return TOPIC_CHARS + len(topic.get('topicName', '')) + quizzes * QUIZ_CHARS
+
+
+def split_by_budget(items, estimate, budget=None, overhead=REQUEST_CHARS):
+    """
+    Split items into consecutive groups whose estimated answers stay within
+    budget (OUTPUT_CHAR_BUDGET by default), as evenly as the item sizes allow
+    so the calls finish together.
+
+    Returns a list of (group, estimated chars). An item estimated over the
+    budget on its own still gets a group, it cannot be split further.
+    """
+    budget = budget or OUTPUT_CHAR_BUDGET
+    sizes = [estimate(item) for item in items]
+    total = overhead + sum(sizes)
+    if total <= budget or len(items) < 2:
+        return [(list(items), total)]
+
+    target = total / math.ceil(total / budget)
+    groups = []
+    group, size = [], overhead
+    for item, item_size in zip(items, sizes):
+        if group and (size + item_size > budget or size >= target):
+            groups.append((group, size))
+            group, size = [], overhead
+        group.append(item)
+        size += item_size
+    groups.append((group, size))
+    return groups
@@ -0,0 +1,121 @@
+import json
+import threading
+
+from dynamoJson import COMPACT_SEPARATORS, encode_dynamo_value
+
+# Rough average for English text and JSON, good enough to compare inputs
+CHARS_PER_TOKEN = 3.5
+# Keywords kept per topic in the final quiz digest
+DIGEST_KEYWORDS = 8
+
+# Fields each prompt's <INPUT> describes, nested specs apply to every item of a list
+SKELETON_FIELDS = {
+    'title': None, 'goal': None, 'currentSkillLevel': None, 'desiredSkillLevel': None,
+    'estimatedLearningDuration': None, 'dailyTime': None
+}
+INFOBIT_FIELDS = {
+    'title': None, 'description': None, 'goal': None, 'currentSkillLevel': None, 'desiredSkillLevel': None,
+    'phases': {'phaseDescription': None, 'topics': {'topicName': None, 'topicOutline': None}}
+}
+QUIZ_FIELDS = {
+    'title': None, 'goal': None, 'currentSkillLevel': None, 'desiredSkillLevel': None,
+    'estimatedLearningDuration': None, 'phaseDescription': None,
+    'topics': {'topicName': None, 'infoBits': {'text': None, 'keywords': None, 'example': None}}
+}
+DIGEST_FIELDS = {
+    'title': None, 'description': None, 'goal': None, 'currentSkillLevel': None, 'desiredSkillLevel': None,
+    'estimatedLearningDuration': None
+}
+
+
+def select_fields(value, spec):
+    """Copy of value with only the keys in spec, None in spec keeps the whole value."""
+    if spec is None:
+        return value
+    if isinstance(value, list):
+        return [select_fields(item, spec) for item in value]
+    if isinstance(value, dict):
+        return {key: select_fields(value[key], sub_spec) for key, sub_spec in spec.items() if key in value}
+    return value
+
+
+def roadmap_digest(roadmap):
+    """
+    What the final quiz needs from a generated roadmap: per phase its topics
+    with their main keywords and the questions already asked, instead of
+    every infobit, example and quiz option.
+    """
+    digest = select_fields(roadmap, DIGEST_FIELDS)
+    digest['phases'] = []
+    for number, phase in enumerate(roadmap['phases'], start=1):
+        topics = []
+        for topic in phase['topics']:
+            keywords = []
+            for infobit in topic.get('infoBits', []):
+                for keyword in infobit.get('keywords') or []:
+                    if keyword not in keywords:
+                        keywords.append(keyword)
+            topics.append({
+                'topicName': topic['topicName'],
+                'keywords': keywords[:DIGEST_KEYWORDS],
+                'quizzes': [infobit['quiz']['text'] for infobit in topic.get('infoBits', []) if 'quiz' in infobit]
+            })
+        digest['phases'].append({
+            'phaseNumber': phase.get('phaseNumber', number),
+            'phaseDescription': phase['phaseDescription'],
+            'topics': topics
+        })
+    return digest
+
+
+STAGE_INPUTS = {
+    'skeleton': lambda data: select_fields(data, SKELETON_FIELDS),
+    'infobit': lambda data: select_fields(data, INFOBIT_FIELDS),
+    'quiz': lambda data: select_fields(data, QUIZ_FIELDS),
+    'finalQuiz': roadmap_digest,
+}
+
+
+def compact_json(value):
+    # Non-ASCII text stays as is, \u escapes cost several tokens per character
+    return json.dumps(value, separators=COMPACT_SEPARATORS, ensure_ascii=False, default=encode_dynamo_value)
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN + 0.5)
+
+
+class PromptInputStats:
+    """Estimated input tokens per stage, as the input would have been sent before trimming and as it is sent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, tokens_before, tokens_after):
+        with self._lock:
+            counts = self._stages.setdefault(stage, {'calls': 0, 'tokensBefore': 0, 'tokensAfter': 0})
+            counts['calls'] += 1
+            counts['tokensBefore'] += tokens_before
+            counts['tokensAfter'] += tokens_after
+
+    def metrics(self):
+        with self._lock:
+            stages = {stage: dict(counts) for stage, counts in self._stages.items()}
+        for counts in stages.values():
+            before = counts['tokensBefore']
+            counts['saved'] = round(1 - counts['tokensAfter'] / before, 3) if before else 0.0
+        return stages
+
+
+def build_prompt_input(stage, input_data, stats=None):
+    """
+    Serialize a stage's input for the prompt: only the fields the stage's
+    prompt reads, as compact JSON. Unknown stages keep the whole input.
+    The estimate before is for the Python repr the prompts used to embed.
+    """
+    select = STAGE_INPUTS.get(stage)
+    text = compact_json(select(input_data) if select is not None else input_data)
+    if stats is not None:
+        stats.record(stage, estimate_tokens(str(input_data)), estimate_tokens(text))
+    return text
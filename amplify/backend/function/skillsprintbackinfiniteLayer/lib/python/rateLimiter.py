@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Outcomes remembered for the observed throttle rate
+OUTCOME_WINDOW = 50
+
+
+class LimiterCancelled(Exception):
+    pass
+
+
+class AdaptiveRateLimiter:
+    """
+    Client-side token bucket whose rate adapts to throttling (AIMD).
+
+    Every call takes a token and an in-flight slot. Each success raises the
+    rate by increase (by a quarter of that once it is within 10% of the rate
+    that was last throttled), and each throttle multiplies it by decrease and
+    empties the bucket, so the next calls are spaced at the new rate. Against
+    a fixed quota halving the rate idles half of it while the rate climbs
+    back, hence the gentler default decrease.
+    Callers on any number of threads share one limiter; share one per process
+    to pace all calls against the same quota.
+    """
+
+    def __init__(self, rate, max_rate, min_rate=0.05, burst=1, max_in_flight=4,
+                 increase=0.2, decrease=0.85, name='limiter'):
+        self.rate = float(rate)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.increase = increase
+        self.decrease = decrease
+        self.name = name
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._queued = 0
+        self._throttled_rate = None
+        self._outcomes = deque(maxlen=OUTCOME_WINDOW)
+        self.calls = 0
+        self.throttles = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self, cancelled=None):
+        """
+        Block until a token and an in-flight slot are free.
+        Raises LimiterCancelled if the cancelled event is set while waiting.
+        """
+        start_time = time.monotonic()
+        with self._cond:
+            self._queued += 1
+            try:
+                while True:
+                    if cancelled is not None and cancelled.is_set():
+                        raise LimiterCancelled(f"Cancelled while waiting for {self.name}")
+                    self._refill()
+                    if self._tokens >= 1 and self._in_flight < self.max_in_flight:
+                        self._tokens -= 1
+                        self._in_flight += 1
+                        self.calls += 1
+                        self.wait_seconds += time.monotonic() - start_time
+                        return
+
+                    # Wake for the next token, a released slot, or to check cancellation
+                    timeout = 1.0
+                    if self._tokens < 1:
+                        timeout = min(timeout, (1 - self._tokens) / self.rate)
+                    self._cond.wait(timeout)
+            finally:
+                self._queued -= 1
+
+    def release(self, throttled=False, succeeded=True):
+        """
+        Return the in-flight slot. A throttled call lowers the rate, a
+        successful one raises it; other failures leave it as it is.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                self._outcomes.append(True)
+                self._throttled_rate = self.rate
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._refill()
+                self._tokens = 0.0
+            elif succeeded:
+                self._outcomes.append(False)
+                step = self.increase
+                if self._throttled_rate is not None and self.rate >= 0.9 * self._throttled_rate:
+                    step /= 4
+                self.rate = min(self.max_rate, self.rate + step)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, cancelled=None):
+        """
+        with limiter.slot() as call: ... call.throttled() on a throttling error.
+        Any other exception releases the slot without changing the rate.
+        """
+        self.acquire(cancelled)
+        call = _Call()
+        try:
+            yield call
+        except BaseException:
+            self.release(throttled=call.was_throttled, succeeded=False)
+            raise
+        self.release(throttled=call.was_throttled)
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'name': self.name,
+                'rate': round(self.rate, 3),
+                'inFlight': self._in_flight,
+                'queued': self._queued,
+                'calls': self.calls,
+                'throttles': self.throttles,
+                'throttleRate': round(sum(self._outcomes) / len(self._outcomes), 3) if self._outcomes else 0.0,
+                'waitSeconds': round(self.wait_seconds, 3)
+            }
+
+
+class _Call:
+    def __init__(self):
+        self.was_throttled = False
+
+    def throttled(self):
+        self.was_throttled = True
@@ -0,0 +1,210 @@
+import hashlib
+import logging
+import re
+import time
+
+from botocore.exceptions import ClientError
+
+from dynamoJson import dumps
+from roadmapStore import roadmap_version
+
+logger = logging.getLogger()
+
+FINGERPRINT_TABLE = 'RoadmapFingerprints'
+# Bump when generation changes enough that older roadmaps should not be reused
+# 2: decimals and halves in durations, '1.5 hours' was read as 5 hours
+FINGERPRINT_FORMAT = 2
+
+SKILL_LEVELS = {
+    'beginner': ('beginner', 'novice', 'none', 'no experience', 'basic', 'newbie', 'starter', 'zero', 'entry'),
+    'intermediate': ('intermediate', 'medium', 'moderate', 'some experience', 'mid'),
+    'advanced': ('advanced', 'expert', 'proficient', 'professional', 'master', 'senior'),
+}
+DAYS_PER_UNIT = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+MINUTES_PER_UNIT = {'minute': 1, 'min': 1, 'hour': 60, 'hr': 60, 'h': 60}
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'twelve': 12
+}
+
+
+def normalize_text(value):
+    # Keeps '+' and '#' so C++ and C# stay apart from C
+    text = re.sub(r'[^a-z0-9+#]+', ' ', str(value).lower())
+    return ' '.join(text.split())
+
+
+def normalize_skill_level(value):
+    text = normalize_text(value)
+    for level, synonyms in SKILL_LEVELS.items():
+        if any(re.search(rf'\b{re.escape(synonym)}\b', text) for synonym in synonyms):
+            return level
+    return text
+
+
+def _amounts(value, units):
+    """
+    Sum every amount of a unit in the text, e.g. '1 hour 30 min' -> 90 with
+    minute units. Reads decimals and halves: '1.5 hours', 'half an hour',
+    'an hour and a half' and '2 and a half months'. Works on the lowercased
+    text with its punctuation, normalize_text would turn '1.5' into '1 5'.
+    """
+    text = str(value).lower()
+    number = rf'\d+(?:\.\d+)?|\.\d+|{"|".join(NUMBER_WORDS)}'
+    unit = '|'.join(sorted(units, key=len, reverse=True))
+    pattern = (
+        rf'(?<![a-z0-9.])(?:(?P<number>{number})\s*(?P<and_half>and\s+a\s+half\s+)?|half\s+(?:an?\s+)?)'
+        rf'(?P<unit>{unit})s?\b(?P<half_after>\s+and\s+a\s+half\b)?'
+    )
+    total = 0
+    found = False
+    for match in re.finditer(pattern, text):
+        amount = match.group('number')
+        if amount is None:
+            amount = 0.5
+        elif amount[0].isdigit() or amount[0] == '.':
+            amount = float(amount)
+        else:
+            amount = NUMBER_WORDS[amount]
+        if match.group('and_half') or match.group('half_after'):
+            amount += 0.5
+        total += amount * units[match.group('unit')]
+        found = True
+    return total if found else None
+
+
+def normalize_duration(value):
+    days = _amounts(value, DAYS_PER_UNIT)
+    return f"{round(days)}d" if days is not None else normalize_text(value)
+
+
+def normalize_daily_time(value):
+    minutes = _amounts(value, MINUTES_PER_UNIT)
+    return f"{round(minutes)}m" if minutes is not None else normalize_text(value)
+
+
+NORMALIZERS = {
+    'currentSkillLevel': normalize_skill_level,
+    'desiredSkillLevel': normalize_skill_level,
+    'estimatedLearningDuration': normalize_duration,
+    'dailyTime': normalize_daily_time,
+}
+
+
+def canonical_request(input_data):
+    """
+    The generation request reduced to what changes the roadmap: skill levels
+    to beginner/intermediate/advanced, durations to days, daily time to
+    minutes and everything else, title and goal included, to lowercase words.
+    Unknown fields still reach the prompt, so they are kept too.
+    """
+    canonical = {}
+    for field, value in input_data.items():
+        if value is None or value == '':
+            continue
+        normalize = NORMALIZERS.get(field, normalize_text)
+        canonical[field] = normalize(value) if not isinstance(value, (dict, list)) else value
+    return canonical
+
+
+def request_fingerprint(input_data):
+    material = dumps({'format': FINGERPRINT_FORMAT, 'request': canonical_request(input_data)}, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def find_roadmap(dynamodb, fingerprint, counter=None):
+    """
+    Id of a stored roadmap generated for an equivalent request, or None.
+
+    A roadmap only matches while it is at the version it was indexed with,
+    one that was deleted or edited since is not handed to other users and
+    its index entry is dropped.
+    """
+    table = dynamodb.Table(FINGERPRINT_TABLE)
+    entry = table.get_item(Key={'id': fingerprint}).get('Item')
+    if counter is not None:
+        counter.add('GetItem')
+    if not entry:
+        return None
+
+    roadmap_id = entry['roadmapId']
+    version = roadmap_version(dynamodb, roadmap_id, counter)
+    if version is not None and version == int(entry.get('version', 1)):
+        return roadmap_id
+
+    logger.warning(f"Fingerprint {fingerprint} points to roadmap {roadmap_id} at version {version}, dropping it")
+    unindex_roadmap(dynamodb, fingerprint, roadmap_id)
+    return None
+
+
+def index_roadmap(dynamodb, fingerprint, roadmap_id, version=1):
+    """
+    Offer the roadmap to later equivalent requests. The fingerprint is also
+    kept on the Roadmaps row, so editing or deleting it can withdraw the offer.
+    """
+    try:
+        dynamodb.Table(FINGERPRINT_TABLE).put_item(
+            Item={
+                'id': fingerprint,
+                'roadmapId': roadmap_id,
+                'version': version,
+                'createdAt': int(time.time())
+            }
+        )
+        dynamodb.Table('Roadmaps').update_item(
+            Key={'id': roadmap_id},
+            UpdateExpression='SET fingerprint = :fingerprint',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={':fingerprint': fingerprint}
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Error indexing roadmap {roadmap_id} by fingerprint: {str(e)}")
+        return False
+
+
+def unindex_roadmap(dynamodb, fingerprint, roadmap_id):
+    """Stop reusing the roadmap, unless the fingerprint already points to another one."""
+    try:
+        dynamodb.Table(FINGERPRINT_TABLE).delete_item(
+            Key={'id': fingerprint},
+            ConditionExpression='roadmapId = :roadmapId',
+            ExpressionAttributeValues={':roadmapId': roadmap_id}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.warning(f"Fingerprint {fingerprint} was not dropped: {str(e)}")
+    except Exception as e:
+        logger.warning(f"Fingerprint {fingerprint} was not dropped: {str(e)}")
+
+
+def share_roadmap(dynamodb, roadmap_id):
+    """
+    Count one more user linked to a reused roadmap. reuseCount is the number
+    of users beyond the first, a roadmap is only edited or deleted at zero.
+    """
+    dynamodb.Table('Roadmaps').update_item(
+        Key={'id': roadmap_id},
+        UpdateExpression='ADD reuseCount :one',
+        ConditionExpression='attribute_exists(id)',
+        ExpressionAttributeValues={':one': 1}
+    )
+
+
+def unshare_roadmap(dynamodb, roadmap_id):
+    """Count one user less after a user roadmap link is deleted."""
+    try:
+        dynamodb.Table('Roadmaps').update_item(
+            Key={'id': roadmap_id},
+            UpdateExpression='ADD reuseCount :minusOne',
+            ConditionExpression='reuseCount > :zero',
+            ExpressionAttributeValues={':minusOne': -1, ':zero': 0}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def roadmap_shared(roadmap):
+    """Whether a Roadmaps row is linked to more than one user."""
+    return int(roadmap.get('reuseCount', 0)) > 0
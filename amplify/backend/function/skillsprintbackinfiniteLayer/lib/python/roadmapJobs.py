@@ -0,0 +1,189 @@
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from dynamoJson import dumps_bytes
+from roadmapSnapshot import binary_value
+
+logger = logging.getLogger()
+
+JOB_TABLE = 'RoadmapJobs'
+CHECKPOINT_TABLE = 'RoadmapJobCheckpoints'
+# Jobs and their checkpoints expire through the tables' TTL on expiresAt
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 7 * 24 * 3600))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FAILED = 'failed'
+DONE = 'done'
+# Request fields that steer generation and are not part of the roadmap request
+REQUEST_OPTIONS = ("userId", "bypassCache", "freshRoadmap", "jobId")
+# What GET /jobs/{id} returns, the request and owner stay out of it
+STATUS_FIELDS = ('id', 'status', 'progress', 'lastStage', 'currentPhase', 'phaseCount', 'roadmapId', 'error',
+                 'createdAt', 'updatedAt')
+
+
+def new_job_id():
+    return str(uuid.uuid4())
+
+
+def roadmap_request(data):
+    """The roadmap request in data, without REQUEST_OPTIONS. Its fingerprint identifies the job."""
+    return {key: value for key, value in data.items() if key not in REQUEST_OPTIONS}
+
+
+def open_job_key(user_id, fingerprint):
+    # Points a user's request at its unfinished job, so a retry resumes it
+    return f"open#{user_id}#{fingerprint}"
+
+
+def create_job(dynamodb, job_id, user_id, request, fingerprint):
+    """Store a queued job for request, the generation request with its options."""
+    now = int(time.time())
+    table = dynamodb.Table(JOB_TABLE)
+    table.put_item(Item={
+        'id': job_id,
+        'userId': user_id,
+        'status': QUEUED,
+        'request': json.dumps(request),
+        'fingerprint': fingerprint,
+        'runs': 0,
+        'progress': 0,
+        'createdAt': now,
+        'updatedAt': now,
+        'expiresAt': now + JOB_TTL_SECONDS
+    })
+    table.put_item(Item={
+        'id': open_job_key(user_id, fingerprint),
+        'jobId': job_id,
+        'expiresAt': now + JOB_TTL_SECONDS
+    })
+
+
+def get_job(dynamodb, job_id):
+    """The job with its request decoded, or None."""
+    job = dynamodb.Table(JOB_TABLE).get_item(Key={'id': job_id}).get('Item')
+    if not job or 'request' not in job:
+        return None
+    job['request'] = json.loads(job['request'])
+    return job
+
+
+def find_failed_job(dynamodb, user_id, fingerprint):
+    """The user's failed job for an equivalent request, which a retry should resume, or None."""
+    pointer = dynamodb.Table(JOB_TABLE).get_item(Key={'id': open_job_key(user_id, fingerprint)}).get('Item')
+    if not pointer:
+        return None
+    job = get_job(dynamodb, pointer['jobId'])
+    if job is None or job['status'] != FAILED:
+        return None
+    return job
+
+
+def update_job(dynamodb, job_id, **fields):
+    """Set fields on the job record, along with updatedAt."""
+    fields['updatedAt'] = int(time.time())
+    names = {f'#{name}': name for name in fields}
+    values = {f':{name}': value for name, value in fields.items()}
+    dynamodb.Table(JOB_TABLE).update_item(
+        Key={'id': job_id},
+        UpdateExpression='SET ' + ', '.join(f'#{name} = :{name}' for name in fields),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+def start_run(dynamodb, job_id):
+    """Mark the job running and return how many runs it has had, this one included."""
+    response = dynamodb.Table(JOB_TABLE).update_item(
+        Key={'id': job_id},
+        UpdateExpression='SET #status = :status, #updatedAt = :now, #runs = if_not_exists(#runs, :zero) + :one '
+                         'REMOVE #error',
+        ExpressionAttributeNames={'#status': 'status', '#updatedAt': 'updatedAt', '#runs': 'runs', '#error': 'error'},
+        ExpressionAttributeValues={':status': RUNNING, ':now': int(time.time()), ':zero': 0, ':one': 1},
+        ReturnValues='UPDATED_NEW'
+    )
+    return int(response['Attributes']['runs'])
+
+
+def report_progress(dynamodb, job_id, progress, **fields):
+    """
+    Record how far the job has got, e.g. lastStage and currentPhase. Stages
+    finish on several threads, so an update never lowers progress. Progress
+    is only informational: errors are logged, not raised.
+    """
+    fields['progress'] = progress
+    fields['updatedAt'] = int(time.time())
+    try:
+        dynamodb.Table(JOB_TABLE).update_item(
+            Key={'id': job_id},
+            UpdateExpression='SET ' + ', '.join(f'#{name} = :{name}' for name in fields),
+            ConditionExpression='attribute_not_exists(#progress) OR #progress <= :progress',
+            ExpressionAttributeNames={f'#{name}': name for name in fields},
+            ExpressionAttributeValues={f':{name}': value for name, value in fields.items()}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.error(f"Error: While reporting progress of job {job_id}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error: While reporting progress of job {job_id}: {str(e)}")
+
+
+def read_job_status(dynamodb, job_id):
+    """The job's status fields alone, one small GetItem for pollers. None if there is no such job."""
+    job = dynamodb.Table(JOB_TABLE).get_item(
+        Key={'id': job_id},
+        ProjectionExpression=', '.join(f'#{name}' for name in STATUS_FIELDS),
+        ExpressionAttributeNames={f'#{name}': name for name in STATUS_FIELDS}
+    ).get('Item')
+    if not job or 'status' not in job:
+        return None
+    job['jobId'] = job.pop('id')
+    return job
+
+
+def finish_job(dynamodb, job, roadmap_id):
+    update_job(dynamodb, job['id'], status=DONE, roadmapId=roadmap_id, progress=100)
+    try:
+        dynamodb.Table(JOB_TABLE).delete_item(Key={'id': open_job_key(job['userId'], job['fingerprint'])})
+    except Exception as e:
+        logger.error(f"Error: While closing job {job['id']}: {str(e)}")
+
+
+def load_checkpoints(dynamodb, job_id):
+    """{stage: output} of every stage the job has finished so far."""
+    table = dynamodb.Table(CHECKPOINT_TABLE)
+    checkpoints = {}
+    query = {'KeyConditionExpression': Key('jobId').eq(job_id)}
+    while True:
+        response = table.query(**query)
+        for item in response['Items']:
+            checkpoints[item['stage']] = json.loads(gzip.decompress(binary_value(item['data'])))
+        if 'LastEvaluatedKey' not in response:
+            return checkpoints
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def save_checkpoint(dynamodb, job_id, stage, output):
+    """
+    Store a finished stage's output as gzip-compressed JSON. A failed write
+    only means the stage is run again on resume, so it is logged and
+    reported by returning False instead of raising.
+    """
+    try:
+        dynamodb.Table(CHECKPOINT_TABLE).put_item(Item={
+            'jobId': job_id,
+            'stage': stage,
+            'data': dumps_bytes(output, compress=True),
+            'expiresAt': int(time.time()) + JOB_TTL_SECONDS
+        })
+        return True
+    except Exception as e:
+        logger.error(f"Error: While saving checkpoint {stage} of job {job_id}: {str(e)}")
+        return False
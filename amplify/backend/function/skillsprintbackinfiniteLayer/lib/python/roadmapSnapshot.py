@@ -0,0 +1,214 @@
+import gzip
+import json
+import logging
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+from dynamoBatch import batch_get, batch_write, delete_request, get_items, put_request
+from dynamoJson import dumps_bytes
+from roadmapStore import PHASE_GENERATING, read_roadmap, roadmap_document
+
+logger = logging.getLogger()
+
+SNAPSHOT_TABLE = 'RoadmapSnapshots'
+# Bump when the assembled roadmap document changes shape, older snapshots are then ignored
+SNAPSHOT_FORMAT = 1
+# Leaves headroom under DynamoDB's 400 KB item limit for the key and other attributes
+SNAPSHOT_CHUNK_BYTES = 350 * 1024
+
+
+def chunk_key(roadmap_id, version, index):
+    return f"{roadmap_id}#v{version}#{index}"
+
+
+def binary_value(data):
+    # boto3 returns binary attributes wrapped in a Binary object
+    return getattr(data, 'value', data)
+
+
+def write_roadmap_snapshot(dynamodb, roadmap_id, roadmap, version, counter=None, only_if_newer=False):
+    """
+    Store the assembled roadmap as one gzip-compressed JSON document.
+
+    The head item is keyed by the roadmap id. Documents larger than
+    SNAPSHOT_CHUNK_BYTES are split, the head keeps the first chunk and the
+    rest are stored in order under '<roadmap id>#v<version>#<n>'.
+
+    only_if_newer keeps a stored snapshot of the same or a later version,
+    for reads that rebuild a snapshot and may race each other or a write.
+
+    The normalized tables stay the source of truth, so a failed snapshot
+    write is logged and reported by returning False instead of raising,
+    as is a snapshot kept by only_if_newer.
+    """
+    try:
+        document = roadmap_document(roadmap_id, roadmap)
+        compressed = dumps_bytes(document, compress=True, compresslevel=9)
+        chunks = [
+            compressed[i:i + SNAPSHOT_CHUNK_BYTES]
+            for i in range(0, len(compressed), SNAPSHOT_CHUNK_BYTES)
+        ]
+
+        # Extra chunks go first so the head never points at missing data
+        if len(chunks) > 1:
+            batch_write(dynamodb, {
+                SNAPSHOT_TABLE: [
+                    put_request({'id': chunk_key(roadmap_id, version, index), 'data': chunk})
+                    for index, chunk in enumerate(chunks[1:], start=1)
+                ]
+            }, counter)
+
+        condition = {}
+        if only_if_newer:
+            condition = {
+                'ConditionExpression': 'attribute_not_exists(id) OR #version < :version OR #format <> :format',
+                'ExpressionAttributeNames': {'#version': 'version', '#format': 'format'},
+                'ExpressionAttributeValues': {':version': version, ':format': SNAPSHOT_FORMAT}
+            }
+        try:
+            old = dynamodb.Table(SNAPSHOT_TABLE).put_item(
+                Item={
+                    'id': roadmap_id,
+                    'version': version,
+                    'format': SNAPSHOT_FORMAT,
+                    'chunkCount': len(chunks),
+                    'data': chunks[0]
+                },
+                ReturnValues='ALL_OLD',
+                **condition
+            ).get('Attributes')
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            logger.info(f"Snapshot for roadmap {roadmap_id} is already v{version} or later, kept it")
+            discard_snapshot_chunks(dynamodb, roadmap_id, version, len(chunks), counter)
+            return False
+        finally:
+            if counter is not None:
+                counter.add('PutItem')
+        # The replaced head's chunks are unreachable now, unless they were just rewritten
+        if old and int(old['version']) != version:
+            delete_snapshot_chunks(dynamodb, roadmap_id, old, counter)
+
+        logger.info(f"Snapshot for roadmap {roadmap_id} v{version} written: {len(compressed)} bytes in {len(chunks)} chunk(s)")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error writing snapshot for roadmap {roadmap_id}: {str(e)}")
+        return False
+
+
+def read_roadmap_snapshot(dynamodb, roadmap_id, counter=None):
+    """
+    Return (document, version) from the roadmap's snapshot, or (None, None) when
+    there is no usable snapshot and the caller should assemble it from the
+    normalized tables. A snapshot is only used while it has the version in
+    the Roadmaps table, writes that skipped it or raced it leave it stale.
+    The head and the roadmap's version are read in one BatchGetItem.
+    """
+    found = get_items(dynamodb, {
+        SNAPSHOT_TABLE: {'Keys': [{'id': roadmap_id}]},
+        'Roadmaps': {
+            'Keys': [{'id': roadmap_id}],
+            'ProjectionExpression': 'id, #version',
+            'ExpressionAttributeNames': {'#version': 'version'}
+        }
+    }, counter)
+    head = found[SNAPSHOT_TABLE][0] if found[SNAPSHOT_TABLE] else None
+    if not head or int(head.get('format', 0)) != SNAPSHOT_FORMAT:
+        return None, None
+
+    version = int(head['version'])
+    current_version = int(found['Roadmaps'][0].get('version', 0)) if found['Roadmaps'] else None
+    if current_version != version:
+        logger.warning(f"Snapshot for roadmap {roadmap_id} is v{version}, the roadmap is v{current_version}, falling back")
+        return None, None
+    chunk_count = int(head['chunkCount'])
+    chunks = [binary_value(head['data'])]
+
+    if chunk_count > 1:
+        rest = {
+            item['id']: binary_value(item['data'])
+            for item in batch_get(
+                dynamodb, SNAPSHOT_TABLE,
+                [{'id': chunk_key(roadmap_id, version, index)} for index in range(1, chunk_count)],
+                counter
+            )
+        }
+        try:
+            chunks.extend(rest[chunk_key(roadmap_id, version, index)] for index in range(1, chunk_count))
+        except KeyError:
+            logger.warning(f"Snapshot for roadmap {roadmap_id} v{version} is missing chunks, falling back")
+            return None, None
+
+    # Numbers are decoded as Decimal, exactly as DynamoDB returns them
+    document = json.loads(
+        gzip.decompress(b''.join(chunks)),
+        parse_int=Decimal,
+        parse_float=Decimal
+    )
+    return document, version
+
+
+def load_roadmap_document(dynamodb, roadmap_id, counter=None):
+    """
+    Return (document, version) from the snapshot, or assembled from the
+    normalized tables when the snapshot is missing or stale, (None, None)
+    if the roadmap does not exist. An assembled roadmap gets a new snapshot,
+    unless it is still being generated and its phases keep changing, or
+    another read or a write has stored this version or a later one since.
+    """
+    document, version = read_roadmap_snapshot(dynamodb, roadmap_id, counter)
+    if document:
+        return document, version
+
+    document, version = read_roadmap(dynamodb, roadmap_id, counter)
+    if document and not any(phase.get('status') == PHASE_GENERATING for phase in document['phases']):
+        write_roadmap_snapshot(dynamodb, roadmap_id, document, version, counter, only_if_newer=True)
+    return document, version
+
+
+def delete_roadmap_snapshot(dynamodb, roadmap_id, counter=None):
+    """
+    Remove a roadmap's snapshot so reads fall back to the normalized tables.
+    Called before the normalized rows are changed.
+    """
+    old = dynamodb.Table(SNAPSHOT_TABLE).delete_item(
+        Key={'id': roadmap_id},
+        ReturnValues='ALL_OLD'
+    ).get('Attributes')
+    if counter is not None:
+        counter.add('DeleteItem')
+    if old:
+        delete_snapshot_chunks(dynamodb, roadmap_id, old, counter)
+
+
+def delete_snapshot_chunks(dynamodb, roadmap_id, head, counter=None):
+    """Delete the chunks stored beside a snapshot head that was removed or replaced."""
+    if int(head.get('chunkCount', 1)) > 1:
+        version = int(head['version'])
+        batch_write(dynamodb, {
+            SNAPSHOT_TABLE: [
+                delete_request({'id': chunk_key(roadmap_id, version, index)})
+                for index in range(1, int(head['chunkCount']))
+            ]
+        }, counter)
+
+
+def discard_snapshot_chunks(dynamodb, roadmap_id, version, chunk_count, counter=None):
+    """
+    Delete the chunks written for a snapshot head that was then not stored,
+    unless the stored head is the same version and uses them.
+    """
+    if chunk_count <= 1:
+        return
+    head = dynamodb.Table(SNAPSHOT_TABLE).get_item(
+        Key={'id': roadmap_id},
+        ProjectionExpression='#version',
+        ExpressionAttributeNames={'#version': 'version'}
+    ).get('Item')
+    if counter is not None:
+        counter.add('GetItem')
+    if not head or int(head['version']) != version:
+        delete_snapshot_chunks(dynamodb, roadmap_id, {'version': version, 'chunkCount': chunk_count}, counter)
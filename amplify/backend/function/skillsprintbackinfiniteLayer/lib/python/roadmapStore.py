@@ -0,0 +1,571 @@
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from dynamoBatch import batch_get, batch_write, delete_request, put_request, query_all, run_parallel
+
+ROADMAP_TABLES = ('Roadmaps', 'Phases', 'Topics', 'InfoBits', 'Quizzes')
+# Optional parts of the roadmap document, all of them are included unless a view asks for fewer
+DETAIL_FIELDS = ('searchResult', 'infoBits', 'quiz', 'answer')
+# Primary key attributes of each child table, used to match rows when diffing
+ROW_KEYS = {
+    'Phases': ('roadmapId', 'phaseId'),
+    'Topics': ('phaseId', 'topicId'),
+    'InfoBits': ('topicId', 'infoBitId'),
+    'Quizzes': ('infoBitId',)
+}
+TOPIC_OUTLINE_PROJECTION = 'phaseId, topicId, topicName, topicNumber, infobitCount'
+# Status of a phase, and of the Roadmaps row, while a roadmap is persisted phase by phase; without one they are ready
+PHASE_GENERATING = 'generating'
+PHASE_READY = 'ready'
+# Status of the Roadmaps row once its generation job has failed, until a retry resumes it
+ROADMAP_FAILED = 'failed'
+
+
+def phase_key(roadmap_id, phase_number):
+    return f"{roadmap_id}#PHASE#{phase_number}"
+
+
+def topic_key(phase_id, topic_number):
+    return f"{phase_id}#TOPIC#{topic_number}"
+
+
+def infobit_key(topic_id, infobit_number):
+    return f"{topic_id}#INFOBIT#{infobit_number}"
+
+
+def roadmap_row(roadmap_id, roadmap, version=1):
+    row = {
+        'id': roadmap_id,
+        'version': version,
+        'title': roadmap['title'],
+        'description': roadmap['description'],
+        'imageURL': roadmap['imageURL'],
+        'estimatedLearningDuration': roadmap['estimatedLearningDuration'],
+        'goal': roadmap['goal'],
+        'currentSkillLevel': roadmap['currentSkillLevel'],
+        'desiredSkillLevel': roadmap['desiredSkillLevel'],
+        'dailyTime': roadmap['dailyTime'],
+        'phaseCount': roadmap['phaseCount'],
+        'totalLessons': roadmap['totalLessons']
+    }
+    # Only set while the roadmap is generated phase by phase, saving the finished one drops it
+    if roadmap.get('status'):
+        row['status'] = roadmap['status']
+    return row
+
+
+def roadmap_child_rows(roadmap_id, roadmap, first_phase=1):
+    """
+    Flatten a roadmap tree into the Phases, Topics, InfoBits and Quizzes rows it is stored as.
+    The phases are numbered from first_phase.
+    """
+    rows = {table_name: [] for table_name in ROADMAP_TABLES[1:]}
+
+    for phase_index, phase in enumerate(roadmap['phases']):
+        phase_id = phase_key(roadmap_id, phase_index + first_phase)
+        phase_row = {
+            'roadmapId': roadmap_id,
+            'phaseNumber': phase_index + first_phase,
+            'phaseId': phase_id,
+            'phaseDescription': phase['phaseDescription'],
+            'topicCount': phase['topicCount']
+        }
+        if 'status' in phase:
+            phase_row['status'] = phase['status']
+        rows['Phases'].append(phase_row)
+
+        for topic_index, topic in enumerate(phase['topics']):
+            topic_id = topic_key(phase_id, topic_index + 1)
+            rows['Topics'].append({
+                'phaseId': phase_id,
+                'topicNumber': int(topic['topicNumber']),
+                'topicId': topic_id,
+                'topicName': topic['topicName'],
+                'searchResult': topic['searchResult'],
+                'infobitCount': topic['infobitCount']
+            })
+
+            for infobit_index, infobit in enumerate(topic['infoBits']):
+                infobit_id = infobit_key(topic_id, infobit_index + 1)
+                rows['InfoBits'].append({
+                    'topicId': topic_id,
+                    'infoBitNumber': infobit_index + 1,
+                    'infoBitId': infobit_id,
+                    'text': infobit['text'],
+                    'keywords': infobit['keywords'],
+                    'example': infobit.get('example', "")
+                })
+
+                quiz = infobit['quiz']
+                rows['Quizzes'].append({
+                    'infoBitId': infobit_id,
+                    'quizNumber': infobit_index + 1,
+                    'text': quiz['text'],
+                    'type': quiz['type'],
+                    'options': quiz.get('options', ''),
+                    'answer': quiz['answer']
+                })
+
+    return rows
+
+
+def assemble_roadmap(roadmap, phases, topics_by_phase, infobits_by_topic, quizzes, fields=DETAIL_FIELDS, outline=False):
+    """
+    Build the roadmap document served by the API from its stored rows.
+    Children are expected in sort-key order, quizzes are keyed by infoBitId.
+    Only the DETAIL_FIELDS listed in fields are included; an outline stops at the phases.
+    """
+    original_object = {
+        'id' : roadmap['id'],
+        'title': roadmap['title'],
+        'description': roadmap['description'],
+        'imageURL': roadmap['imageURL'],
+        'estimatedLearningDuration': roadmap['estimatedLearningDuration'],
+        'goal': roadmap['goal'],
+        'currentSkillLevel': roadmap['currentSkillLevel'],
+        'desiredSkillLevel': roadmap['desiredSkillLevel'],
+        'dailyTime': roadmap['dailyTime'],
+        'phaseCount': roadmap['phaseCount'],
+        'totalLessons': roadmap['totalLessons'],
+        'phases': []
+    }
+    if roadmap.get('status'):
+        original_object['status'] = roadmap['status']
+
+    for phase in phases:
+        phase_object = {
+            'phaseDescription': phase['phaseDescription'],
+            'topicCount' : phase['topicCount'],
+            'phaseNumber' : phase['phaseNumber']
+        }
+        if 'status' in phase:
+            phase_object['status'] = phase['status']
+        original_object['phases'].append(phase_object)
+        if outline:
+            continue
+
+        phase_object['topics'] = []
+        for topic in topics_by_phase.get(phase['phaseId'], []):
+            topic_object = {'topicName': topic['topicName']}
+            if 'searchResult' in fields:
+                topic_object['searchResult'] = topic['searchResult']
+            topic_object['topicNumber'] = topic['topicNumber']
+            topic_object['infobitCount'] = topic['infobitCount']
+            phase_object['topics'].append(topic_object)
+            if 'infoBits' not in fields:
+                continue
+
+            topic_object['infoBits'] = []
+            for infobit in infobits_by_topic.get(topic['topicId'], []):
+                infobit_object = {
+                    'infoBitId': infobit['infoBitId'],
+                    'text': infobit['text'],
+                    'keywords': infobit['keywords'],
+                    'example': infobit.get('example', '')
+                }
+                if 'quiz' in fields:
+                    quiz = quizzes[infobit['infoBitId']]
+                    infobit_object['quiz'] = {
+                        'text': quiz['text'],
+                        'type': quiz['type'],
+                        'options': quiz.get('options', [])
+                    }
+                    if 'answer' in fields:
+                        infobit_object['quiz']['answer'] = quiz['answer']
+                topic_object['infoBits'].append(infobit_object)
+
+    return original_object
+
+
+def project_roadmap(document, fields=DETAIL_FIELDS, phase_number=None, outline=False):
+    """
+    Apply a view to an already assembled document, e.g. one from the cache.
+    Returns new objects down to the quizzes, the input is left untouched.
+    """
+    def project_infobit(infobit):
+        infobit_object = {key: value for key, value in infobit.items() if key != 'quiz'}
+        if 'quiz' in fields:
+            infobit_object['quiz'] = {
+                key: value for key, value in infobit['quiz'].items()
+                if key != 'answer' or 'answer' in fields
+            }
+        return infobit_object
+
+    def project_topic(topic):
+        topic_object = {
+            key: value for key, value in topic.items()
+            if key != 'infoBits' and (key != 'searchResult' or 'searchResult' in fields)
+        }
+        if 'infoBits' in fields:
+            topic_object['infoBits'] = [project_infobit(infobit) for infobit in topic['infoBits']]
+        return topic_object
+
+    projected = {key: value for key, value in document.items() if key != 'phases'}
+    projected['phases'] = []
+    for phase in document['phases']:
+        if phase_number is not None and int(phase['phaseNumber']) != phase_number:
+            continue
+        phase_object = {key: value for key, value in phase.items() if key != 'topics'}
+        if not outline:
+            phase_object['topics'] = [project_topic(topic) for topic in phase['topics']]
+        projected['phases'].append(phase_object)
+    return projected
+
+
+def read_roadmap(dynamodb, roadmap_id, counter=None):
+    """
+    Assemble a roadmap from the normalized tables.
+    Returns (document, version), or (None, None) if the roadmap does not exist.
+    """
+    return read_roadmap_view(dynamodb, roadmap_id, counter=counter)
+
+
+def read_roadmap_view(dynamodb, roadmap_id, fields=DETAIL_FIELDS, phase_number=None, outline=False, counter=None):
+    """
+    Assemble a roadmap, or the part of it a view asks for, from the normalized tables.
+    Returns (document, version), or (None, None) if the roadmap does not exist.
+
+    Each level of the tree is fetched with concurrent sibling queries and
+    quizzes are fetched by key with BatchGetItem. Only the partitions the view
+    needs are read: a single phase is one get_item and one partition walk, an
+    outline stops at the Phases table and left-out fields skip their tables.
+    """
+    roadmap = dynamodb.Table('Roadmaps').get_item(Key={'id': roadmap_id}).get('Item')
+    if counter is not None:
+        counter.add('GetItem')
+    if not roadmap:
+        return None, None
+    version = int(roadmap.get('version', 0))
+
+    if phase_number is None:
+        phases = query_all(
+            dynamodb, 'Phases', counter,
+            KeyConditionExpression=Key('roadmapId').eq(roadmap_id)
+        )
+    else:
+        phase = dynamodb.Table('Phases').get_item(
+            Key={'roadmapId': roadmap_id, 'phaseId': phase_key(roadmap_id, phase_number)}
+        ).get('Item')
+        if counter is not None:
+            counter.add('GetItem')
+        phases = [phase] if phase else []
+
+    if outline:
+        return assemble_roadmap(roadmap, phases, {}, {}, {}, fields, outline=True), version
+
+    topic_query = {}
+    if 'searchResult' not in fields:
+        topic_query['ProjectionExpression'] = TOPIC_OUTLINE_PROJECTION
+    topics_per_phase = run_parallel(
+        lambda phase: query_all(
+            dynamodb, 'Topics', counter,
+            KeyConditionExpression=Key('phaseId').eq(phase['phaseId']),
+            **topic_query
+        ),
+        phases
+    )
+    topics_by_phase = {
+        phase['phaseId']: topics for phase, topics in zip(phases, topics_per_phase)
+    }
+
+    infobits_by_topic = {}
+    quizzes = {}
+    if 'infoBits' in fields:
+        all_topics = [topic for topics in topics_per_phase for topic in topics]
+        infobits_per_topic = run_parallel(
+            lambda topic: query_all(
+                dynamodb, 'InfoBits', counter,
+                KeyConditionExpression=Key('topicId').eq(topic['topicId'])
+            ),
+            all_topics
+        )
+        infobits_by_topic = {
+            topic['topicId']: infobits for topic, infobits in zip(all_topics, infobits_per_topic)
+        }
+
+        if 'quiz' in fields:
+            quiz_keys = [
+                {'infoBitId': infobit['infoBitId']}
+                for infobits in infobits_per_topic for infobit in infobits
+            ]
+            quiz_projection = {}
+            if 'answer' not in fields:
+                quiz_projection = {
+                    'projection': 'infoBitId, #text, #type, #options',
+                    'attribute_names': {'#text': 'text', '#type': 'type', '#options': 'options'}
+                }
+            quizzes = {
+                quiz['infoBitId']: quiz
+                for quiz in batch_get(dynamodb, 'Quizzes', quiz_keys, counter, **quiz_projection)
+            }
+
+    document = assemble_roadmap(roadmap, phases, topics_by_phase, infobits_by_topic, quizzes, fields)
+    return document, version
+
+
+def roadmap_version(dynamodb, roadmap_id, counter=None):
+    """
+    Read only the version attribute of a roadmap, or None if it does not exist.
+    """
+    roadmap = dynamodb.Table('Roadmaps').get_item(
+        Key={'id': roadmap_id},
+        ProjectionExpression='#version',
+        ExpressionAttributeNames={'#version': 'version'}
+    ).get('Item')
+    if counter is not None:
+        counter.add('GetItem')
+    if roadmap is None:
+        return None
+    return int(roadmap.get('version', 0))
+
+
+def roadmap_document(roadmap_id, roadmap):
+    """
+    Build the same document read_roadmap would return for a roadmap tree that
+    is about to be written, without reading it back.
+    """
+    rows = roadmap_child_rows(roadmap_id, roadmap)
+
+    # Match the sort-key order DynamoDB queries return the children in
+    phases = sorted(rows['Phases'], key=lambda row: row['phaseId'])
+    topics_by_phase = {}
+    for row in sorted(rows['Topics'], key=lambda row: row['topicId']):
+        topics_by_phase.setdefault(row['phaseId'], []).append(row)
+    infobits_by_topic = {}
+    for row in sorted(rows['InfoBits'], key=lambda row: row['infoBitId']):
+        infobits_by_topic.setdefault(row['topicId'], []).append(row)
+    quizzes = {row['infoBitId']: row for row in rows['Quizzes']}
+
+    return assemble_roadmap(roadmap_row(roadmap_id, roadmap), phases, topics_by_phase, infobits_by_topic, quizzes)
+
+
+def write_roadmap(dynamodb, roadmap_id, roadmap, include_roadmap_row=True, counter=None, version=1):
+    """
+    Write every row of a roadmap through the batched write pipeline.
+    Returns the per-table summary from batch_write.
+    """
+    rows = roadmap_child_rows(roadmap_id, roadmap)
+    if include_roadmap_row:
+        rows['Roadmaps'] = [roadmap_row(roadmap_id, roadmap, version)]
+
+    requests_by_table = {
+        table_name: [put_request(item) for item in rows[table_name]]
+        for table_name in ROADMAP_TABLES if table_name in rows
+    }
+    return batch_write(dynamodb, requests_by_table, counter)
+
+
+def write_roadmap_phases(dynamodb, roadmap_id, phases, version, counter=None):
+    """
+    Write consecutive, finished phases of a roadmap that is still being
+    generated, numbered from the first one's phaseNumber, then move the roadmap
+    to version so readers and caches pick them up. Returns the batch_write summary.
+    """
+    rows = roadmap_child_rows(roadmap_id, {'phases': phases}, first_phase=int(phases[0]['phaseNumber']))
+    requests_by_table = {table_name: [put_request(item) for item in items] for table_name, items in rows.items()}
+    summary = batch_write(dynamodb, requests_by_table, counter)
+
+    # After the rows, so a reader who sees the new version also sees the phases
+    dynamodb.Table('Roadmaps').update_item(
+        Key={'id': roadmap_id},
+        UpdateExpression='SET #version = :version',
+        ExpressionAttributeNames={'#version': 'version'},
+        ExpressionAttributeValues={':version': version}
+    )
+    if counter is not None:
+        counter.add('UpdateItem')
+    return summary
+
+
+def set_roadmap_status(dynamodb, roadmap_id, status, counter=None):
+    """
+    Set the status of a roadmap that is still being generated and move it to a
+    new version, so readers and caches see the change. A finished roadmap has
+    no status and is left as it is. Returns whether the status was set.
+    """
+    try:
+        dynamodb.Table('Roadmaps').update_item(
+            Key={'id': roadmap_id},
+            UpdateExpression='SET #status = :status, #version = #version + :one',
+            ConditionExpression='attribute_exists(#status)',
+            ExpressionAttributeNames={'#status': 'status', '#version': 'version'},
+            ExpressionAttributeValues={':status': status, ':one': 1}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+    finally:
+        if counter is not None:
+            counter.add('UpdateItem')
+
+
+def read_roadmap_rows(dynamodb, roadmap_id, counter=None):
+    """
+    Read every stored child row of a roadmap, as roadmap_child_rows would produce them.
+    """
+    phases = query_all(
+        dynamodb, 'Phases', counter,
+        KeyConditionExpression=Key('roadmapId').eq(roadmap_id)
+    )
+    topics = [
+        topic for topics in run_parallel(
+            lambda phase: query_all(
+                dynamodb, 'Topics', counter,
+                KeyConditionExpression=Key('phaseId').eq(phase['phaseId'])
+            ),
+            phases
+        ) for topic in topics
+    ]
+    infobits = [
+        infobit for infobits in run_parallel(
+            lambda topic: query_all(
+                dynamodb, 'InfoBits', counter,
+                KeyConditionExpression=Key('topicId').eq(topic['topicId'])
+            ),
+            topics
+        ) for infobit in infobits
+    ]
+    quizzes = batch_get(
+        dynamodb, 'Quizzes', [{'infoBitId': infobit['infoBitId']} for infobit in infobits], counter
+    )
+    return {'Phases': phases, 'Topics': topics, 'InfoBits': infobits, 'Quizzes': quizzes}
+
+
+def diff_roadmap_rows(current_rows, new_rows):
+    """
+    Compare stored child rows with the rows of an updated tree, matched by primary key.
+
+    Returns (requests_by_table, stats): the put_request/delete_request entries
+    needed to turn the stored rows into the new ones, ready for batch_write,
+    and per-table counts of added, changed, removed and unchanged rows.
+    """
+    requests_by_table = {}
+    stats = {}
+    for table_name, key_names in ROW_KEYS.items():
+        current = {tuple(row[name] for name in key_names): row for row in current_rows.get(table_name, [])}
+        requests = []
+        table_stats = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+
+        for row in new_rows.get(table_name, []):
+            key = tuple(row[name] for name in key_names)
+            stored = current.pop(key, None)
+            if stored is None:
+                table_stats['added'] += 1
+            elif stored == row:
+                table_stats['unchanged'] += 1
+                continue
+            else:
+                table_stats['changed'] += 1
+            requests.append(put_request(row))
+
+        # Whatever was not matched belongs to phases, topics or infobits that no longer exist
+        for key in current:
+            requests.append(delete_request(dict(zip(key_names, key))))
+            table_stats['removed'] += 1
+
+        if requests:
+            requests_by_table[table_name] = requests
+        stats[table_name] = table_stats
+    return requests_by_table, stats
+
+
+def collect_roadmap_keys(dynamodb, roadmap_id, counter=None):
+    """
+    Collect the primary keys of every stored child row of a roadmap.
+    Each level is read with concurrent keys-only queries, quizzes are
+    looked up by key so only the ones that exist are returned.
+    """
+    phase_keys = query_all(
+        dynamodb, 'Phases', counter,
+        KeyConditionExpression=Key('roadmapId').eq(roadmap_id),
+        ProjectionExpression='roadmapId, phaseId'
+    )
+
+    topic_keys = [
+        key for keys in run_parallel(
+            lambda phase: query_all(
+                dynamodb, 'Topics', counter,
+                KeyConditionExpression=Key('phaseId').eq(phase['phaseId']),
+                ProjectionExpression='phaseId, topicId'
+            ),
+            phase_keys
+        ) for key in keys
+    ]
+
+    infobit_keys = [
+        key for keys in run_parallel(
+            lambda topic: query_all(
+                dynamodb, 'InfoBits', counter,
+                KeyConditionExpression=Key('topicId').eq(topic['topicId']),
+                ProjectionExpression='topicId, infoBitId'
+            ),
+            topic_keys
+        ) for key in keys
+    ]
+
+    quiz_keys = batch_get(
+        dynamodb, 'Quizzes', [{'infoBitId': key['infoBitId']} for key in infobit_keys], counter,
+        projection='infoBitId'
+    )
+
+    return {
+        'Phases': phase_keys,
+        'Topics': topic_keys,
+        'InfoBits': infobit_keys,
+        'Quizzes': quiz_keys
+    }
+
+
+def delete_roadmap_rows(dynamodb, roadmap_id, counter=None, has_time_left=None):
+    """
+    Delete a roadmap and all of its children with batched, parallel deletes.
+
+    Rows are removed bottom-up (quizzes, infobits, topics, phases, then the
+    roadmap row), one level at a time, so a parent is never deleted before
+    its children. Child keys are found through the parents, so if the call
+    is cut short, even mid-level, calling it again picks up whatever is left.
+    has_time_left is checked between levels; when it returns False the
+    delete stops early and the result is marked incomplete.
+
+    Only rows read back from the tables are deleted, so the counts are rows
+    that existed and are gone, never ones a previous call already removed.
+
+    Returns {'deleted': {table: count}, 'remaining': {table: count}, 'complete': bool},
+    remaining being the rows found but left for the next call.
+    """
+    keys = collect_roadmap_keys(dynamodb, roadmap_id, counter)
+    levels = [
+        ('Quizzes',),
+        ('InfoBits',),
+        ('Topics',),
+        ('Phases',),
+    ]
+
+    deleted = {table_name: 0 for table_name in ROADMAP_TABLES}
+    remaining = {table_name: len(keys[table_name]) for table_name in ROADMAP_TABLES[1:]}
+    remaining = {'Roadmaps': 1, **remaining}
+    for level in levels:
+        if has_time_left is not None and not has_time_left():
+            return {'deleted': deleted, 'remaining': remaining, 'complete': False}
+
+        summary = batch_write(
+            dynamodb,
+            {table_name: [delete_request(key) for key in keys[table_name]] for table_name in level},
+            counter
+        )
+        for table_name, table_summary in summary.items():
+            deleted[table_name] += table_summary['deletes']
+            remaining[table_name] -= table_summary['deletes']
+
+    if has_time_left is not None and not has_time_left():
+        return {'deleted': deleted, 'remaining': remaining, 'complete': False}
+
+    response = dynamodb.Table('Roadmaps').delete_item(Key={'id': roadmap_id}, ReturnValues='ALL_OLD')
+    if counter is not None:
+        counter.add('DeleteItem')
+    deleted['Roadmaps'] = 1 if response.get('Attributes') else 0
+    remaining['Roadmaps'] = 0
+
+    return {'deleted': deleted, 'remaining': remaining, 'complete': True}
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger()
+
+
+class TaskGraphSuspended(Exception):
+    """run() stopped starting tasks because has_time_left said so; pending names the tasks left."""
+
+    def __init__(self, pending):
+        super().__init__(f"Suspended with {len(pending)} tasks left: {', '.join(pending)}")
+        self.pending = pending
+
+
+class Task:
+    def __init__(self, name, fn, deps, group):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.group = group
+        self.status = 'pending'
+        self.ready_at = None
+        self.started_at = None
+        self.finished_at = None
+
+
+class TaskGraph:
+    """
+    Run dependent tasks on a bounded thread pool, each one as soon as all of its
+    dependencies have finished.
+
+    A task is added with the names of the tasks it depends on and is called
+    with a dict of their results. Tasks in the same group share that group's
+    limit (e.g. concurrent Bedrock calls) on top of max_workers. Tasks are
+    started in the order they were added when more than one is ready.
+
+    The first task to raise cancels the run: nothing else is started, the
+    cancelled event is set for tasks that want to stop early, and run()
+    re-raises the error once the tasks already running have returned.
+
+    A run can resume an earlier one: tasks whose results are passed in
+    restored are not run again, and on_done(name, result) is called on the
+    task's thread as each task finishes, e.g. to checkpoint it.
+    """
+
+    def __init__(self, max_workers=8, group_limits=None, name='graph'):
+        self.max_workers = max_workers
+        self.group_limits = dict(group_limits or {})
+        self.name = name
+        self.cancelled = threading.Event()
+        self._tasks = {}
+        self._started_at = None
+        self._finished_at = None
+
+    def add(self, name, fn, deps=(), group=None):
+        if name in self._tasks:
+            raise ValueError(f"Task {name} added twice")
+        self._tasks[name] = Task(name, fn, deps, group)
+        return name
+
+    def _run_task(self, task, inputs, on_done):
+        task.started_at = time.monotonic()
+        try:
+            result = task.fn(inputs)
+            if on_done is not None:
+                on_done(task.name, result)
+            return result
+        finally:
+            task.finished_at = time.monotonic()
+
+    def run(self, restored=None, on_done=None, has_time_left=None):
+        """
+        Run every task and return {task name: result}.
+
+        has_time_left is checked before each task is started. Once it returns
+        False no task is started, and TaskGraphSuspended is raised after the
+        running ones have returned (and been passed to on_done).
+        """
+        for task in self._tasks.values():
+            unknown = [dep for dep in task.deps if dep not in self._tasks]
+            if unknown:
+                raise ValueError(f"Task {task.name} depends on unknown tasks: {', '.join(unknown)}")
+
+        self._started_at = time.monotonic()
+        results = {}
+        pending = []
+        for task in self._tasks.values():
+            if restored is not None and task.name in restored:
+                results[task.name] = restored[task.name]
+                task.status = 'restored'
+            else:
+                pending.append(task)
+        running = {}
+        running_per_group = {}
+        error = None
+        suspended = False
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                if error is None and not suspended:
+                    for task in list(pending):
+                        if len(running) >= self.max_workers:
+                            break
+                        if not all(dep in results for dep in task.deps):
+                            continue
+                        if task.ready_at is None:
+                            task.ready_at = time.monotonic()
+                        limit = self.group_limits.get(task.group)
+                        if limit is not None and running_per_group.get(task.group, 0) >= limit:
+                            continue
+
+                        if has_time_left is not None and not has_time_left():
+                            suspended = True
+                            break
+
+                        pending.remove(task)
+                        task.status = 'running'
+                        running_per_group[task.group] = running_per_group.get(task.group, 0) + 1
+                        inputs = {dep: results[dep] for dep in task.deps}
+                        running[executor.submit(self._run_task, task, inputs, on_done)] = task
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    running_per_group[task.group] -= 1
+                    try:
+                        results[task.name] = future.result()
+                        task.status = 'done'
+                    except Exception as e:
+                        task.status = 'failed'
+                        logger.error(f"Task {task.name} in {self.name} failed: {str(e)}")
+                        if error is None:
+                            error = e
+                            self.cancelled.set()
+
+        self._finished_at = time.monotonic()
+        for task in pending:
+            task.status = 'suspended' if suspended and error is None else 'cancelled'
+        self.log_report()
+
+        if error is not None:
+            raise error
+        if suspended and pending:
+            raise TaskGraphSuspended([task.name for task in pending])
+        if pending:
+            raise ValueError(f"Tasks never became ready, check for cycles: {', '.join(task.name for task in pending)}")
+        return results
+
+    def report(self):
+        """
+        Per-task timings in seconds from the start of the run: when the task's
+        dependencies were met, when it started and how long it ran.
+        """
+        def offset(moment):
+            return round(moment - self._started_at, 3) if moment is not None else None
+
+        rows = []
+        for task in self._tasks.values():
+            rows.append({
+                'task': task.name,
+                'group': task.group,
+                'status': task.status,
+                'ready': offset(task.ready_at),
+                'start': offset(task.started_at),
+                'duration': round(task.finished_at - task.started_at, 3) if task.finished_at is not None else None
+            })
+        return sorted(rows, key=lambda row: (row['start'] is None, row['start'] or 0))
+
+    def log_report(self):
+        rows = self.report()
+        wall_time = self._finished_at - self._started_at
+        task_time = sum(row['duration'] or 0 for row in rows)
+        for row in rows:
+            if row['start'] is None:
+                logger.info(f"{self.name} task {row['task']}: {row['status']}")
+                continue
+            logger.info(f"{self.name} task {row['task']}: {row['status']}, ready {row['ready']}s, "
+                        f"started {row['start']}s, ran {row['duration']}s")
+        logger.info(f"{self.name} finished in {wall_time:.2f}s, {task_time:.2f}s of task time "
+                    f"({task_time / wall_time if wall_time > 0 else 1.0:.2f}x)")
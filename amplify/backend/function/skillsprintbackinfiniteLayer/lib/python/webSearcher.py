@@ -36,10 +36,12 @@ def search_resources(search_query):
 
 def process_topics(input_data):
     image_url = None
-    try:
-        image_url = image_search(str(input_data['searchKeyword']) + "cover photo")
-    except Exception as e:
-        print("error in image search")
+    # Per-phase searches from quizFlow carry no searchKeyword, the cover image is searched once
+    if 'searchKeyword' in input_data:
+        try:
+            image_url = image_search(str(input_data['searchKeyword']) + "cover photo")
+        except Exception as e:
+            print("error in image search")
         
     if image_url != None:
         input_data['imageURL'] = image_url